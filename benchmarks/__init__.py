@@ -0,0 +1 @@
+"""Benchmark suite for the Buffer server. Run with ``python -m benchmarks.run``."""
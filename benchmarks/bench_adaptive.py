@@ -0,0 +1,85 @@
+"""Static vs adaptive flush policy against a target whose latency varies.
+
+The mock target alternates between fast and slow periods. The same
+concurrent webhook load is sent to a buffer with a fixed ``max_size``/
+``max_time`` and to an adaptive one whose size/linger may grow up to
+``max_size``/``max_time``. Reported per policy: webhook throughput and
+latency (size-triggered flushes run on the webhook's thread), downstream
+requests, end-to-end delivery delay and the final adaptive state.
+"""
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .bench_forward import _delays
+from .harness import Sink, percentiles
+
+
+def variable_latency(fast, slow, period):
+    started = time.monotonic()
+
+    def latency():
+        return slow if int((time.monotonic() - started) / period) % 2 else fast
+    return latency
+
+
+def metric(text, name, buffer_id):
+    match = re.search(rf'^{name}{{buffer_id="{buffer_id}"}} (\S+)$', text, re.MULTILINE)
+    return float(match.group(1)) if match else None
+
+
+def decisions(text, buffer_id):
+    pattern = rf'^buffer_adaptive_decisions_total{{buffer_id="{buffer_id}",decision="(\w+)"}} (\S+)$'
+    return {decision: int(float(value)) for decision, value in re.findall(pattern, text, re.MULTILINE)}
+
+
+def run_policy(ctx, sink, options, scale):
+    buffer_id = ctx.create_buffer(**options)
+    ctx.create_forwarding(buffer_id, url=sink.url)
+    count = scale['adaptive_messages']
+    keys = scale['adaptive_keys']
+
+    def send(i):
+        # O conteúdo é o horário de envio, para medir o atraso até o destino
+        return ctx.client.timed('POST', f'/api/webhook/{buffer_id}',
+                                json={'key': f'key-{i % keys}', 'conteudo': time.time()})
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(ctx.client.concurrency) as executor:
+        results = list(executor.map(send, range(count)))
+    elapsed = time.perf_counter() - started
+    latencies = [latency for latency, _ in results]
+    statuses = {}
+    for _, response in results:
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    state = ctx.client.request('GET', '/metrics').text
+    ctx.app.drain()
+    records = sink.take()
+    return {
+        'throughput_per_s': round(count / elapsed, 1),
+        'webhook_latency': percentiles(latencies),
+        'statuses': statuses,
+        'downstream_requests': len(records),
+        'delivery_delay': percentiles(_delays(records)),
+        'final_batch_size': metric(state, 'buffer_adaptive_batch_size', buffer_id),
+        'final_linger_seconds': metric(state, 'buffer_adaptive_linger_seconds', buffer_id),
+        'decisions': decisions(state, buffer_id),
+    }
+
+
+def run(ctx, scale):
+    fast, slow, period = scale['adaptive_latency']
+    static = {'max_size': scale['adaptive_min_size'], 'max_time': 1}
+    adaptive = {
+        'adaptive': 1,
+        'min_size': scale['adaptive_min_size'], 'max_size': scale['adaptive_max_size'],
+        'min_time': 1, 'max_time': 5,
+    }
+    results = {'target_latency': {'fast': fast, 'slow': slow, 'period': period}}
+    for name, options in (('static', static), ('adaptive', adaptive)):
+        sink = Sink(latency=variable_latency(fast, slow, period))
+        try:
+            results[name] = dict(run_policy(ctx, sink, options, scale), options=options)
+        finally:
+            sink.close()
+    return results
@@ -0,0 +1,67 @@
+"""Latency from webhook receipt to the forwarded request reaching the sink.
+
+Each message carries its send time as ``conteudo``; the default payload
+shape forwards ``conteudo`` values as ``content``, so the sink can compute
+the end-to-end delay of every message. The coalesced case also reports how
+many downstream requests carried the messages of many keys.
+"""
+import json
+import time
+
+from .harness import percentiles
+
+
+def _delays(records):
+    delays = []
+    for received_at, body in records:
+        body = json.loads(body)
+        # Requisições com coalescing trazem os grupos de várias chaves
+        for payload in body.get('batches', [body]):
+            for sent_at in payload.get('content', []):
+                delays.append(received_at - sent_at)
+    return delays
+
+
+def run(ctx, scale):
+    count = scale['forward_messages']
+    results = {}
+
+    # Size-triggered: every message fills its buffer and is flushed at once
+    buffer_id = ctx.create_buffer(max_size=1, max_time=3600)
+    ctx.create_forwarding(buffer_id)
+    ctx.sink.take()
+    for i in range(count):
+        ctx.client.request('POST', f'/api/webhook/{buffer_id}',
+                           json={'key': f'key-{i % 16}', 'conteudo': time.time()})
+    ctx.sink.wait_for(count)
+    results['size_triggered'] = percentiles(_delays(ctx.sink.take()))
+
+    # Time-triggered: groups wait max_time seconds; reports delay past max_time
+    max_time = scale['forward_max_time']
+    buffer_id = ctx.create_buffer(max_size=1000000, max_time=max_time)
+    ctx.create_forwarding(buffer_id)
+    keys = scale['forward_time_keys']
+    for i in range(keys):
+        ctx.client.request('POST', f'/api/webhook/{buffer_id}',
+                           json={'key': f'key-{i}', 'conteudo': time.time()})
+    ctx.sink.wait_for(keys, timeout=max_time + 30)
+    delays = [delay - max_time for delay in _delays(ctx.sink.take())]
+    results['time_triggered'] = dict(percentiles(delays), max_time=max_time, keys=keys)
+
+    # Coalesced: every message flushes its own key, and the groups flushed
+    # within coalesce_window share one downstream request
+    window = scale['forward_coalesce_window']
+    buffer_id = ctx.create_buffer(max_size=1, max_time=3600)
+    ctx.create_forwarding(buffer_id, coalesce_window=window)
+    calls = [
+        ('POST', f'/api/webhook/{buffer_id}', {'json': {'key': f'key-{i}', 'conteudo': time.time()}})
+        for i in range(count)
+    ]
+    ctx.client.run(calls)
+    ctx.app.drain()
+    records = ctx.sink.take()
+    delays = _delays(records)
+    results['coalesced'] = dict(
+        percentiles(delays), coalesce_window=window, keys=count, messages=len(delays), requests=len(records)
+    )
+    return results
@@ -0,0 +1,48 @@
+"""List-endpoint latency with large history tables."""
+import json
+import sqlite3
+
+from .harness import percentiles
+
+ENDPOINTS = ['/api/messages/received', '/api/messages/forwarded', '/api/executions']
+
+
+def seed(db_path, rows, execution_rows, forwarding_config_id):
+    """Bulk insert history rows straight into SQLite."""
+    conn = sqlite3.connect(db_path)
+    payload = json.dumps({'key': 'seed', 'conteudo': 'x' * 64})
+    with conn:
+        conn.executemany(
+            'INSERT INTO received_messages (message_data, source, buffer_id, processed, status) VALUES (?, ?, ?, 1, ?)',
+            ((payload, '127.0.0.1', 1, 'success') for _ in range(rows))
+        )
+        conn.executemany(
+            'INSERT INTO forwarded_messages (received_message_id, forwarding_config_id, status, response) VALUES (?, ?, ?, ?)',
+            ((i + 1, forwarding_config_id, 'success', payload) for i in range(rows))
+        )
+        conn.executemany(
+            'INSERT INTO executions (scheduleId, scheduleName, status, response) VALUES (?, ?, ?, ?)',
+            ((1, 'seed', 'success', 'ok') for _ in range(execution_rows))
+        )
+    conn.close()
+
+
+def run(ctx, scale):
+    buffer_id = ctx.create_buffer(max_size=10, max_time=60)
+    forwarding_config_id = ctx.create_forwarding(buffer_id)
+    seed(ctx.db_path, scale['history_rows'], scale['execution_rows'], forwarding_config_id)
+
+    results = {
+        'history_rows': scale['history_rows'],
+        'execution_rows': scale['execution_rows'],
+        'endpoints': {},
+    }
+    for path in ENDPOINTS:
+        latencies = []
+        size = 0
+        for _ in range(scale['history_requests']):
+            latency, response = ctx.client.timed('GET', path)
+            latencies.append(latency)
+            size = len(response.content)
+        results['endpoints'][path] = dict(percentiles(latencies), response_bytes=size)
+    return results
@@ -0,0 +1,34 @@
+"""Webhook ingest throughput and latency across ingest stores, buffer sizes and key cardinalities.
+
+``storage`` is ``database`` (a ``received_messages`` row per message) or
+``log`` (``ingest_log = 1``: appended to the segmented message log).
+"""
+from .harness import percentiles
+
+
+def run(ctx, scale):
+    results = []
+    for storage in ('database', 'log'):
+        for max_size in scale['buffer_sizes']:
+            for keys in scale['key_cardinalities']:
+                buffer_id = ctx.create_buffer(max_size=max_size, max_time=3600, ingest_log=int(storage == 'log'))
+                ctx.create_forwarding(buffer_id)
+                count = scale['ingest_messages']
+                calls = [
+                    ('POST', f'/api/webhook/{buffer_id}', {'json': {'key': f'key-{i % keys}', 'conteudo': i}})
+                    for i in range(count)
+                ]
+                latencies, statuses, elapsed = ctx.client.run(calls)
+                ctx.app.drain()
+                ctx.sink.take()
+                results.append({
+                    'storage': storage,
+                    'max_size': max_size,
+                    'keys': keys,
+                    'messages': count,
+                    'concurrency': ctx.client.concurrency,
+                    'throughput_per_s': round(count / elapsed, 1),
+                    'latency': percentiles(latencies),
+                    'statuses': statuses,
+                })
+    return results
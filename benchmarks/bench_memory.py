@@ -0,0 +1,90 @@
+"""Memory held per buffered message by each buffer entry layout.
+
+Measured with tracemalloc while the same messages are buffered under each
+layout, so only what the buffer retains is counted:
+
+- ``dict_parsed``: one dict per message holding the parsed JSON object (the
+  layout before payloads were kept serialized);
+- ``dict_serialized``: one dict per message holding the JSON string;
+- ``group``: the column-wise ``memory.BufferGroup`` the server uses.
+"""
+import json
+import random
+import time
+import tracemalloc
+
+from buffer.memory import BufferGroup
+
+WORDS = ['pedido', 'cliente', 'status', 'entregue', 'valor', 'produto', 'quantidade', 'endereco']
+
+
+def messages(count, keys, seed=42):
+    """``(key, message_id, payload)`` with a fresh JSON string per message, like webhook requests."""
+    rng = random.Random(seed)
+    for message_id in range(1, count + 1):
+        key = f'key-{message_id % keys}'
+        payload = json.dumps({
+            'key': key,
+            'conteudo': ' '.join(rng.choice(WORDS) for _ in range(6)),
+            'valor': round(rng.random() * 1000, 2),
+            'cliente': {'id': rng.randrange(10 ** 6), 'nome': rng.choice(WORDS)},
+        })
+        yield key, message_id, payload
+
+
+def buffer_dict_parsed(store, key, message_id, payload):
+    store.setdefault(key, []).append({
+        'message_id': message_id, 'data': json.loads(payload), 'buffered_at': time.time(), 'trace': None
+    })
+
+
+def buffer_dict_serialized(store, key, message_id, payload):
+    store.setdefault(key, []).append({
+        'message_id': message_id, 'payload': payload, 'buffered_at': time.time(), 'trace': None
+    })
+
+
+def buffer_group(store, key, message_id, payload):
+    group = store.get(key)
+    if group is None:
+        group = store[key] = BufferGroup()
+    group.append(message_id, payload, time.time())
+
+
+LAYOUTS = {
+    'dict_parsed': buffer_dict_parsed,
+    'dict_serialized': buffer_dict_serialized,
+    'group': buffer_group,
+}
+
+
+def measure(layout, count, keys):
+    add = LAYOUTS[layout]
+    payload_bytes = 0
+    tracemalloc.start()
+    try:
+        baseline = tracemalloc.get_traced_memory()[0]
+        store = {}
+        for key, message_id, payload in messages(count, keys):
+            payload_bytes += len(payload)
+            add(store, key, message_id, payload)
+        retained = tracemalloc.get_traced_memory()[0] - baseline
+    finally:
+        tracemalloc.stop()
+    del store
+    return {
+        'bytes_per_message': round(retained / count, 1),
+        'overhead_per_message': round((retained - payload_bytes) / count, 1),
+        'payload_bytes_per_message': round(payload_bytes / count, 1),
+    }
+
+
+def run(ctx, scale):
+    count = scale['memory_messages']
+    results = []
+    for keys in scale['key_cardinalities']:
+        entry = {'messages': count, 'keys': keys, 'layouts': {}}
+        for layout in LAYOUTS:
+            entry['layouts'][layout] = measure(layout, count, keys)
+        results.append(entry)
+    return results
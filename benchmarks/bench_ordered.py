@@ -0,0 +1,77 @@
+"""Delivery throughput with and without ordered delivery, by key count.
+
+Every message fills its buffer (``max_size = 1``) and the sink answers after
+``ordered_latency`` seconds. Each key has one sender posting its messages
+one after the other, numbered in ``conteudo``, and all keys send at once.
+Reported per key count and policy: messages delivered per second (until the
+last one reaches the sink), webhook latency, downstream requests and how
+many messages reached the sink before an earlier message of their key.
+"""
+import json
+import threading
+import time
+
+from .harness import Sink, percentiles
+
+
+def out_of_order(records):
+    last = {}
+    count = 0
+    for _, body in sorted(records, key=lambda record: record[0]):
+        body = json.loads(body)
+        for sequence in body['content']:
+            if sequence < last.get(body['key'], -1):
+                count += 1
+            last[body['key']] = max(sequence, last.get(body['key'], -1))
+    return count
+
+
+def run_policy(ctx, sink, ordered, keys, count):
+    buffer_id = ctx.create_buffer(max_size=1, max_time=3600, ordered=ordered)
+    ctx.create_forwarding(buffer_id, url=sink.url)
+    per_key = max(1, count // keys)
+    latencies = []
+    lock = threading.Lock()
+
+    def sender(key):
+        own = []
+        for sequence in range(per_key):
+            latency, response = ctx.client.timed('POST', f'/api/webhook/{buffer_id}',
+                                                 json={'key': f'key-{key}', 'conteudo': sequence})
+            response.raise_for_status()
+            own.append(latency)
+        with lock:
+            latencies.extend(own)
+
+    started = time.time()
+    threads = [threading.Thread(target=sender, args=(key,)) for key in range(keys)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ctx.app.drain()
+    sink.wait_for(per_key * keys)
+    records = sink.take()
+    elapsed = max(received_at for received_at, _ in records) - started
+    return {
+        'messages': per_key * keys,
+        'delivered_per_s': round(per_key * keys / elapsed, 1),
+        'webhook_latency': percentiles(latencies),
+        'downstream_requests': len(records),
+        'out_of_order': out_of_order(records),
+    }
+
+
+def run(ctx, scale):
+    latency = scale['ordered_latency']
+    results = {'target_latency': latency}
+    sink = Sink(latency=latency)
+    try:
+        for keys in scale['ordered_keys']:
+            results[f'keys_{keys}'] = {
+                name: run_policy(ctx, sink, ordered, keys, scale['ordered_messages'])
+                for name, ordered in (('unordered', 0), ('ordered', 1))
+            }
+    finally:
+        sink.close()
+    return results
@@ -0,0 +1,102 @@
+"""Bytes on the wire and server CPU per request for the list endpoints.
+
+Requests go through the Flask test client in-process, so ``time.process_time``
+around each call measures the server's work (routing, query, serialization,
+compression) without network or client-side parsing noise.
+"""
+import json
+import random
+import sqlite3
+import time
+
+from buffer.responses import configure_json, orjson
+
+from .harness import percentiles
+
+ENDPOINTS = ['/api/messages/forwarded', '/api/messages/received', '/api/executions']
+ENCODINGS = ['identity', 'gzip', 'deflate']
+
+
+WORDS = ['pedido', 'cliente', 'status', 'entregue', 'valor', 'produto', 'quantidade', 'endereco',
+         'order', 'customer', 'shipped', 'amount', 'item', 'total', 'created', 'updated']
+
+
+def fake_response(rng, payload_bytes):
+    """A forwarded_messages.response embedding a payload of roughly ``payload_bytes``."""
+    content = []
+    size = 0
+    while size < payload_bytes:
+        entry = {rng.choice(WORDS): rng.choice(WORDS), 'id': rng.randrange(10 ** 9), 'value': rng.random()}
+        content.append(entry)
+        size += 60
+    return json.dumps({
+        'sent': {'payload': {'key': f'key-{rng.randrange(1000)}', 'content': content}, 'headers': {}},
+        'response': {'status_code': 200, 'text': 'ok'},
+        'attempt': 1
+    })
+
+
+def seed(db_path, rows, payload_bytes, forwarding_config_id):
+    """Forwarded rows whose response embeds the sent payload, like real forwards."""
+    rng = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    message = json.dumps({'key': 'seed', 'conteudo': 'x' * 64})
+    responses = [fake_response(rng, payload_bytes) for _ in range(min(rows, 1000))]
+    with conn:
+        conn.executemany(
+            'INSERT INTO received_messages (message_data, source, buffer_id, processed, status) VALUES (?, ?, ?, 1, ?)',
+            ((message, '127.0.0.1', 1, 'success') for _ in range(rows))
+        )
+        conn.executemany(
+            'INSERT INTO forwarded_messages (received_message_id, forwarding_config_id, status, response) VALUES (?, ?, ?, ?)',
+            ((i + 1, forwarding_config_id, 'success', responses[i % len(responses)]) for i in range(rows))
+        )
+        conn.executemany(
+            'INSERT INTO executions (scheduleId, scheduleName, status, response) VALUES (?, ?, ?, ?)',
+            ((1, 'seed', 'success', responses[i % len(responses)]) for i in range(rows))
+        )
+    conn.close()
+
+
+def measure(client, path, encoding, requests):
+    headers = {} if encoding == 'identity' else {'Accept-Encoding': encoding}
+    cpu, latencies, size = [], [], 0
+    for _ in range(requests):
+        cpu_started, started = time.process_time(), time.perf_counter()
+        response = client.get(path, headers=headers, buffered=True)
+        latencies.append(time.perf_counter() - started)
+        cpu.append(time.process_time() - cpu_started)
+        size = len(response.data)
+        assert response.status_code == 200, response.status_code
+    return {
+        'response_bytes': size,
+        'cpu_ms_per_request': round(sum(cpu) / len(cpu) * 1000, 3),
+        'latency': percentiles(latencies),
+    }
+
+
+def run(ctx, scale):
+    buffer_id = ctx.create_buffer(max_size=10, max_time=60)
+    forwarding_config_id = ctx.create_forwarding(buffer_id)
+    seed(ctx.db_path, scale['response_rows'], scale['response_payload_bytes'], forwarding_config_id)
+
+    app = ctx.app.app
+    client = app.test_client()
+    backends = ['json', 'orjson'] if orjson is not None else ['json']
+    original = app.extensions['json_backend']
+    results = {
+        'rows': scale['response_rows'],
+        'payload_bytes': scale['response_payload_bytes'],
+        'endpoints': {},
+    }
+    try:
+        for path in ENDPOINTS:
+            results['endpoints'][path] = {}
+            for backend in backends:
+                configure_json(app, backend)
+                for encoding in ENCODINGS:
+                    results['endpoints'][path][f'{backend}/{encoding}'] = measure(
+                        client, path, encoding, scale['response_requests'])
+    finally:
+        configure_json(app, original)
+    return results
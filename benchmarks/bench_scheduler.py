@@ -0,0 +1,39 @@
+"""Fire accuracy of thousands of cron schedules hitting the sink at once."""
+import json
+import math
+import time
+
+from .harness import percentiles
+
+
+def run(ctx, scale):
+    count = scale['schedules']
+    schedules = [{
+        'name': f'bench-{i}',
+        'cronExpression': '* * * * *',
+        'url': ctx.sink.url,
+        'method': 'POST',
+        'body': json.dumps({'schedule': i}),
+    } for i in range(count)]
+    started = time.perf_counter()
+    response = ctx.client.request('POST', '/api/schedules/bulk', json={'schedules': schedules})
+    upsert_seconds = time.perf_counter() - started
+    response.raise_for_status()
+    ctx.sink.take()
+
+    # Everything fires on the next minute boundary
+    boundary = math.ceil(time.time() / 60) * 60
+    if boundary - time.time() < 2:
+        boundary += 60
+    ctx.sink.wait_for(count, timeout=boundary - time.time() + scale['scheduler_settle'])
+    records = [record for record in ctx.sink.take() if boundary <= record[0] < boundary + 60]
+    lags = [received_at - boundary for received_at, _ in records]
+
+    ctx.client.request('POST', '/api/schedules/bulk', json={'schedules': [], 'prune': True})
+    return {
+        'schedules': count,
+        'bulk_upsert_seconds': round(upsert_seconds, 3),
+        'fired': len(records),
+        'missed': count - len(records),
+        'fire_lag': percentiles(lags),
+    }
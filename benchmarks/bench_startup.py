@@ -0,0 +1,99 @@
+"""Startup cost of the package, measured in fresh interpreters.
+
+Each case runs ``startup_runs`` times in a new ``python`` process (the
+median is reported, minus a bare interpreter start):
+
+- ``import_server``: ``import buffer.server``;
+- ``cli_help``: ``python -m buffer --help``;
+- ``create_app``: importing the server and building the app against an
+  empty database (schema creation, export/integrity/import cycle and
+  scheduler start included).
+
+``import_side_effects`` checks that importing ``buffer.server`` starts no
+thread, opens no database connection and leaves the scheduler stopped.
+``check`` turns these, and ``import_server_ms`` over
+``startup_max_import_ms``, into failures: ``benchmarks.run`` exits non-zero
+on them, and ``python -m benchmarks.bench_startup`` runs just this check.
+"""
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    'import_server': ['-c', 'import buffer.server'],
+    'cli_help': ['-m', 'buffer', '--help'],
+    'create_app': ['-c', 'from buffer.server import create_app; create_app(); import os; os._exit(0)'],
+}
+
+SIDE_EFFECTS = '''
+import json, threading
+from buffer import server
+print(json.dumps({
+    'threads': threading.active_count(),
+    'db_connections': server.db_pool.created,
+    'scheduler_running': server.scheduler.running,
+}))
+'''
+
+
+def run_python(args, workdir):
+    # Banco novo a cada execução: create_app inclui a criação do schema
+    env = dict(os.environ, BUFFER_DB_PATH=os.path.join(tempfile.mkdtemp(dir=workdir), 'startup.db'))
+    started = time.perf_counter()
+    completed = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return time.perf_counter() - started, completed.stdout
+
+
+def median_ms(args, runs, workdir):
+    return statistics.median(run_python(args, workdir)[0] for _ in range(runs)) * 1000
+
+
+def run(ctx, scale):
+    runs = scale['startup_runs']
+    workdir = tempfile.mkdtemp(dir=ctx.workdir)
+    baseline = median_ms(['-c', 'pass'], runs, workdir)
+    results = {'runs': runs, 'interpreter_ms': round(baseline, 1)}
+    for name, args in CASES.items():
+        results[f'{name}_ms'] = round(median_ms(args, runs, workdir) - baseline, 1)
+    results['import_side_effects'] = json.loads(run_python(['-c', SIDE_EFFECTS], workdir)[1])
+    return results
+
+
+def check(results, scale):
+    """Messages for each startup guarantee ``results`` breaks; empty when all hold."""
+    failures = []
+    effects = results['import_side_effects']
+    if effects['threads'] != 1:
+        failures.append(f"importing buffer.server left {effects['threads']} threads running, expected 1")
+    if effects['db_connections']:
+        failures.append(f"importing buffer.server opened {effects['db_connections']} database connection(s)")
+    if effects['scheduler_running']:
+        failures.append('importing buffer.server started the scheduler')
+    if results['import_server_ms'] > scale['startup_max_import_ms']:
+        failures.append(f"importing buffer.server took {results['import_server_ms']} ms, "
+                        f"over {scale['startup_max_import_ms']} ms")
+    return failures
+
+
+if __name__ == '__main__':
+    from .run import SCALES
+
+    scale = SCALES['quick']
+    workdir = tempfile.mkdtemp(prefix='buffer-bench-')
+    try:
+        results = run(SimpleNamespace(workdir=workdir), scale)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(results, indent=2))
+    failures = check(results, scale)
+    for failure in failures:
+        print(f'FAILED startup: {failure}', file=sys.stderr)
+    sys.exit(1 if failures else 0)
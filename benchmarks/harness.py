@@ -0,0 +1,213 @@
+"""Shared pieces of the benchmark suite.
+
+``prepare()`` must run before anything imports ``buffer.server``: the server
+module reads ``BUFFER_DB_PATH`` when imported, and the benchmarks set it to a
+throwaway database.
+"""
+import json
+import logging
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+
+def prepare():
+    """Point the app at a temporary database and quiet its logging."""
+    workdir = tempfile.mkdtemp(prefix='buffer-bench-')
+    os.environ['BUFFER_DB_PATH'] = os.path.join(workdir, 'bench.db')
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    for name in ('buffer', 'apscheduler', 'waitress'):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return workdir
+
+
+def cleanup(workdir):
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+def percentiles(values):
+    """Summary of a list of durations in seconds, reported in milliseconds."""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p95_ms': at(0.95),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+class Sink:
+    """Local stand-in for a downstream HTTP target.
+
+    Records the arrival time and body of every request. ``latency`` (seconds,
+    or a callable returning seconds) delays each response and ``status``
+    sets the response code.
+    """
+
+    def __init__(self, latency=0.0, status=200):
+        self.latency = latency
+        self.status = status
+        self.records = []
+        self.lock = threading.Lock()
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = self.rfile.read(length) if length else b''
+                received_at = time.time()
+                with sink.lock:
+                    sink.records.append((received_at, body))
+                delay = sink.latency() if callable(sink.latency) else sink.latency
+                if delay:
+                    time.sleep(delay)
+                self.send_response(sink.status)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'ok')
+
+            do_POST = do_PUT = do_GET = do_DELETE = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def take(self):
+        with self.lock:
+            records, self.records = self.records, []
+        return records
+
+    def wait_for(self, count, timeout=30):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            with self.lock:
+                if len(self.records) >= count:
+                    return True
+            time.sleep(0.01)
+        return False
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class AppServer:
+    """The Buffer app served by waitress on an ephemeral port in this process."""
+
+    def __init__(self, threads=16):
+        from waitress.server import create_server
+        from buffer.server import create_app, scheduler
+
+        self.app = create_app()
+        self.scheduler = scheduler
+        self.server = create_server(self.app, host='127.0.0.1', port=0, threads=threads)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.effective_port}'
+
+    def drain(self):
+        self.app.extensions['buffer']['drain']()
+
+    def close(self):
+        self.drain()
+        self.server.task_dispatcher.shutdown()
+        self.server.close()
+        if self.scheduler.running:
+            self.scheduler.shutdown(wait=False)
+
+
+class Client:
+    """Sends requests from a thread pool, one keep-alive session per thread."""
+
+    def __init__(self, base_url, concurrency=8):
+        self.base_url = base_url
+        self.concurrency = concurrency
+        self.local = threading.local()
+
+    def session(self):
+        if not hasattr(self.local, 'session'):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def request(self, method, path, **kwargs):
+        return self.session().request(method, self.base_url + path, timeout=60, **kwargs)
+
+    def timed(self, method, path, **kwargs):
+        started = time.perf_counter()
+        response = self.request(method, path, **kwargs)
+        return time.perf_counter() - started, response
+
+    def run(self, calls):
+        """Run ``(method, path, kwargs)`` calls concurrently.
+
+        Returns ``(latencies, statuses, elapsed_seconds)``.
+        """
+        started = time.perf_counter()
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            results = list(executor.map(lambda call: self.timed(call[0], call[1], **call[2]), calls))
+        elapsed = time.perf_counter() - started
+        latencies = [latency for latency, _ in results]
+        statuses = {}
+        for _, response in results:
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        return latencies, statuses, elapsed
+
+
+def environment():
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'commit': commit,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+    }
+
+
+def write_results(results, output=None):
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, time.strftime('bench-%Y%m%d-%H%M%S.json'))
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    return output
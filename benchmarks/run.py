@@ -0,0 +1,179 @@
+"""Run the benchmark suite and write the results to a JSON file.
+
+    python -m benchmarks.run                 # full suite
+    python -m benchmarks.run --quick         # small sizes, for a smoke run
+    python -m benchmarks.run --only ingest,forward --output results.json
+
+The app is started in-process against a temporary database, with a local
+HTTP sink standing in for every downstream target.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from . import (bench_adaptive, bench_forward, bench_history, bench_ingest, bench_memory, bench_ordered,
+               bench_responses, bench_scheduler, bench_startup, harness)
+
+SCALES = {
+    'full': {
+        'buffer_sizes': [10, 100, 1000],
+        'key_cardinalities': [1, 100, 10000],
+        'ingest_messages': 20000,
+        'forward_messages': 2000,
+        'forward_max_time': 2,
+        'forward_time_keys': 500,
+        'forward_coalesce_window': 0.5,
+        'schedules': 2000,
+        'scheduler_settle': 30,
+        'history_rows': 1000000,
+        'execution_rows': 100000,
+        'history_requests': 20,
+        'response_rows': 5000,
+        'response_payload_bytes': 2048,
+        'response_requests': 10,
+        'memory_messages': 100000,
+        'adaptive_messages': 5000,
+        'adaptive_keys': 4,
+        'adaptive_min_size': 10,
+        'adaptive_max_size': 500,
+        'adaptive_latency': [0.005, 0.75, 5],
+        'ordered_messages': 2000,
+        'ordered_keys': [1, 8, 64],
+        'ordered_latency': 0.02,
+        'startup_runs': 10,
+        'startup_max_import_ms': 1000,
+    },
+    'quick': {
+        'buffer_sizes': [10, 100],
+        'key_cardinalities': [1, 100],
+        'ingest_messages': 1000,
+        'forward_messages': 200,
+        'forward_max_time': 1,
+        'forward_time_keys': 50,
+        'forward_coalesce_window': 0.5,
+        'schedules': 200,
+        'scheduler_settle': 15,
+        'history_rows': 20000,
+        'execution_rows': 5000,
+        'history_requests': 5,
+        'response_rows': 500,
+        'response_payload_bytes': 2048,
+        'response_requests': 3,
+        'memory_messages': 10000,
+        'adaptive_messages': 1000,
+        'adaptive_keys': 4,
+        'adaptive_min_size': 10,
+        'adaptive_max_size': 500,
+        'adaptive_latency': [0.005, 0.75, 3],
+        'ordered_messages': 400,
+        'ordered_keys': [1, 8, 32],
+        'ordered_latency': 0.02,
+        'startup_runs': 3,
+        'startup_max_import_ms': 1000,
+    },
+}
+
+# History goes last: it leaves the database with large tables
+BENCHMARKS = ['ingest', 'forward', 'adaptive', 'ordered', 'memory', 'scheduler', 'responses', 'history', 'startup']
+
+
+class Context:
+    def __init__(self, workdir, concurrency, threads):
+        self.workdir = workdir
+        self.db_path = os.environ['BUFFER_DB_PATH']
+        self.sink = harness.Sink()
+        self.app = harness.AppServer(threads=threads)
+        self.client = harness.Client(self.app.url, concurrency=concurrency)
+
+    def create_buffer(self, **options):
+        data = {'name': f'bench-{time.time_ns()}', 'filter_field': 'key'}
+        data.update(options)
+        response = self.client.request('POST', '/api/buffer-configs', json=data)
+        response.raise_for_status()
+        return response.json()['id']
+
+    def create_forwarding(self, buffer_id, url=None, **options):
+        data = {'name': f'bench-{buffer_id}', 'url': url or self.sink.url, 'buffer_config_id': buffer_id}
+        data.update(options)
+        response = self.client.request('POST', '/api/forwarding-configs', json=data)
+        response.raise_for_status()
+        return response.json()['id']
+
+    def close(self):
+        self.app.close()
+        self.sink.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--quick', action='store_true', help='use small sizes')
+    parser.add_argument('--only', help=f"comma-separated subset of: {', '.join(BENCHMARKS)}")
+    parser.add_argument('--output', help='results file (default: benchmarks/results/bench-<time>.json)')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent client requests')
+    parser.add_argument('--threads', type=int, default=16, help='server worker threads')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUE',
+                        help='override a scale parameter, e.g. --set history_rows=200000')
+    args = parser.parse_args(argv)
+
+    scale = dict(SCALES['quick' if args.quick else 'full'])
+    for override in args.set:
+        name, _, value = override.partition('=')
+        if name not in scale:
+            parser.error(f'unknown scale parameter: {name}')
+        scale[name] = json.loads(value)
+    selected = args.only.split(',') if args.only else BENCHMARKS
+    unknown = set(selected) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    # Must run before the app (and buffer.server) is loaded
+    workdir = harness.prepare()
+    modules = {
+        'ingest': bench_ingest,
+        'forward': bench_forward,
+        'adaptive': bench_adaptive,
+        'ordered': bench_ordered,
+        'memory': bench_memory,
+        'scheduler': bench_scheduler,
+        'responses': bench_responses,
+        'history': bench_history,
+        'startup': bench_startup,
+    }
+
+    results = {
+        'environment': harness.environment(),
+        'scale': scale,
+        'concurrency': args.concurrency,
+        'server_threads': args.threads,
+        'benchmarks': {},
+    }
+    ctx = Context(workdir, args.concurrency, args.threads)
+    try:
+        for name in BENCHMARKS:
+            if name not in selected:
+                continue
+            print(f'Running {name}...', file=sys.stderr)
+            started = time.perf_counter()
+            results['benchmarks'][name] = modules[name].run(ctx, scale)
+            print(f'  done in {time.perf_counter() - started:.1f}s', file=sys.stderr)
+    finally:
+        ctx.close()
+        harness.cleanup(workdir)
+
+    output = harness.write_results(results, args.output)
+    print(json.dumps(results['benchmarks'], indent=2))
+    print(f'Results written to {output}', file=sys.stderr)
+
+    # Benchmarks com um check() definem limites que não podem ser ultrapassados
+    failures = [f'{name}: {failure}' for name, result in results['benchmarks'].items()
+                if hasattr(modules[name], 'check') for failure in modules[name].check(result, scale)]
+    for failure in failures:
+        print(f'FAILED {failure}', file=sys.stderr)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""Adaptive flush policy: batch size and linger time driven by downstream feedback.
+
+A buffer config with ``adaptive = 1`` no longer flushes at a fixed
+``max_size``/``max_time``. Its effective batch size moves between
+``min_size`` and ``max_size``, and its linger time between ``min_time`` and
+``max_time``, after every flush:
+
+- **grow** (double the size, 1.5x the linger) when the forwards were slow
+  (latency EWMA over ``LATENCY_TARGET``), failing (error rate EWMA over
+  ``ERROR_TARGET``) or the buffer has a backlog of several batches: fewer,
+  larger requests relieve a struggling target;
+- **shrink** (by ``SHRINK_FACTOR``) when forwards are fast and healthy and
+  less than a batch is queued, bringing delivery latency back down;
+- **hold** otherwise.
+
+Growth is multiplicative and shrinking gradual, so the policy backs off
+quickly and recovers without oscillating.
+"""
+import os
+import threading
+
+LATENCY_TARGET = float(os.environ.get('BUFFER_ADAPTIVE_LATENCY_TARGET') or 0.5)
+ERROR_TARGET = 0.1
+# Peso da última observação nas médias móveis
+ALPHA = 0.3
+GROW_FACTOR = 2.0
+LINGER_GROW_FACTOR = 1.5
+SHRINK_FACTOR = 0.8
+# Fila maior que este número de lotes conta como backlog
+BACKLOG_BATCHES = 4
+
+
+class FlushState:
+    __slots__ = ('size', 'linger', 'latency', 'error_rate', 'bounds')
+
+    def __init__(self, bounds):
+        min_size, max_size, min_time, max_time = bounds
+        self.bounds = bounds
+        self.size = float(min_size)
+        self.linger = float(min_time)
+        self.latency = 0.0
+        self.error_rate = 0.0
+
+
+def bounds_of(config):
+    min_size = max(1, min(config['min_size'] or 1, config['max_size']))
+    min_time = max(0.01, min(config['min_time'] or config['max_time'], config['max_time']))
+    return min_size, config['max_size'], min_time, config['max_time']
+
+
+class AdaptiveFlush:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.states = {}
+
+    def limits(self, buffer_id, config):
+        """Effective ``(max_size, max_time)`` of a buffer config."""
+        if not config['adaptive']:
+            self.states.pop(buffer_id, None)
+            return config['max_size'], config['max_time']
+        bounds = bounds_of(config)
+        state = self.states.get(buffer_id)
+        if state is None or state.bounds != bounds:
+            with self.lock:
+                state = self.states[buffer_id] = FlushState(bounds)
+        return max(1, int(state.size)), state.linger
+
+    def observe(self, buffer_id, latency, failed, pending):
+        """Feed back one flush of ``buffer_id``; returns the decision, or None for non-adaptive buffers."""
+        state = self.states.get(buffer_id)
+        if state is None:
+            return None
+        min_size, max_size, min_time, max_time = state.bounds
+        with self.lock:
+            state.latency += ALPHA * (latency - state.latency)
+            state.error_rate += ALPHA * ((1.0 if failed else 0.0) - state.error_rate)
+            backlog = pending >= BACKLOG_BATCHES * state.size
+            if state.latency > LATENCY_TARGET or state.error_rate > ERROR_TARGET or backlog:
+                decision = 'grow'
+                state.size = min(max_size, state.size * GROW_FACTOR)
+                state.linger = min(max_time, state.linger * LINGER_GROW_FACTOR)
+            elif state.latency < LATENCY_TARGET / 2 and state.error_rate < ERROR_TARGET / 2 and pending < state.size:
+                decision = 'shrink'
+                state.size = max(min_size, state.size * SHRINK_FACTOR)
+                state.linger = max(min_time, state.linger * SHRINK_FACTOR)
+            else:
+                decision = 'hold'
+        return decision
+
+    def snapshot(self):
+        """``{buffer_id: (size, linger, latency, error_rate)}`` for metrics."""
+        return {
+            buffer_id: (max(1, int(state.size)), state.linger, state.latency, state.error_rate)
+            for buffer_id, state in list(self.states.items())
+        }
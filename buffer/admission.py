@@ -0,0 +1,135 @@
+"""Admission control for the webhook endpoint.
+
+Each buffer config may set a token-bucket rate limit (``rate_limit``
+messages per second, bursts of ``rate_burst``) and a cap on its buffered,
+not yet flushed messages (``max_pending``). The same limits exist
+instance-wide through ``BUFFER_WEBHOOK_RATE_LIMIT``,
+``BUFFER_WEBHOOK_RATE_BURST`` and ``BUFFER_MAX_PENDING_MESSAGES``; 0 means no
+limit everywhere.
+
+``check`` runs before the request body is parsed and before any database
+access: the per-buffer limits are held in memory and reloaded only when
+the ``buffer_configs`` version of the response cache changes.
+"""
+import math
+import os
+import threading
+import time
+
+from . import cache
+
+GLOBAL_RATE_LIMIT = float(os.environ.get('BUFFER_WEBHOOK_RATE_LIMIT') or 0)
+GLOBAL_RATE_BURST = int(os.environ.get('BUFFER_WEBHOOK_RATE_BURST') or 0)
+GLOBAL_MAX_PENDING = int(os.environ.get('BUFFER_MAX_PENDING_MESSAGES') or 0)
+# Retry-After de quem excede max_pending: o próximo flush pode liberar espaço a qualquer momento
+PENDING_RETRY_AFTER = 1
+
+
+class TokenBucket:
+    def __init__(self, rate, burst=0):
+        self.settings = (rate, burst)
+        self.rate = rate
+        # Sem burst configurado: um segundo de taxa (ao menos uma mensagem)
+        self.burst = burst or max(1.0, rate)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Take one token; returns 0 when admitted, else seconds until a token is available."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def reserve(self):
+        """Take one token even if the bucket is empty; returns seconds to wait before using it.
+
+        Callers that wait are served in reservation order, one every ``1 / rate`` seconds.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def refund(self):
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + 1)
+
+
+class Shed(Exception):
+    """A webhook request rejected by admission control."""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+class AdmissionControl:
+    def __init__(self, db_pool, rate_limit=GLOBAL_RATE_LIMIT, rate_burst=GLOBAL_RATE_BURST,
+                 max_pending=GLOBAL_MAX_PENDING):
+        self.db_pool = db_pool
+        self.global_bucket = TokenBucket(rate_limit, rate_burst) if rate_limit else None
+        self.max_pending = max_pending
+        self.lock = threading.Lock()
+        self.version = None
+        self.limits = {}
+        self.buckets = {}
+
+    def load_limits(self):
+        """Per-buffer limits, reloaded from the database after buffer configs change."""
+        version = cache.versions.get('buffer_configs')
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    with self.db_pool.get_connection() as conn:
+                        rows = conn.execute('SELECT id, rate_limit, rate_burst, max_pending FROM buffer_configs').fetchall()
+                    limits = {row['id']: (row['rate_limit'], row['rate_burst'], row['max_pending']) for row in rows}
+                    # Buckets continuam valendo se o limite não mudou
+                    self.buckets = {
+                        buffer_id: bucket for buffer_id, bucket in self.buckets.items()
+                        if buffer_id in limits and limits[buffer_id][:2] == bucket.settings
+                    }
+                    self.limits = limits
+                    self.version = version
+        return self.limits
+
+    def bucket(self, buffer_id, rate, burst):
+        bucket = self.buckets.get(buffer_id)
+        if bucket is None:
+            with self.lock:
+                bucket = self.buckets.get(buffer_id)
+                if bucket is None:
+                    bucket = self.buckets[buffer_id] = TokenBucket(rate, burst)
+        return bucket
+
+    def check(self, buffer_id, pending, total_pending):
+        """Raise Shed when ``buffer_id`` is over one of its limits or the instance is over a global one.
+
+        ``pending``: messages of this buffer waiting for a flush;
+        ``total_pending``: the same across all buffers.
+        """
+        rate, burst, max_pending = self.load_limits().get(buffer_id, (0, 0, 0))
+        if max_pending and pending >= max_pending:
+            raise Shed('pending', PENDING_RETRY_AFTER)
+        if self.max_pending and total_pending >= self.max_pending:
+            raise Shed('global_pending', PENDING_RETRY_AFTER)
+        bucket = self.bucket(buffer_id, rate, burst) if rate else None
+        if bucket is not None:
+            wait = bucket.take()
+            if wait:
+                raise Shed('rate_limit', wait)
+        if self.global_bucket is not None:
+            wait = self.global_bucket.take()
+            if wait:
+                if bucket is not None:
+                    # Não cobrar do buffer uma mensagem que não entrou
+                    bucket.refund()
+                raise Shed('global_rate_limit', wait)
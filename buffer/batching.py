@@ -0,0 +1,125 @@
+"""Sizing of forward requests: splitting large batches and coalescing small ones.
+
+Two forwarding config options shape the requests sent for flushed groups:
+
+- ``max_request_bytes``: a group whose JSON body would exceed it is split
+  into several requests, each with a slice of ``content`` (a single message
+  larger than the limit is still sent, alone);
+- ``coalesce_window``: instead of one request per flushed key, the groups
+  flushed for the same forwarding config during the window are sent
+  together as ``{"batches": [<group payload>, ...]}``. A pending request is
+  sent early once it reaches ``max_request_bytes`` or ``MAX_BATCHES``.
+"""
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+MAX_BATCHES = 1000
+
+
+def json_size(obj):
+    # Mesmo formato que requests usa em json=
+    return len(json.dumps(obj))
+
+
+def split_batch(batch, max_bytes):
+    """Split ``batch`` into batches whose payload fits ``max_bytes``.
+
+    ``batch['payload']['content']`` must hold one item per message id, in the
+    same order, as ``build_forward_payload`` renders it.
+    """
+    payload = batch['payload']
+    content = payload.get('content')
+    if not max_bytes or not content or json_size(payload) <= max_bytes:
+        return [batch]
+    base = json_size(dict(payload, content=[]))
+    batches = []
+    start = 0
+    size = base
+    for index, item in enumerate(content):
+        # ", " entre itens
+        item_size = json_size(item) + 2
+        if index > start and size + item_size > max_bytes:
+            batches.append(_slice(batch, start, index))
+            start = index
+            size = base
+        size += item_size
+    batches.append(_slice(batch, start, len(content)))
+    return batches
+
+
+def _slice(batch, start, end):
+    return dict(
+        batch,
+        payload=dict(batch['payload'], content=batch['payload']['content'][start:end]),
+        message_ids=batch['message_ids'][start:end]
+    )
+
+
+def merge_batches(batches):
+    """One batch carrying the payloads of ``batches`` (all for the same forwarding config)."""
+    return {
+        'buffer_id': batches[0]['buffer_id'],
+        'key_value': None,
+        'message_ids': [message_id for batch in batches for message_id in batch['message_ids']],
+        'payload': {'batches': [batch['payload'] for batch in batches]},
+    }
+
+
+class Coalescer:
+    """Collects the batches of each forwarding config for ``coalesce_window`` seconds.
+
+    ``deliver(fw_config, batch)`` sends a merged batch; it runs on the
+    window's timer thread, or on the caller's when a pending request is full.
+    """
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+        self.lock = threading.Lock()
+        # forwarding_config_id -> [fw_config, batches, size, timer]
+        self.pending = {}
+
+    def add(self, fw_config, batch):
+        size = json_size(batch['payload'])
+        max_bytes = fw_config['max_request_bytes']
+        ready = []
+        with self.lock:
+            entry = self.pending.get(fw_config['id'])
+            if entry is not None and max_bytes and entry[2] + size > max_bytes:
+                # Não cabe na requisição pendente: enviá-la e começar outra
+                ready.append(self._pop(fw_config['id']))
+                entry = None
+            if entry is None:
+                entry = self.pending[fw_config['id']] = [fw_config, [], 0, None]
+                entry[3] = threading.Timer(fw_config['coalesce_window'], self.flush, args=(fw_config['id'], entry))
+                entry[3].start()
+            entry[1].append(batch)
+            entry[2] += size
+            if len(entry[1]) >= MAX_BATCHES:
+                ready.append(self._pop(fw_config['id']))
+        for fw_config, batches in ready:
+            self._send(fw_config, batches)
+
+    def _pop(self, forwarding_config_id):
+        fw_config, batches, _, timer = self.pending.pop(forwarding_config_id)
+        timer.cancel()
+        return fw_config, batches
+
+    def flush(self, forwarding_config_id, entry=None):
+        """Send the pending request of a forwarding config; from a timer, only the one it was started for."""
+        with self.lock:
+            current = self.pending.get(forwarding_config_id)
+            if current is None or (entry is not None and current is not entry):
+                return
+            fw_config, batches = self._pop(forwarding_config_id)
+        self._send(fw_config, batches)
+
+    def flush_all(self):
+        for forwarding_config_id in list(self.pending):
+            self.flush(forwarding_config_id)
+
+    def _send(self, fw_config, batches):
+        logger.info(f"[COALESCE] Enviando {len(batches)} grupos em uma requisição para {fw_config['url']}")
+        self.deliver(fw_config, merge_batches(batches))
@@ -0,0 +1,115 @@
+"""Version-keyed response cache and ETags for rarely changing endpoints.
+
+Every cached table has a change version, bumped by the routes that write to
+it (``@invalidates``). A cached GET (``@cached``) derives its ETag from the
+versions of the tables it reads: a matching ``If-None-Match`` gets a 304
+without touching the database, and otherwise the body serialized for the
+current versions is reused. The version is read *before* the view runs, so
+a body stored concurrently with a write is only ever filed under the older
+version and never served once the bump is visible.
+
+Versions live in memory and start from a random epoch, so ETags handed out
+before a restart never match afterwards.
+"""
+import functools
+import os
+import threading
+
+from flask import Response, request
+
+EPOCH = os.urandom(4).hex()
+MAX_ENTRIES = 256
+
+
+class TableVersions:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.versions = {}
+
+    def bump(self, *tables):
+        with self.lock:
+            for table in tables:
+                self.versions[table] = self.versions.get(table, 0) + 1
+
+    def get(self, *tables):
+        return tuple(self.versions.get(table, 0) for table in tables)
+
+
+class ResponseCache:
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, etag):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] == etag:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    def put(self, key, etag, body, mimetype):
+        with self.lock:
+            if key not in self.entries and len(self.entries) >= self.max_entries:
+                # Entradas são poucas (uma por endpoint/query): descartar a mais antiga basta
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[key] = (etag, body, mimetype)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+versions = TableVersions()
+responses = ResponseCache()
+
+
+def make_etag(tables):
+    return f"{EPOCH}-{'.'.join(str(version) for version in versions.get(*tables))}"
+
+
+def cached(*tables):
+    """Serve GETs of the decorated view from the cache, with ETag/304 support."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            etag = make_etag(tables)
+            # Comparação fraca: compress() torna o ETag fraco ao comprimir
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                key = request.full_path
+                entry = responses.get(key, etag)
+                if entry is not None:
+                    response = Response(entry[1], mimetype=entry[2])
+                else:
+                    response = view(*args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200:
+                        return response
+                    responses.put(key, etag, response.get_data(), response.mimetype)
+            response.set_etag(etag)
+            # Sempre revalidar: o conteúdo pode mudar a qualquer escrita
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+
+def invalidates(*tables):
+    """Bump the versions of ``tables`` after the decorated (non-GET) view runs."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if request.method == 'GET':
+                return view(*args, **kwargs)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                versions.bump(*tables)
+        return wrapper
+    return decorator
@@ -0,0 +1,218 @@
+"""Capture of inbound webhook traffic, and the sources read by ``buffer replay``.
+
+While a capture runs, every request to ``/api/webhook/<buffer_id>`` for an
+existing, active buffer config is appended to a file in
+``BUFFER_CAPTURE_DIR`` (default ``captures/`` next to the database) before
+it is processed. The file starts with ``MAGIC``, then has one record per
+request: a fixed header (arrival time, buffer id, body and header lengths)
+followed by the raw request body and, when the buffer's ``idempotency_key``
+comes from a header, that header as ``Name: value``. Writes go through a
+1 MiB buffer, so a webhook only pays for a struct pack and a memory copy.
+
+A capture stops when asked to, after ``seconds``, or once the file reaches
+``max_bytes`` (``BUFFER_CAPTURE_MAX_BYTES``, 1 GiB by default).
+
+``read_capture`` and ``database_records`` yield the same
+``(timestamp, buffer_id, body, headers)`` records, from a capture file or
+from the ``received_messages`` table of a database.
+"""
+import calendar
+import logging
+import os
+import sqlite3
+import struct
+import threading
+import time
+
+from . import idempotency
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'BUFCAP1\n'
+# received_at, buffer_id, tamanho do corpo, tamanho do cabeçalho
+RECORD = struct.Struct('<dIIH')
+MAX_BYTES = int(os.environ.get('BUFFER_CAPTURE_MAX_BYTES') or 1024 * 1024 * 1024)
+WRITE_BUFFER = 1024 * 1024
+EXTENSION = '.bcap'
+
+
+class CaptureBusy(Exception):
+    pass
+
+
+class CaptureRecorder:
+    def __init__(self, directory, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.file = None
+        self.info = None
+        self.buffer_ids = None
+        self.deadline = None
+
+    @property
+    def active(self):
+        return self.file is not None
+
+    def start(self, buffer_ids=None, seconds=None, max_bytes=None):
+        """Start a capture; returns its status. Raises CaptureBusy when one is running."""
+        with self.lock:
+            if self.file is not None:
+                raise CaptureBusy(f"A capture is already running: {self.info['name']}")
+            os.makedirs(self.directory, exist_ok=True)
+            stem = time.strftime('capture-%Y%m%d-%H%M%S', time.gmtime())
+            name = stem + EXTENSION
+            # Outra captura no mesmo segundo
+            suffix = 1
+            while os.path.exists(os.path.join(self.directory, name)):
+                suffix += 1
+                name = f'{stem}-{suffix}{EXTENSION}'
+            self.file = open(os.path.join(self.directory, name), 'wb', buffering=WRITE_BUFFER)
+            self.file.write(MAGIC)
+            self.buffer_ids = frozenset(buffer_ids) if buffer_ids else None
+            self.deadline = time.time() + seconds if seconds else None
+            self.info = {
+                'name': name,
+                'started_at': time.time(),
+                'stopped_at': None,
+                'buffer_ids': sorted(self.buffer_ids) if self.buffer_ids else None,
+                'seconds': seconds,
+                'max_bytes': max_bytes or self.max_bytes,
+                'requests': 0,
+                'bytes': len(MAGIC),
+            }
+            logger.info(f"[CAPTURE] Captura iniciada em {name}")
+            return dict(self.info, active=True)
+
+    def record(self, buffer_id, body, header=None):
+        """Append a webhook request to the running capture, if it covers ``buffer_id``."""
+        if self.buffer_ids is not None and buffer_id not in self.buffer_ids:
+            return
+        header = header.encode() if header else b''
+        if len(header) > 0xFFFF:
+            header = b''
+        with self.lock:
+            if self.file is None:
+                return
+            if self.deadline is not None and time.time() >= self.deadline:
+                self._stop('time limit reached')
+                return
+            self.file.write(RECORD.pack(time.time(), buffer_id, len(body), len(header)))
+            self.file.write(body)
+            self.file.write(header)
+            self.info['requests'] += 1
+            self.info['bytes'] += RECORD.size + len(body) + len(header)
+            if self.info['bytes'] >= self.info['max_bytes']:
+                self._stop('size limit reached')
+
+    def stop(self):
+        """Stop the running capture; returns its final status, or None when none was running."""
+        with self.lock:
+            if self.file is None:
+                return None
+            return self._stop('stopped')
+
+    def _stop(self, reason):
+        self.file.close()
+        self.file = None
+        self.info['stopped_at'] = time.time()
+        logger.info(f"[CAPTURE] Captura {self.info['name']} encerrada ({reason}): "
+                    f"{self.info['requests']} requisições, {self.info['bytes']} bytes")
+        return dict(self.info, active=False)
+
+    def status(self):
+        with self.lock:
+            if self.file is not None and self.deadline is not None and time.time() >= self.deadline:
+                self._stop('time limit reached')
+            if self.info is None:
+                return {'active': False}
+            return dict(self.info, active=self.file is not None)
+
+    def files(self):
+        """Capture files on disk, newest first."""
+        if not os.path.isdir(self.directory):
+            return []
+        names = sorted((name for name in os.listdir(self.directory) if name.endswith(EXTENSION)), reverse=True)
+        return [{'name': name, 'bytes': os.path.getsize(os.path.join(self.directory, name))} for name in names]
+
+
+def header_for(spec, headers):
+    """``'Name: value'`` of the idempotency header of a request, or None."""
+    parsed = idempotency.parse_spec(spec)
+    if parsed is None or parsed[0] != 'header':
+        return None
+    value = headers.get(parsed[1])
+    return f'{parsed[1]}: {value}' if value else None
+
+
+def read_capture(path):
+    """Yield ``(timestamp, buffer_id, body, headers)`` from a capture file.
+
+    Raises ValueError when the file is not a capture. A record cut short
+    (a capture copied while running) ends the iteration.
+    """
+    with open(path, 'rb') as capture:
+        if capture.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a capture file")
+        while True:
+            fixed = capture.read(RECORD.size)
+            if len(fixed) < RECORD.size:
+                return
+            timestamp, buffer_id, body_length, header_length = RECORD.unpack(fixed)
+            body = capture.read(body_length)
+            header = capture.read(header_length)
+            if len(body) < body_length or len(header) < header_length:
+                return
+            headers = {}
+            if header:
+                name, _, value = header.decode().partition(': ')
+                headers[name] = value
+            yield timestamp, buffer_id, body, headers
+
+
+def database_records(db_path, buffer_ids=None, limit=None):
+    """Yield ``(timestamp, buffer_id, body, headers)`` from the ``received_messages`` of a database.
+
+    ``received_at`` only has second resolution, so the messages received in
+    the same second are spread evenly across it. Idempotency keys are sent
+    back in the header named by the buffer's current ``idempotency_key``.
+    """
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        query = '''
+            SELECT rm.received_at, rm.buffer_id, rm.message_data, rm.idempotency_key, bc.idempotency_key AS spec
+            FROM received_messages rm
+            LEFT JOIN buffer_configs bc ON bc.id = rm.buffer_id
+            WHERE rm.buffer_id IS NOT NULL
+        '''
+        params = []
+        if buffer_ids:
+            query += f" AND rm.buffer_id IN ({', '.join('?' * len(buffer_ids))})"
+            params.extend(buffer_ids)
+        query += ' ORDER BY rm.id'
+        if limit:
+            query += ' LIMIT ?'
+            params.append(limit)
+        second = None
+        pending = []
+        for received_at, buffer_id, message_data, key, spec in conn.execute(query, params):
+            if received_at != second:
+                yield from _spread(second, pending)
+                second = received_at
+                pending = []
+            headers = {}
+            parsed = idempotency.parse_spec(spec) if key else None
+            if parsed is not None and parsed[0] == 'header':
+                headers[parsed[1]] = key
+            pending.append((buffer_id, message_data.encode(), headers))
+        yield from _spread(second, pending)
+    finally:
+        conn.close()
+
+
+def _spread(received_at, records):
+    if not records:
+        return
+    start = calendar.timegm(time.strptime(received_at[:19], '%Y-%m-%d %H:%M:%S'))
+    for index, (buffer_id, body, headers) in enumerate(records):
+        yield start + index / len(records), buffer_id, body, headers
@@ -0,0 +1,154 @@
+"""Circuit breakers for forwarding targets.
+
+Each forwarding config has a breaker fed with the outcome of every forward
+attempt. Only failures that mean the target is unavailable count
+(connection errors, timeouts, 429 and 5xx): a 4xx is the target answering.
+
+- **closed**: requests go through. Once the last ``WINDOW`` attempts hold at
+  least ``breaker_min_requests`` outcomes and their failure rate reaches
+  ``breaker_failure_rate``, the circuit opens;
+- **open**: nothing is sent for ``breaker_open_seconds``. The retry queue
+  parks batches until the circuit reopens, without spending their attempts;
+- **half_open**: after the open period a single probe is let through. If it
+  succeeds the circuit closes and the parked batches are released; if it
+  fails the circuit opens again.
+
+``breaker_min_requests = 0`` disables the breaker of a forwarding config.
+"""
+import logging
+import threading
+import time
+from collections import deque
+
+from . import cache
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+STATES = (CLOSED, HALF_OPEN, OPEN)
+# Últimas tentativas consideradas na taxa de falha
+WINDOW = 20
+
+
+class CircuitBreaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.outcomes = deque(maxlen=WINDOW)
+        self.opened_until = 0.0
+        self.probing = False
+
+    def failure_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+
+class CircuitBreakers:
+    def __init__(self, on_close=None, on_change=None):
+        """``on_close(forwarding_config_id)`` runs when a circuit closes after
+        being open; ``on_change(forwarding_config_id, state)`` on every transition."""
+        self.on_close = on_close
+        self.on_change = on_change
+        self.lock = threading.Lock()
+        self.breakers = {}
+
+    def _get(self, forwarding_config_id):
+        breaker = self.breakers.get(forwarding_config_id)
+        if breaker is None:
+            breaker = self.breakers[forwarding_config_id] = CircuitBreaker()
+        return breaker
+
+    def allow(self, fw_config):
+        """Whether a request to ``fw_config`` may be sent now; takes the probe slot when half-open."""
+        if not fw_config['breaker_min_requests']:
+            return True
+        changed = None
+        with self.lock:
+            breaker = self._get(fw_config['id'])
+            if breaker.state == OPEN and time.time() >= breaker.opened_until:
+                breaker.state = changed = HALF_OPEN
+            if breaker.state == HALF_OPEN and not breaker.probing:
+                breaker.probing = True
+                allowed = True
+            else:
+                allowed = breaker.state == CLOSED
+        if changed:
+            self._changed(fw_config['id'], changed)
+        return allowed
+
+    def retry_at(self, fw_config):
+        """When a batch refused by ``allow`` should be tried again."""
+        with self.lock:
+            breaker = self._get(fw_config['id'])
+            if breaker.state == OPEN:
+                return breaker.opened_until
+        # Sonda em andamento: se ela fechar o circuito, on_close antecipa a retentativa
+        return time.time() + fw_config['breaker_open_seconds']
+
+    def release_probe(self, fw_config):
+        """Give back the probe slot of a request allowed by ``allow`` that was never sent.
+
+        Counts neither as a success nor as a failure: the next ``allow`` may probe again.
+        """
+        if not fw_config['breaker_min_requests']:
+            return
+        with self.lock:
+            breaker = self._get(fw_config['id'])
+            if breaker.state == HALF_OPEN:
+                breaker.probing = False
+
+    def record(self, fw_config, success):
+        """Feed back the outcome of a request allowed by ``allow``."""
+        if not fw_config['breaker_min_requests']:
+            return
+        changed = None
+        with self.lock:
+            breaker = self._get(fw_config['id'])
+            if breaker.state == HALF_OPEN:
+                breaker.probing = False
+                breaker.outcomes.clear()
+                if success:
+                    breaker.state = changed = CLOSED
+                else:
+                    breaker.state = changed = OPEN
+                    breaker.opened_until = time.time() + fw_config['breaker_open_seconds']
+            elif breaker.state == CLOSED:
+                breaker.outcomes.append(success)
+                if (len(breaker.outcomes) >= fw_config['breaker_min_requests']
+                        and breaker.failure_rate() >= fw_config['breaker_failure_rate']):
+                    breaker.state = changed = OPEN
+                    breaker.opened_until = time.time() + fw_config['breaker_open_seconds']
+        if changed:
+            self._changed(fw_config['id'], changed)
+            if changed == CLOSED and self.on_close is not None:
+                self.on_close(fw_config['id'])
+
+    def _changed(self, forwarding_config_id, state):
+        log = logger.info if state == CLOSED else logger.warning
+        log(f"[CIRCUIT] Circuito do encaminhamento {forwarding_config_id}: {state}")
+        # O estado faz parte da resposta de /api/forwarding-configs
+        cache.versions.bump('forwarding_configs')
+        if self.on_change is not None:
+            self.on_change(forwarding_config_id, state)
+
+    def status(self, forwarding_config_id):
+        """``{'state', 'opened_until'}`` of a forwarding config.
+
+        Only changes on transitions, which bump the cache version of
+        ``forwarding_configs``; the failure rate is exported as a metric.
+        """
+        breaker = self.breakers.get(forwarding_config_id)
+        if breaker is None or breaker.state == CLOSED:
+            return {'state': CLOSED, 'opened_until': None}
+        return {'state': breaker.state, 'opened_until': breaker.opened_until}
+
+    def snapshot(self):
+        """``{forwarding_config_id: (state, failure_rate)}`` for metrics."""
+        return {
+            forwarding_config_id: (breaker.state, breaker.failure_rate())
+            for forwarding_config_id, breaker in list(self.breakers.items())
+        }
+
+    def forget(self, forwarding_config_id):
+        with self.lock:
+            self.breakers.pop(forwarding_config_id, None)
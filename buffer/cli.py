@@ -1,6 +1,7 @@
 import click
-from flask import Flask
-from .server import create_app
+
+# buffer.server (Flask, APScheduler, requests...) só é importado pelos comandos que precisam dele,
+# para que `buffer --help` responda rápido
 
 @click.group()
 def cli():
@@ -12,9 +13,91 @@ def cli():
 @click.option('--port', default=5000, help='Port to bind the server to')
 def run(host, port):
     """Run the Buffer server"""
+    from .server import create_app
     app = create_app()
     click.echo(f"Starting Buffer server on http://{host}:{port}")
     app.run(host=host, port=port, debug=True)
 
+@cli.command()
+@click.option('--host', default='127.0.0.1', help='Host to bind the server to')
+@click.option('--port', default=5000, help='Port to bind the server to')
+@click.option('--threads', default=8, help='Number of worker threads handling requests')
+@click.option('--backlog', default=1024, help='Maximum number of pending socket connections')
+@click.option('--keep-alive', default=120, help='Seconds an idle keep-alive connection is kept open')
+@click.option('--connection-limit', default=1000, help='Maximum number of simultaneous connections')
+@click.option('--graceful-timeout', default=30, help='Seconds to wait for in-flight requests on shutdown')
+def serve(host, port, threads, backlog, keep_alive, connection_limit, graceful_timeout):
+    """Run the Buffer server with a production WSGI server"""
+    from .server import create_app, scheduler
+    from .serving import serve as serve_app
+    app = create_app()
+    click.echo(f"Serving Buffer on http://{host}:{port} ({threads} threads)")
+    serve_app(
+        app,
+        scheduler,
+        host=host,
+        port=port,
+        threads=threads,
+        backlog=backlog,
+        keep_alive=keep_alive,
+        connection_limit=connection_limit,
+        graceful_timeout=graceful_timeout
+    )
+
+@cli.command()
+@click.argument('capture_file', required=False, type=click.Path(exists=True, dir_okay=False))
+@click.option('--database', type=click.Path(exists=True, dir_okay=False),
+              help='Replay the received_messages of this database instead of a capture file')
+@click.option('--url', default='http://127.0.0.1:5000', help='Base URL of the Buffer instance to send to')
+@click.option('--speed', default='1x', help="Replay speed: 1x, 10x, any factor, or 'max'")
+@click.option('--concurrency', default=8, help='Number of requests in flight')
+@click.option('--buffer', 'buffer_maps', multiple=True,
+              help='Send a captured buffer to another buffer id: <captured id>=<target id> (repeatable)')
+@click.option('--only', 'only_buffers', multiple=True, type=int, help='Replay only this captured buffer id (repeatable)')
+@click.option('--limit', type=int, help='Replay at most this many requests (database only)')
+@click.option('--json', 'as_json', is_flag=True, help='Print the report as JSON')
+def replay(capture_file, database, url, speed, concurrency, buffer_maps, only_buffers, limit, as_json):
+    """Re-send captured webhook traffic and report throughput and latency"""
+    import json
+
+    from .capture import database_records, read_capture
+    from .replay import parse_buffer_map, parse_speed, replay as run_replay
+
+    if bool(capture_file) == bool(database):
+        raise click.UsageError('Pass either a capture file or --database')
+    try:
+        speed = parse_speed(speed)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--speed')
+    try:
+        buffer_map = parse_buffer_map(buffer_maps)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint='--buffer')
+    if database:
+        records = database_records(database, only_buffers, limit)
+    else:
+        records = read_capture(capture_file)
+        if only_buffers:
+            records = (record for record in records if record[1] in only_buffers)
+    try:
+        report = run_replay(records, url, speed, concurrency, buffer_map)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    if as_json:
+        click.echo(json.dumps(report, indent=2))
+        return
+    click.echo(f"Sent {report['requests']} requests in {report['elapsed_seconds']}s "
+               f"({report['throughput_per_s']} req/s; capture spans {report['capture_seconds']}s)")
+    latency = report['latency']
+    if latency['count']:
+        click.echo(f"Latency ms: p50 {latency['p50_ms']}  p90 {latency['p90_ms']}  "
+                   f"p99 {latency['p99_ms']}  max {latency['max_ms']}")
+    if report.get('lag', {}).get('count'):
+        click.echo(f"Behind schedule ms: p50 {report['lag']['p50_ms']}  p99 {report['lag']['p99_ms']}")
+    click.echo(f"Statuses: {', '.join(f'{status}: {count}' for status, count in sorted(report['statuses'].items()))}")
+    if report['errors']:
+        click.echo(f"Errors: {', '.join(f'{name}: {count}' for name, count in report['errors'].items())}")
+
 if __name__ == '__main__':
-    cli() 
\ No newline at end of file
+    cli()
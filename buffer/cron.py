@@ -0,0 +1,130 @@
+"""Cached cron parsing shared by validation, previews and the scheduler.
+
+Parsing a crontab line with croniter or APScheduler is far more expensive
+than using the parsed object, and most deployments reuse a handful of
+expressions across many schedules, so parsed objects are kept in LRU caches.
+"""
+import functools
+from datetime import datetime, timedelta
+
+from apscheduler.triggers.base import BaseTrigger
+from apscheduler.triggers.cron import CronTrigger
+from croniter import croniter
+from dateutil import tz
+
+CACHE_SIZE = 4096
+MAX_PREVIEW_COUNT = 100
+# Fires inspected when measuring the shortest period of an expression; enough
+# to cover a year of anything coarser than daily.
+PERIOD_SAMPLE_FIRES = 400
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def get_trigger(expression):
+    """Return the (shared, read-only) CronTrigger for a crontab expression."""
+    return CronTrigger.from_crontab(expression)
+
+
+def cron_error(expression):
+    """Return why ``expression`` is not a usable cron expression, or None."""
+    if not isinstance(expression, str) or not expression.strip():
+        return "Cron expression must be a non-empty string"
+    return _cron_error(expression)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _cron_error(expression):
+    if not croniter.is_valid(expression):
+        return "Invalid cron expression"
+    try:
+        get_trigger(expression)
+    except ValueError as e:
+        return f"Invalid cron expression: {str(e)}"
+    return None
+
+
+def is_valid_cron(expression):
+    return cron_error(expression) is None
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def min_period(expression):
+    """Return the shortest gap, in whole seconds, between two fires of ``expression``."""
+    trigger = get_trigger(expression)
+    now = datetime.now(trigger.timezone)
+    previous = trigger.get_next_fire_time(None, now)
+    shortest = None
+    for _ in range(PERIOD_SAMPLE_FIRES):
+        next_time = trigger.get_next_fire_time(previous, previous)
+        if next_time is None:
+            break
+        gap = int((next_time - previous).total_seconds())
+        if shortest is None or gap < shortest:
+            shortest = gap
+        previous = next_time
+    return shortest or 0
+
+
+def spread_offset(schedule_id, expression):
+    """Stable offset, in seconds, of a schedule inside its cron period.
+
+    Uses Knuth's multiplicative hash so that consecutive ids land evenly
+    across the period. The offset is always shorter than the shortest gap
+    between two fires, so every period still gets exactly one fire.
+    """
+    fraction = (int(schedule_id) * 2654435761 % 2 ** 32) / 2 ** 32
+    return int(fraction * min_period(expression))
+
+
+class SpreadTrigger(BaseTrigger):
+    """Cron trigger shifted by a constant per-schedule offset."""
+
+    __slots__ = ('trigger', 'offset')
+
+    def __init__(self, trigger, offset):
+        self.trigger = trigger
+        self.offset = timedelta(seconds=offset)
+
+    @property
+    def timezone(self):
+        return self.trigger.timezone
+
+    def get_next_fire_time(self, previous_fire_time, now):
+        if previous_fire_time is not None:
+            previous_fire_time = previous_fire_time - self.offset
+        next_time = self.trigger.get_next_fire_time(previous_fire_time, now - self.offset)
+        return next_time + self.offset if next_time is not None else None
+
+    def __str__(self):
+        return f"{self.trigger} +{int(self.offset.total_seconds())}s"
+
+    def __repr__(self):
+        return f"<SpreadTrigger ({self.trigger!r}, offset={int(self.offset.total_seconds())}s)>"
+
+
+def build_trigger(schedule):
+    """Return the trigger the scheduler should use for a schedule row."""
+    trigger = get_trigger(schedule['cronExpression'])
+    if schedule.get('spread') and schedule.get('id') is not None:
+        return SpreadTrigger(trigger, spread_offset(schedule['id'], schedule['cronExpression']))
+    return trigger
+
+
+def next_fire_times(trigger, count=5, timezone='UTC', start=None):
+    """Return the next ``count`` fire times of ``trigger`` as ISO strings.
+
+    Times are expressed in ``timezone`` (the display timezone from settings).
+    """
+    display_tz = tz.gettz(timezone) or tz.UTC
+    now = start or datetime.now(trigger.timezone)
+    fire_times = []
+    previous = None
+    for _ in range(count):
+        next_time = trigger.get_next_fire_time(previous, now)
+        if next_time is None:
+            break
+        fire_times.append(next_time.astimezone(display_tz).isoformat())
+        previous = next_time
+        now = next_time
+    return fire_times
+
@@ -0,0 +1,192 @@
+"""Server-Sent Events for new executions and received/forwarded messages.
+
+The database is the event log: each event type is read from its table by
+primary key, and the SSE event id is the cursor of last-seen ids
+(``executions.received.forwarded``, then the status and message log parts
+below). A reconnecting ``EventSource`` sends
+it back as ``Last-Event-ID`` and resumes exactly where it stopped, across
+server restarts included. Writers call ``notify()`` so open streams wake up
+immediately instead of polling; streams still re-check every
+``KEEPALIVE`` seconds, which also catches rows written by other processes.
+
+Status-only changes of received messages (``retrying``, ``cancelled``,
+``error``...) add no row, so they are kept in a ring of the last
+``STATUS_CAPACITY`` changes in memory and sent as ``status`` events. The
+fourth part of the cursor is the sequence of the last change seen. A stream
+that resumes after changes it can no longer see (after a restart, or too
+far behind) gets a ``resync`` event, and the client reloads its lists.
+
+Messages of buffers with ``ingest_log`` have no ``received_messages`` row:
+they are read from the message log, also by id, and sent as ``received``
+events too. The fifth part of the cursor is the last log id seen.
+"""
+import json
+import threading
+import time
+from collections import deque
+
+from . import msglog
+
+KEEPALIVE = 15
+# Streams end after this long and the browser reconnects with Last-Event-ID,
+# so a stream never pins a server thread indefinitely
+MAX_STREAM_SECONDS = 300
+RETRY_MS = 2000
+BATCH_SIZE = 500
+
+STATUS_CAPACITY = 10000
+
+# Tipos lidos das tabelas; status vem do ChangeNotifier
+TABLE_TYPES = ('execution', 'received', 'forwarded')
+EVENT_TYPES = TABLE_TYPES + ('status',)
+# Partes do cursor: um id por tabela, a sequência de status e o último id do log
+CURSOR_PARTS = EVENT_TYPES + ('log',)
+
+QUERIES = {
+    'execution': 'SELECT * FROM executions WHERE id > ? ORDER BY id LIMIT ?',
+    'received': 'SELECT * FROM received_messages WHERE id > ? ORDER BY id LIMIT ?',
+    'forwarded': '''
+        SELECT fm.*, fc.name as forwarding_config_name
+        FROM forwarded_messages fm
+        LEFT JOIN forwarding_configs fc ON fm.forwarding_config_id = fc.id
+        WHERE fm.id > ? ORDER BY fm.id LIMIT ?
+    ''',
+}
+
+MAX_ID_QUERIES = {
+    'execution': 'SELECT MAX(id) FROM executions',
+    'received': 'SELECT MAX(id) FROM received_messages',
+    'forwarded': 'SELECT MAX(id) FROM forwarded_messages',
+}
+
+
+class ChangeNotifier:
+    """Wakes up waiting streams when one of the event tables is written."""
+
+    def __init__(self, status_capacity=STATUS_CAPACITY):
+        self.condition = threading.Condition()
+        self.version = 0
+        # (sequência, message_ids, status, forwarded_id)
+        self.statuses = deque(maxlen=status_capacity)
+        # Começa no relógio para que cursores de antes de um reinício fiquem fora do anel
+        self.status_seq = time.time_ns() // 1_000_000
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+
+    def status_changed(self, message_ids, status, forwarded_id=None):
+        """Record a status change of received messages and wake up the streams."""
+        with self.condition:
+            self.status_seq += 1
+            self.statuses.append((self.status_seq, list(message_ids), status, forwarded_id))
+            self.version += 1
+            self.condition.notify_all()
+
+    def statuses_since(self, seq):
+        """``(changes, complete)``: the status changes after ``seq``; ``complete`` is False
+        when some of them are no longer available."""
+        with self.condition:
+            if seq > self.status_seq:
+                return [], False
+            oldest = self.statuses[0][0] if self.statuses else self.status_seq + 1
+            return [change for change in self.statuses if change[0] > seq], seq + 1 >= oldest
+
+    def wait(self, version, timeout):
+        """Block until ``notify()`` after ``version`` or ``timeout``; returns the current version."""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+def parse_cursor(value):
+    """``"12.40.7.3.N"`` -> ``{'execution': 12, 'received': 40, 'forwarded': 7, 'status': 3, 'log': N}``;
+    None if malformed.
+
+    Cursors without the status or log part resume those from now on.
+    """
+    parts = (value or '').split('.')
+    if not len(TABLE_TYPES) <= len(parts) <= len(CURSOR_PARTS) or not all(part.isdigit() for part in parts):
+        return None
+    cursor = dict.fromkeys(CURSOR_PARTS)
+    cursor.update(zip(CURSOR_PARTS, (int(part) for part in parts)))
+    return cursor
+
+
+def format_cursor(cursor):
+    return '.'.join(str(cursor[part]) for part in CURSOR_PARTS)
+
+
+def format_event(event_type, data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {json.dumps(data)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def current_cursor(conn):
+    return {event_type: conn.execute(query).fetchone()[0] or 0 for event_type, query in MAX_ID_QUERIES.items()}
+
+
+def read_events(conn, cursor, types, message_log=None):
+    """New rows after ``cursor`` for each of ``types``, as ``(type, cursor part, row)`` in write order per part."""
+    events = []
+    for event_type in types:
+        if event_type not in QUERIES:
+            continue
+        rows = [dict(row) for row in conn.execute(QUERIES[event_type], (cursor[event_type], BATCH_SIZE))]
+        if event_type == 'forwarded':
+            for row in rows:
+                # Mensagens recebidas atualizadas por este encaminhamento; as do log chegam em eventos status
+                row['message_ids'] = [r[0] for r in conn.execute(
+                    'SELECT id FROM received_messages WHERE forwarded_id = ?', (row['id'],)
+                )]
+        events.extend((event_type, event_type, row) for row in rows)
+        if event_type == 'received' and message_log is not None:
+            events.extend(('received', 'log', row) for row in message_log.after(cursor['log'], BATCH_SIZE))
+    return events
+
+
+def stream(db_pool, notifier, cursor, types, max_seconds=MAX_STREAM_SECONDS, message_log=None):
+    """Generator of SSE chunks, starting after ``cursor`` (None: from now on).
+
+    With ``message_log``, ``received`` events include the messages of the log.
+    """
+    yield f'retry: {RETRY_MS}\n\n'
+    if cursor is None:
+        with db_pool.get_connection() as conn:
+            cursor = dict.fromkeys(CURSOR_PARTS)
+            cursor.update(current_cursor(conn))
+    if cursor['status'] is None:
+        cursor['status'] = notifier.status_seq
+    if cursor['log'] is None:
+        cursor['log'] = message_log.last_id() if message_log is not None else msglog.ID_BASE
+    yield format_event('ready', {'cursor': format_cursor(cursor)}, format_cursor(cursor))
+    deadline = time.monotonic() + max_seconds
+    version = notifier.version
+    while time.monotonic() < deadline:
+        with db_pool.get_connection() as conn:
+            events = read_events(conn, cursor, types, message_log)
+        for event_type, part, row in events:
+            cursor[part] = row['id']
+            yield format_event(event_type, row, format_cursor(cursor))
+        if 'status' in types:
+            changes, complete = notifier.statuses_since(cursor['status'])
+            if not complete:
+                cursor['status'] = notifier.status_seq
+                yield format_event('resync', {}, format_cursor(cursor))
+                changes = [change for change in changes if change[0] > cursor['status']]
+            for seq, message_ids, status, forwarded_id in changes:
+                cursor['status'] = seq
+                yield format_event('status', {'message_ids': message_ids, 'status': status,
+                                              'forwarded_id': forwarded_id}, format_cursor(cursor))
+        if len(events) >= BATCH_SIZE:
+            # Ainda há eventos pendentes: continuar sem esperar
+            continue
+        new_version = notifier.wait(version, min(KEEPALIVE, max(0, deadline - time.monotonic())))
+        if new_version == version:
+            yield ': keep-alive\n\n'
+        version = new_version
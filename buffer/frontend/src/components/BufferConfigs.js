@@ -10,6 +10,15 @@ function BufferConfigs() {
     filter_field: '',
     max_size: 10,
     max_time: 60,
+    max_bytes: 0,
+    rate_limit: 0,
+    rate_burst: 0,
+    max_pending: 0,
+    adaptive: false,
+    ingest_log: false,
+    ordered: false,
+    min_size: 1,
+    min_time: 1,
     reset_timer_on_message: false
   });
   const [editConfig, setEditConfig] = useState(null);
@@ -45,6 +54,15 @@ function BufferConfigs() {
           filter_field: '',
           max_size: 10,
           max_time: 60,
+          max_bytes: 0,
+          rate_limit: 0,
+          rate_burst: 0,
+          max_pending: 0,
+          adaptive: false,
+          ingest_log: false,
+          ordered: false,
+          min_size: 1,
+          min_time: 1,
           reset_timer_on_message: false
         });
         fetchConfigs();
@@ -158,6 +176,118 @@ function BufferConfigs() {
                   min="1"
                 />
               </div>
+              <div className="form-group">
+                <label>Max Buffer Bytes (0 = no limit):</label>
+                <input
+                  type="number"
+                  name="max_bytes"
+                  value={formData.max_bytes}
+                  onChange={handleInputChange}
+                  min="0"
+                />
+              </div>
+              <div className="form-group">
+                <label>Rate Limit (messages/s, 0 = no limit):</label>
+                <input
+                  type="number"
+                  name="rate_limit"
+                  value={formData.rate_limit}
+                  onChange={handleInputChange}
+                  min="0"
+                  step="any"
+                />
+              </div>
+              <div className="form-group">
+                <label>Rate Burst (0 = one second of rate):</label>
+                <input
+                  type="number"
+                  name="rate_burst"
+                  value={formData.rate_burst}
+                  onChange={handleInputChange}
+                  min="0"
+                />
+              </div>
+              <div className="form-group">
+                <label>Max Pending Messages (0 = no limit):</label>
+                <input
+                  type="number"
+                  name="max_pending"
+                  value={formData.max_pending}
+                  onChange={handleInputChange}
+                  min="0"
+                />
+              </div>
+              <div className="form-group">
+                <label>Idempotency Key (optional):</label>
+                <input
+                  type="text"
+                  name="idempotency_key"
+                  value={formData.idempotency_key || ''}
+                  onChange={handleInputChange}
+                  placeholder="e.g., header:Idempotency-Key or field:order_id"
+                />
+              </div>
+              <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                <label htmlFor="ingest_log" style={{ marginBottom: 0, marginRight: 8 }}>
+                  Store messages in the message log (ingest-heavy buffers):
+                </label>
+                <input
+                  type="checkbox"
+                  id="ingest_log"
+                  name="ingest_log"
+                  checked={!!formData.ingest_log}
+                  onChange={e => setFormData(prev => ({ ...prev, ingest_log: e.target.checked }))}
+                />
+              </div>
+              <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                <label htmlFor="ordered" style={{ marginBottom: 0, marginRight: 8 }}>
+                  Ordered delivery (flushes of the same key are sent in sequence):
+                </label>
+                <input
+                  type="checkbox"
+                  id="ordered"
+                  name="ordered"
+                  checked={!!formData.ordered}
+                  onChange={e => setFormData(prev => ({ ...prev, ordered: e.target.checked }))}
+                />
+              </div>
+              <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                <label htmlFor="adaptive" style={{ marginBottom: 0, marginRight: 8 }}>
+                  Adaptive flush (max size/time become upper bounds):
+                </label>
+                <input
+                  type="checkbox"
+                  id="adaptive"
+                  name="adaptive"
+                  checked={!!formData.adaptive}
+                  onChange={e => setFormData(prev => ({ ...prev, adaptive: e.target.checked }))}
+                />
+              </div>
+              {formData.adaptive && (
+                <>
+                  <div className="form-group">
+                    <label>Min Buffer Size:</label>
+                    <input
+                      type="number"
+                      name="min_size"
+                      value={formData.min_size}
+                      onChange={handleInputChange}
+                      min="1"
+                    />
+                  </div>
+                  <div className="form-group">
+                    <label>Min Buffer Time (seconds):</label>
+                    <input
+                      type="number"
+                      name="min_time"
+                      value={formData.min_time}
+                      onChange={handleInputChange}
+                      min="0"
+                      step="any"
+                    />
+                  </div>
+                </>
+              )}
               <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
                 <label htmlFor="reset_timer_on_message" style={{ marginBottom: 0, marginRight: 8 }}>
                   Reset timer on each new message (debounce):
@@ -192,6 +322,13 @@ function BufferConfigs() {
               <p><strong>Key Field:</strong> {config.filter_field}</p>
               <p><strong>Max Size:</strong> {config.max_size}</p>
               <p><strong>Max Time (s):</strong> {config.max_time}</p>
+              {config.max_bytes > 0 && <p><strong>Max Bytes:</strong> {config.max_bytes}</p>}
+              {config.rate_limit > 0 && <p><strong>Rate Limit:</strong> {config.rate_limit}/s</p>}
+              {config.max_pending > 0 && <p><strong>Max Pending:</strong> {config.max_pending}</p>}
+              {config.idempotency_key && <p><strong>Idempotency Key:</strong> {config.idempotency_key}</p>}
+              {!!config.ingest_log && <p><strong>Storage:</strong> message log</p>}
+              {!!config.ordered && <p><strong>Delivery:</strong> ordered per key</p>}
+              {!!config.adaptive && <p><strong>Adaptive:</strong> {config.min_size}-{config.max_size} messages, {config.min_time}-{config.max_time}s</p>}
               <p><strong>Reset Timer on Message:</strong> {config.reset_timer_on_message ? 'TRUE' : 'FALSE'}</p>
               <p><strong>Created:</strong> {new Date(config.createdAt).toLocaleString()}</p>
               <p><strong>Webhook URL:</strong> <code>http://127.0.0.1:5000/api/webhook/{config.id}</code></p>
@@ -254,6 +391,118 @@ function BufferConfigs() {
                   min="1"
                 />
               </div>
+              <div className="form-group">
+                <label>Max Buffer Bytes (0 = no limit):</label>
+                <input
+                  type="number"
+                  name="max_bytes"
+                  value={editConfig.max_bytes}
+                  onChange={handleEditInputChange}
+                  min="0"
+                />
+              </div>
+              <div className="form-group">
+                <label>Rate Limit (messages/s, 0 = no limit):</label>
+                <input
+                  type="number"
+                  name="rate_limit"
+                  value={editConfig.rate_limit}
+                  onChange={handleEditInputChange}
+                  min="0"
+                  step="any"
+                />
+              </div>
+              <div className="form-group">
+                <label>Rate Burst (0 = one second of rate):</label>
+                <input
+                  type="number"
+                  name="rate_burst"
+                  value={editConfig.rate_burst}
+                  onChange={handleEditInputChange}
+                  min="0"
+                />
+              </div>
+              <div className="form-group">
+                <label>Max Pending Messages (0 = no limit):</label>
+                <input
+                  type="number"
+                  name="max_pending"
+                  value={editConfig.max_pending}
+                  onChange={handleEditInputChange}
+                  min="0"
+                />
+              </div>
+              <div className="form-group">
+                <label>Idempotency Key (optional):</label>
+                <input
+                  type="text"
+                  name="idempotency_key"
+                  value={editConfig.idempotency_key || ''}
+                  onChange={handleEditInputChange}
+                  placeholder="e.g., header:Idempotency-Key or field:order_id"
+                />
+              </div>
+              <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                <label htmlFor="ingest_log_edit" style={{ marginBottom: 0, marginRight: 8 }}>
+                  Store messages in the message log (ingest-heavy buffers):
+                </label>
+                <input
+                  type="checkbox"
+                  id="ingest_log_edit"
+                  name="ingest_log"
+                  checked={!!editConfig.ingest_log}
+                  onChange={e => setEditConfig(prev => ({ ...prev, ingest_log: e.target.checked }))}
+                />
+              </div>
+              <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                <label htmlFor="ordered_edit" style={{ marginBottom: 0, marginRight: 8 }}>
+                  Ordered delivery (flushes of the same key are sent in sequence):
+                </label>
+                <input
+                  type="checkbox"
+                  id="ordered_edit"
+                  name="ordered"
+                  checked={!!editConfig.ordered}
+                  onChange={e => setEditConfig(prev => ({ ...prev, ordered: e.target.checked }))}
+                />
+              </div>
+              <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
+                <label htmlFor="adaptive_edit" style={{ marginBottom: 0, marginRight: 8 }}>
+                  Adaptive flush (max size/time become upper bounds):
+                </label>
+                <input
+                  type="checkbox"
+                  id="adaptive_edit"
+                  name="adaptive"
+                  checked={!!editConfig.adaptive}
+                  onChange={e => setEditConfig(prev => ({ ...prev, adaptive: e.target.checked }))}
+                />
+              </div>
+              {editConfig.adaptive && (
+                <>
+                  <div className="form-group">
+                    <label>Min Buffer Size:</label>
+                    <input
+                      type="number"
+                      name="min_size"
+                      value={editConfig.min_size}
+                      onChange={handleEditInputChange}
+                      min="1"
+                    />
+                  </div>
+                  <div className="form-group">
+                    <label>Min Buffer Time (seconds):</label>
+                    <input
+                      type="number"
+                      name="min_time"
+                      value={editConfig.min_time}
+                      onChange={handleEditInputChange}
+                      min="0"
+                      step="any"
+                    />
+                  </div>
+                </>
+              )}
               <div className="form-group" style={{ display: 'flex', alignItems: 'center', gap: 8 }}>
                 <label htmlFor="reset_timer_on_message_edit" style={{ marginBottom: 0, marginRight: 8 }}>
                   Reset timer on each new message (debounce):
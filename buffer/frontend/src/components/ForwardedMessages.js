@@ -1,4 +1,5 @@
 import React, { useEffect, useState } from 'react';
+import { mergeById, subscribeEvents } from '../eventStream';
 import './Messages.css';
 
 function ForwardedMessages() {
@@ -13,7 +14,11 @@ function ForwardedMessages() {
   const [expanded, setExpanded] = useState({});
 
   useEffect(() => {
+    const unsubscribe = subscribeEvents({
+      forwarded: message => setForwardedMessages(prev => mergeById(prev, [message]))
+    }, fetchMessages);
     fetchMessages();
+    return unsubscribe;
   }, []);
 
   const fetchMessages = async () => {
@@ -21,7 +26,7 @@ function ForwardedMessages() {
     try {
       const response = await fetch('/api/messages/forwarded');
       const data = await response.json();
-      setForwardedMessages(data);
+      setForwardedMessages(prev => mergeById(prev, data));
     } catch (error) {
       console.error('Error fetching forwarded messages:', error);
     }
@@ -247,6 +247,9 @@ function ForwardingConfigs() {
               <p><strong>Buffer:</strong> {bufferConfigs.find(b => b.id === config.buffer_config_id)?.name || config.buffer_config_id}</p>
               <p><strong>URL:</strong> <span style={{ wordBreak: 'break-all' }}>{config.url}</span></p>
               <p><strong>Method:</strong> {config.method}</p>
+              {config.circuit && config.circuit.state !== 'closed' && (
+                <p><strong>Circuit:</strong> <span className={`status circuit-${config.circuit.state}`}>{config.circuit.state.replace('_', '-')}</span></p>
+              )}
               <p><strong>Headers:</strong></p>
               <pre className="message-content">{JSON.stringify(JSON.parse(config.headers || '{}'), null, 2)}</pre>
               <p><strong>Created:</strong> {new Date(config.createdAt).toLocaleString()}</p>
@@ -1,5 +1,6 @@
 import { DateTime } from 'luxon';
 import React, { useEffect, useState } from 'react';
+import { mergeById, subscribeEvents } from '../eventStream';
 import './Logs.css';
 
 function Logs() {
@@ -14,13 +15,23 @@ function Logs() {
     const [filterEnd, setFilterEnd] = useState('');
 
     useEffect(() => {
+        // Novas execuções chegam pelo stream de eventos; sem stream, fetchLogs a cada 30s
+        const unsubscribe = subscribeEvents({
+            execution: execution => setLogs(prev => sortLogs(mergeById(prev, [execution], Infinity)))
+        }, fetchLogs);
         fetchLogs();
         fetchTimezone();
-        // Atualiza os logs a cada 30 segundos
-        const interval = setInterval(fetchLogs, 30000);
-        return () => clearInterval(interval);
+        return unsubscribe;
     }, []);
 
+    // Ordenar por scheduleId e data de execução (mais recente primeiro)
+    const sortLogs = (data) => [...data].sort((a, b) => {
+        if (a.scheduleId !== b.scheduleId) {
+            return a.scheduleId - b.scheduleId;
+        }
+        return new Date(b.executedAt) - new Date(a.executedAt);
+    });
+
     const fetchTimezone = async () => {
         try {
             const response = await fetch('/api/settings/timezone');
@@ -36,14 +47,7 @@ function Logs() {
             setLoading(true);
             const response = await fetch('/api/executions');
             const data = await response.json();
-            // Ordenar por scheduleId e data de execução (mais recente primeiro)
-            const sortedLogs = data.sort((a, b) => {
-                if (a.scheduleId !== b.scheduleId) {
-                    return a.scheduleId - b.scheduleId;
-                }
-                return new Date(b.executedAt) - new Date(a.executedAt);
-            });
-            setLogs(sortedLogs);
+            setLogs(prev => sortLogs(mergeById(prev, data, Infinity)));
             setError(null);
         } catch (error) {
             console.error('Error fetching logs:', error);
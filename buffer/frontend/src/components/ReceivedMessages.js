@@ -1,4 +1,5 @@
 import React, { useEffect, useState } from 'react';
+import { mergeById, subscribeEvents } from '../eventStream';
 import './Messages.css';
 
 function ReceivedMessages() {
@@ -14,7 +15,23 @@ function ReceivedMessages() {
   });
 
   useEffect(() => {
+    const unsubscribe = subscribeEvents({
+      received: message => setReceivedMessages(prev => mergeById(prev, [message])),
+      // Um encaminhamento atualiza o status das mensagens do grupo
+      forwarded: forwarded => setReceivedMessages(prev => prev.map(message =>
+        forwarded.message_ids.includes(message.id)
+          ? { ...message, processed: 1, status: forwarded.status, forwarded_id: forwarded.id }
+          : message
+      )),
+      // Mudanças só de status (retrying, cancelled, error...)
+      status: change => setReceivedMessages(prev => prev.map(message =>
+        change.message_ids.includes(message.id)
+          ? { ...message, processed: 1, status: change.status, forwarded_id: change.forwarded_id ?? message.forwarded_id }
+          : message
+      ))
+    }, fetchMessages);
     fetchMessages();
+    return unsubscribe;
   }, []);
 
   const fetchMessages = async () => {
@@ -22,7 +39,7 @@ function ReceivedMessages() {
     try {
       const response = await fetch('/api/messages/received');
       const data = await response.json();
-      setReceivedMessages(data);
+      setReceivedMessages(prev => mergeById(prev, data));
     } catch (error) {
       console.error('Error fetching messages:', error);
     }
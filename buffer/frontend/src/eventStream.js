@@ -0,0 +1,94 @@
+// Um único stream SSE de /api/events por aba, compartilhado por todas as telas.
+// Quedas comuns o navegador reconecta sozinho enviando Last-Event-ID, então nenhum
+// evento é perdido. Se o servidor recusa o stream (por exemplo 503 quando o limite de
+// streams foi atingido) o EventSource não tenta de novo: as telas voltam a consultar a
+// API a cada POLL_INTERVAL_MS e o stream é reaberto no mesmo intervalo.
+const POLL_INTERVAL_MS = 30000;
+
+const subscribers = new Set();
+let source = null;
+let pollTimer = null;
+
+function dispatch(type, data) {
+  subscribers.forEach(subscriber => {
+    if (subscriber.handlers[type]) {
+      subscriber.handlers[type](data);
+    }
+  });
+}
+
+function refreshAll() {
+  subscribers.forEach(subscriber => subscriber.refresh && subscriber.refresh());
+}
+
+function open() {
+  source = new EventSource('/api/events');
+  source.addEventListener('ready', () => {
+    if (pollTimer) {
+      // Voltou depois de um período sem stream: recarregar o que pode ter mudado
+      clearInterval(pollTimer);
+      pollTimer = null;
+      refreshAll();
+    }
+  });
+  ['execution', 'received', 'forwarded', 'status', 'resync'].forEach(type => {
+    source.addEventListener(type, event => {
+      if (type === 'resync') {
+        // O servidor não tem mais as mudanças desde o último evento visto
+        refreshAll();
+      } else {
+        dispatch(type, JSON.parse(event.data));
+      }
+    });
+  });
+  source.onerror = () => {
+    if (source.readyState !== EventSource.CLOSED) {
+      console.warn('Event stream disconnected, reconnecting...');
+      return;
+    }
+    console.warn(`Event stream unavailable, polling every ${POLL_INTERVAL_MS / 1000}s`);
+    source = null;
+    if (!pollTimer) {
+      pollTimer = setInterval(() => {
+        refreshAll();
+        if (!source && subscribers.size) {
+          open();
+        }
+      }, POLL_INTERVAL_MS);
+    }
+  };
+}
+
+function close() {
+  if (source) {
+    source.close();
+    source = null;
+  }
+  if (pollTimer) {
+    clearInterval(pollTimer);
+    pollTimer = null;
+  }
+}
+
+// Assina eventos do stream compartilhado. `refresh` recarrega a tela inteira e é usado
+// enquanto o stream está indisponível e quando o servidor pede uma ressincronização.
+export function subscribeEvents(handlers, refresh) {
+  const subscriber = { handlers, refresh };
+  subscribers.add(subscriber);
+  if (!source && !pollTimer) {
+    open();
+  }
+  return () => {
+    subscribers.delete(subscriber);
+    if (!subscribers.size) {
+      close();
+    }
+  };
+}
+
+// Junta linhas por id (as recebidas substituem as existentes), mais recentes primeiro
+export function mergeById(rows, incoming, limit = 1000) {
+  const byId = new Map(rows.map(row => [row.id, row]));
+  incoming.forEach(row => byId.set(row.id, { ...byId.get(row.id), ...row }));
+  return [...byId.values()].sort((a, b) => b.id - a.id).slice(0, limit);
+}
@@ -0,0 +1,74 @@
+"""Idempotent webhook ingestion.
+
+A buffer config's ``idempotency_key`` names where producers put a key that
+identifies a message across retries: ``header:<Header-Name>`` or
+``field:<json_field>``. The key is stored in ``received_messages`` under a
+unique ``(buffer_id, idempotency_key)`` index, which is the source of
+truth. ``IdempotencyIndex`` keeps recent keys in memory (LRU, bounded by
+size and age) so that most retries are answered without touching the
+database.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CAPACITY = int(os.environ.get('BUFFER_IDEMPOTENCY_CAPACITY') or 100000)
+# Segundos que uma chave fica no índice em memória; depois disso o índice único do banco responde
+WINDOW = float(os.environ.get('BUFFER_IDEMPOTENCY_WINDOW') or 3600)
+SOURCES = ('header', 'field')
+
+
+def parse_spec(spec):
+    """``'header:Idempotency-Key'`` -> ``('header', 'Idempotency-Key')``; None for an empty spec.
+
+    Raises ValueError when the spec is malformed.
+    """
+    if not spec:
+        return None
+    source, _, name = spec.partition(':')
+    if source not in SOURCES or not name:
+        raise ValueError("idempotency_key must be 'header:<name>' or 'field:<name>'")
+    return source, name
+
+
+def extract_key(spec, headers, message_data):
+    """The idempotency key of a request, or None when the buffer has none or the request lacks it."""
+    parsed = parse_spec(spec)
+    if parsed is None:
+        return None
+    source, name = parsed
+    value = headers.get(name) if source == 'header' else message_data.get(name)
+    return None if value is None or value == '' else str(value)
+
+
+class IdempotencyIndex:
+    """``(buffer_id, key) -> message_id`` for recently received keys."""
+
+    def __init__(self, capacity=CAPACITY, window=WINDOW):
+        self.capacity = capacity
+        self.window = window
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+
+    def get(self, buffer_id, key):
+        with self.lock:
+            entry = self.entries.get((buffer_id, key))
+            if entry is None:
+                return None
+            message_id, stored_at = entry
+            if time.monotonic() - stored_at > self.window:
+                del self.entries[(buffer_id, key)]
+                return None
+            self.entries.move_to_end((buffer_id, key))
+            return message_id
+
+    def put(self, buffer_id, key, message_id):
+        with self.lock:
+            self.entries[(buffer_id, key)] = (message_id, time.monotonic())
+            self.entries.move_to_end((buffer_id, key))
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
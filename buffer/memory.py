@@ -0,0 +1,139 @@
+"""Memory accounting for buffered messages.
+
+Buffered messages keep their payload as the serialized JSON already written
+to ``received_messages`` (see ``BufferGroup``), and its size is what is
+accounted here. Two limits
+apply:
+
+- ``max_bytes`` on a buffer config flushes a key once its payloads reach
+  that size, like ``max_size`` does for the message count;
+- the global ``BUFFER_MAX_MEMORY_BYTES`` budget. Once the resident payloads
+  of every key exceed it, the largest keys are either spilled (their
+  payloads are dropped from memory and read back from ``received_messages``,
+  or the message log, when the key is flushed) or flushed early, per ``BUFFER_MEMORY_POLICY``,
+  until the total is back under ``LOW_WATERMARK`` of the budget.
+"""
+import json
+import os
+import threading
+from array import array
+
+from . import msglog
+
+# 0: sem limite global
+MAX_MEMORY_BYTES = int(os.environ.get('BUFFER_MAX_MEMORY_BYTES') or 0)
+MEMORY_POLICY = os.environ.get('BUFFER_MEMORY_POLICY') or 'spill'
+POLICIES = ('spill', 'flush')
+# Libera um pouco abaixo do limite para não disparar a cada nova mensagem
+LOW_WATERMARK = 0.9
+# Parâmetros por consulta do SQLite
+LOAD_BATCH_SIZE = 500
+
+
+class BufferGroup:
+    """Messages buffered under one key, stored column-wise.
+
+    Ids and arrival times live in typed arrays and payloads as the bytes of
+    their JSON, so a buffered message costs its payload plus a few dozen
+    bytes, instead of a dict per message holding the parsed object. Trace
+    contexts are only kept for the sampled messages.
+    """
+    __slots__ = ('message_ids', 'buffered_at', 'payloads', 'traces', 'bytes', 'resident', 'spilled')
+
+    def __init__(self):
+        self.message_ids = array('q')
+        self.buffered_at = array('d')
+        # None depois de despejado (spill)
+        self.payloads = []
+        # índice -> contexto de trace
+        self.traces = {}
+        # Bytes de payload: no total, ainda em memória; mensagens despejadas
+        self.bytes = 0
+        self.resident = 0
+        self.spilled = 0
+
+    def __len__(self):
+        return len(self.message_ids)
+
+    def append(self, message_id, payload, buffered_at, trace=None):
+        """Add a message whose ``payload`` is its serialized JSON; returns the bytes held."""
+        if trace is not None:
+            self.traces[len(self.message_ids)] = trace
+        payload = payload.encode() if isinstance(payload, str) else payload
+        self.message_ids.append(message_id)
+        self.buffered_at.append(buffered_at)
+        self.payloads.append(payload)
+        self.bytes += len(payload)
+        self.resident += len(payload)
+        return len(payload)
+
+    def spill(self):
+        """Drop every payload still in memory; returns the bytes released."""
+        released = self.resident
+        for index, payload in enumerate(self.payloads):
+            if payload is not None:
+                self.payloads[index] = None
+                self.spilled += 1
+        self.resident = 0
+        return released
+
+    def traced(self):
+        """``(message_id, buffered_at, trace)`` of the sampled messages."""
+        return [(self.message_ids[index], self.buffered_at[index], trace) for index, trace in self.traces.items()]
+
+    def decode(self, conn, message_log=None):
+        """The parsed message dicts, in arrival order; spilled payloads are read from
+        received_messages, or from ``message_log`` for messages stored there."""
+        spilled = [self.message_ids[index] for index, payload in enumerate(self.payloads) if payload is None]
+        stored = load_payloads(conn, spilled, message_log) if spilled else {}
+        messages = []
+        for message_id, payload in zip(self.message_ids, self.payloads):
+            if payload is None:
+                payload = stored.get(message_id)
+            messages.append(json.loads(payload) if payload is not None else {})
+        return messages
+
+
+class MemoryBudget:
+    """Resident payload bytes of all buffered keys against a global limit."""
+
+    def __init__(self, limit=MAX_MEMORY_BYTES, policy=MEMORY_POLICY):
+        if policy not in POLICIES:
+            raise ValueError(f"BUFFER_MEMORY_POLICY must be one of: {', '.join(POLICIES)}")
+        self.limit = limit
+        self.policy = policy
+        self.lock = threading.Lock()
+        self.resident = 0
+
+    def add(self, size):
+        with self.lock:
+            self.resident += size
+
+    def release(self, size):
+        with self.lock:
+            self.resident -= size
+
+    def over(self):
+        return bool(self.limit) and self.resident > self.limit
+
+    def excess(self):
+        """Bytes to release to get back under the low watermark."""
+        return max(0, self.resident - int(self.limit * LOW_WATERMARK)) if self.limit else 0
+
+
+def load_payloads(conn, message_ids, message_log=None):
+    """``{message_id: message_data}`` read back from received_messages (or the message log) for spilled messages."""
+    payloads = {}
+    if message_log is not None:
+        message_ids, log_ids = msglog.split_ids(message_ids)
+        if log_ids:
+            payloads.update(message_log.payloads(log_ids))
+    for index in range(0, len(message_ids), LOAD_BATCH_SIZE):
+        batch = message_ids[index:index + LOAD_BATCH_SIZE]
+        placeholders = ','.join('?' * len(batch))
+        cursor = conn.execute(
+            f'SELECT id, message_data FROM received_messages WHERE id IN ({placeholders})', batch
+        )
+        payloads.update((row[0], row[1]) for row in cursor)
+    return payloads
+
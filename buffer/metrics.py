@@ -0,0 +1,255 @@
+"""In-process metrics rendered in the Prometheus text exposition format.
+
+Counters, gauges and histograms are plain dicts keyed by label values and
+guarded by a lock each, so recording a sample costs a dict lookup and an
+addition. Values that are cheaper to compute at scrape time (buffer sizes,
+pool usage) are exported through collector callbacks instead.
+"""
+import bisect
+import threading
+import time
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000, 10000)
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=(), registry=None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+        self.values = {}
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labelvalues):
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        return tuple(str(value) for value in labelvalues)
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, self.labelnames, key, value) for key, value in self.values.items()]
+
+    def clear(self):
+        with self.lock:
+            self.values.clear()
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, *labelvalues, amount=1):
+        key = self._key(labelvalues)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, *labelvalues):
+        return self.values.get(self._key(labelvalues), 0)
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value, *labelvalues):
+        key = self._key(labelvalues)
+        with self.lock:
+            self.values[key] = value
+
+    def inc(self, *labelvalues, amount=1):
+        key = self._key(labelvalues)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, *labelvalues, amount=1):
+        self.inc(*labelvalues, amount=-amount)
+
+    def get(self, *labelvalues):
+        return self.values.get(self._key(labelvalues), 0)
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS, registry=None):
+        self.buckets = tuple(buckets)
+        super().__init__(name, help, labelnames, registry)
+
+    def observe(self, value, *labelvalues):
+        key = self._key(labelvalues)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # bucket counts (last slot is +Inf), sum
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    def time(self, *labelvalues):
+        return _Timer(self, labelvalues)
+
+    def samples(self):
+        with self.lock:
+            items = [(key, list(counts), total) for key, (counts, total) in self.values.items()]
+        samples = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', self.labelnames, key, cumulative,
+                                f'le="{_format_value(float(bound))}"'))
+            samples.append((f'{self.name}_sum', self.labelnames, key, total))
+            samples.append((f'{self.name}_count', self.labelnames, key, cumulative))
+        return samples
+
+
+class _Timer:
+    def __init__(self, histogram, labelvalues):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labelvalues)
+        return False
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.collectors = []
+        self.named = {}
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def add_collector(self, collector, name=None):
+        """Register ``collector()``, called on every scrape.
+
+        It returns an iterable of ``(name, type, help, samples)`` where
+        ``samples`` is a list of ``(labels_dict, value)``. A ``name``
+        replaces the collector previously registered under it, so building
+        the app again does not duplicate its series.
+        """
+        with self.lock:
+            if name is not None:
+                previous = self.named.pop(name, None)
+                if previous in self.collectors:
+                    self.collectors.remove(previous)
+                self.named[name] = collector
+            self.collectors.append(collector)
+
+    def remove_collector(self, collector):
+        with self.lock:
+            if collector in self.collectors:
+                self.collectors.remove(collector)
+            self.named = {k: v for k, v in self.named.items() if v is not collector}
+
+    def render(self):
+        lines = []
+        with self.lock:
+            metrics = list(self.metrics)
+            collectors = list(self.collectors)
+        for metric in metrics:
+            samples = metric.samples()
+            if not samples:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for sample in samples:
+                name, labelnames, key, value = sample[:4]
+                extra = sample[4] if len(sample) > 4 else None
+                lines.append(f'{name}{_format_labels(labelnames, key, extra)} {_format_value(value)}')
+        for collector in collectors:
+            for name, type, help, samples in collector():
+                lines.append(f'# HELP {name} {help}')
+                lines.append(f'# TYPE {name} {type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Ingest
+WEBHOOK_REQUESTS = Counter(
+    'buffer_webhook_requests_total', 'Webhook requests by buffer and HTTP status', ['buffer_id', 'status'])
+WEBHOOK_SHED = Counter(
+    'buffer_webhook_shed_total', 'Webhook requests rejected with 429 by admission control, by buffer and limit',
+    ['buffer_id', 'reason'])
+IDEMPOTENCY_LOOKUPS = Counter(
+    'buffer_idempotency_lookups_total',
+    'Webhook idempotency key lookups by buffer and result (hit: memory, db_hit: unique index, miss: new message)',
+    ['buffer_id', 'result'])
+WEBHOOK_DURATION = Histogram(
+    'buffer_webhook_duration_seconds', 'Webhook request handling time', ['buffer_id'])
+
+# Flush and forwarding
+FLUSH_SIZE = Histogram(
+    'buffer_flush_size_messages', 'Messages per flushed group', ['buffer_id'], buckets=SIZE_BUCKETS)
+FLUSH_DURATION = Histogram(
+    'buffer_flush_duration_seconds', 'Time to flush one group to every forwarding target', ['buffer_id'])
+ADAPTIVE_DECISIONS = Counter(
+    'buffer_adaptive_decisions_total', 'Adaptive flush policy decisions after each flush (grow, shrink, hold)',
+    ['buffer_id', 'decision'])
+FORWARD_DURATION = Histogram(
+    'buffer_forward_duration_seconds', 'Downstream request latency per forwarding config',
+    ['forwarding_config_id'])
+MEMORY_PRESSURE = Counter(
+    'buffer_memory_pressure_total', 'Buffered keys spilled or flushed early to stay within the memory budget',
+    ['action'])
+FORWARD_REQUESTS = Counter(
+    'buffer_forward_requests_total', 'Downstream requests per forwarding config and status class',
+    ['forwarding_config_id', 'status'])
+CIRCUIT_TRANSITIONS = Counter(
+    'buffer_forward_circuit_transitions_total', 'Circuit breaker transitions per forwarding config and new state',
+    ['forwarding_config_id', 'state'])
+OUTBOUND_THROTTLE_WAIT = Histogram(
+    'buffer_outbound_throttle_wait_seconds', 'Time outbound requests waited for rate and concurrency limits',
+    ['path'])
+OUTBOUND_THROTTLED = Counter(
+    'buffer_outbound_throttled_total', 'Outbound requests given up after waiting BUFFER_OUTBOUND_MAX_WAIT',
+    ['path', 'reason'])
+
+# Scheduler
+SCHEDULER_FIRE_LAG = Histogram(
+    'buffer_scheduler_fire_lag_seconds', 'Delay between a job\'s scheduled and actual submission', ['job_type'])
+SCHEDULE_EXECUTION_DURATION = Histogram(
+    'buffer_schedule_execution_duration_seconds', 'execute_request duration by outcome', ['outcome'])
+
+# Database
+DB_POOL_WAIT = Histogram(
+    'buffer_db_pool_wait_seconds', 'Time spent waiting for a pooled database connection')
+
+
+def status_class(status_code):
+    """'2xx'/'4xx'/... for a status code, 'none' when no response arrived."""
+    return f'{status_code // 100}xx' if status_code else 'none'
@@ -0,0 +1,343 @@
+"""Segmented, memory-mapped message log: an alternative ingest store.
+
+A buffer config with ``ingest_log = 1`` does not insert a
+``received_messages`` row per webhook. The serialized payload is appended
+to the active segment of the log instead: a file of
+``BUFFER_LOG_SEGMENT_BYTES`` (default 64 MiB) mapped in memory. Each
+record is a fixed header (message id, arrival time, buffer id, payload and
+source lengths) followed by the payload and source. Once a record no longer
+fits, the segment is sealed and a new one starts.
+
+- **Ids** come from ``ID_BASE`` upwards, a range SQLite's autoincrement never
+  reaches, so log messages and ``received_messages`` rows never collide and
+  ``is_log_id`` tells them apart. Ids are consecutive within a segment, so
+  the index by message id is the segment's array of record offsets.
+- **Flush results** (status and forwarded id) are appended as small fixed
+  records to the segment's ``.ack`` file, one write per segment per flush,
+  instead of an UPDATE per message.
+- **Retention**: a sealed segment whose messages all reached a final status
+  (``success``, ``error``, ``cancelled``) is deleted whole, with its
+  ``.ack`` file. Messages still ``received`` when the log is opened were
+  in the memory buffers of a previous run: ``take_unflushed`` hands them
+  back so the server buffers them again, and their segments can go.
+
+The log is opened on first use. Segments and acks are replayed when it
+opens, so history survives restarts. Writes reach the OS page cache right
+away; segments are synced to disk when sealed.
+"""
+import bisect
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_BYTES = int(os.environ.get('BUFFER_LOG_SEGMENT_BYTES') or 64 * 1024 * 1024)
+ID_BASE = 1 << 48
+# message_id, received_at, buffer_id, tamanho do payload, tamanho da origem
+HEADER = struct.Struct('<QdIIH')
+# índice na segmentação, status, forwarded_id (0: nenhum)
+ACK = struct.Struct('<IBq')
+STATUSES = ('received', 'success', 'error', 'cancelled', 'retrying')
+FINAL_STATUSES = frozenset(STATUSES.index(status) for status in ('success', 'error', 'cancelled'))
+
+
+def is_log_id(message_id):
+    return message_id >= ID_BASE
+
+
+def split_ids(message_ids):
+    """``(database_ids, log_ids)`` of a list of message ids."""
+    database_ids = []
+    log_ids = []
+    for message_id in message_ids:
+        (log_ids if message_id >= ID_BASE else database_ids).append(message_id)
+    return database_ids, log_ids
+
+
+class Segment:
+    __slots__ = ('path', 'first_id', 'file', 'map', 'end', 'offsets', 'buffer_ids', 'received_at',
+                 'statuses', 'forwarded_ids', 'open', 'sealed')
+
+    def __init__(self, path, first_id, capacity=None):
+        """Open the segment at ``path``; with ``capacity``, create it with that size."""
+        self.path = path
+        self.first_id = first_id
+        self.file = open(path, 'w+b' if capacity else 'r+b')
+        if capacity:
+            self.file.truncate(capacity)
+        self.map = mmap.mmap(self.file.fileno(), 0)
+        self.end = 0
+        self.offsets = array('Q')
+        self.buffer_ids = array('I')
+        self.received_at = array('d')
+        self.statuses = bytearray()
+        self.forwarded_ids = array('q')
+        # Mensagens ainda sem status final
+        self.open = 0
+        self.sealed = False
+        if not capacity:
+            self._recover()
+
+    @property
+    def next_id(self):
+        return self.first_id + len(self.offsets)
+
+    def _recover(self):
+        size = len(self.map)
+        while self.end + HEADER.size <= size:
+            message_id, received_at, buffer_id, length, source_length = HEADER.unpack_from(self.map, self.end)
+            # Área ainda zerada: fim dos registros
+            if message_id != self.next_id:
+                break
+            self._index(self.end, buffer_id, received_at)
+            self.end += HEADER.size + length + source_length
+        try:
+            with open(self.ack_path, 'rb') as acks:
+                data = acks.read()
+        except FileNotFoundError:
+            data = b''
+        for offset in range(0, len(data) - ACK.size + 1, ACK.size):
+            index, status, forwarded_id = ACK.unpack_from(data, offset)
+            if index < len(self.statuses):
+                self._set(index, status, forwarded_id)
+
+    @property
+    def ack_path(self):
+        return self.path[:-len('.seg')] + '.ack'
+
+    def _index(self, offset, buffer_id, received_at):
+        self.offsets.append(offset)
+        self.buffer_ids.append(buffer_id)
+        self.received_at.append(received_at)
+        self.statuses.append(0)
+        self.forwarded_ids.append(0)
+        self.open += 1
+
+    def _set(self, index, status, forwarded_id):
+        was_final = self.statuses[index] in FINAL_STATUSES
+        self.statuses[index] = status
+        if forwarded_id:
+            self.forwarded_ids[index] = forwarded_id
+        self.open += was_final - (status in FINAL_STATUSES)
+
+    def append(self, buffer_id, payload, source, received_at):
+        """Write a record; returns its message id, or None when it does not fit."""
+        length = HEADER.size + len(payload) + len(source)
+        if self.end + length > len(self.map):
+            return None
+        message_id = self.next_id
+        start = self.end + HEADER.size
+        # Corpo antes do cabeçalho: um cabeçalho válido sempre aponta para um registro completo
+        self.map[start:start + len(payload)] = payload
+        self.map[start + len(payload):start + len(payload) + len(source)] = source
+        HEADER.pack_into(self.map, self.end, message_id, received_at, buffer_id, len(payload), len(source))
+        self._index(self.end, buffer_id, received_at)
+        self.end += length
+        return message_id
+
+    def read(self, index):
+        offset = self.offsets[index]
+        _, received_at, buffer_id, length, source_length = HEADER.unpack_from(self.map, offset)
+        start = offset + HEADER.size
+        return bytes(self.map[start:start + length]), bytes(self.map[start + length:start + length + source_length])
+
+    def ack(self, indexes, status, forwarded_id):
+        with open(self.ack_path, 'ab') as acks:
+            acks.write(b''.join(ACK.pack(index, status, forwarded_id or 0) for index in indexes))
+        for index in indexes:
+            self._set(index, status, forwarded_id)
+
+    def seal(self):
+        self.map.flush()
+        self.sealed = True
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    def remove(self):
+        self.close()
+        for path in (self.path, self.ack_path):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+class MessageLog:
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.lock = threading.Lock()
+        self.segments = None
+        self.first_ids = []
+        # (segmento, índice) das mensagens sem status ao abrir, para take_unflushed()
+        self.unflushed = []
+
+    def _open(self):
+        """Replay the segments on disk; runs on first use, under the lock."""
+        if self.segments is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self.segments = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith('.seg'):
+                self.segments.append(Segment(os.path.join(self.directory, name), int(name[:-len('.seg')])))
+        for segment in self.segments[:-1]:
+            segment.sealed = True
+        self.first_ids = [segment.first_id for segment in self.segments]
+        self.unflushed = [(segment, index) for segment in self.segments
+                          for index, status in enumerate(segment.statuses) if status == 0]
+        if self.segments:
+            logger.info(f"[LOG] {len(self.segments)} segmentos abertos em {self.directory}, "
+                        f"{sum(segment.open for segment in self.segments)} mensagens sem status final")
+        self._compact()
+
+    def _rotate(self, record_size):
+        next_id = self.segments[-1].next_id if self.segments else ID_BASE + 1
+        if self.segments:
+            self.segments[-1].seal()
+        capacity = max(self.segment_bytes, record_size)
+        segment = Segment(os.path.join(self.directory, f'{next_id:020d}.seg'), next_id, capacity)
+        self.segments.append(segment)
+        self.first_ids.append(next_id)
+        self._compact()
+        return segment
+
+    def append(self, buffer_id, payload, source):
+        """Store a received message; returns its message id."""
+        payload = payload.encode() if isinstance(payload, str) else payload
+        source = (source or '').encode()
+        received_at = time.time()
+        with self.lock:
+            self._open()
+            message_id = self.segments[-1].append(buffer_id, payload, source, received_at) if self.segments else None
+            if message_id is None:
+                segment = self._rotate(HEADER.size + len(payload) + len(source))
+                message_id = segment.append(buffer_id, payload, source, received_at)
+            return message_id
+
+    def _locate(self, message_id):
+        """``(segment, index)`` of a message id, or None when its segment was dropped."""
+        position = bisect.bisect_right(self.first_ids, message_id) - 1
+        if position < 0:
+            return None
+        segment = self.segments[position]
+        index = message_id - segment.first_id
+        return (segment, index) if index < len(segment.offsets) else None
+
+    def payloads(self, message_ids):
+        """``{message_id: payload}`` of the messages still in the log."""
+        found = {}
+        with self.lock:
+            self._open()
+            for message_id in message_ids:
+                location = self._locate(message_id)
+                if location is not None:
+                    found[message_id] = location[0].read(location[1])[0].decode()
+        return found
+
+    def ack(self, message_ids, status, forwarded_id=None):
+        """Record the flush result of log messages: one ack write per segment."""
+        status = STATUSES.index(status)
+        by_segment = {}
+        with self.lock:
+            self._open()
+            for message_id in message_ids:
+                location = self._locate(message_id)
+                if location is not None:
+                    by_segment.setdefault(location[0], []).append(location[1])
+            for segment, indexes in by_segment.items():
+                segment.ack(indexes, status, forwarded_id)
+            self._compact()
+
+    def _compact(self):
+        """Drop sealed segments whose messages are all final."""
+        done = [segment for segment in self.segments if segment.sealed and not segment.open]
+        for segment in done:
+            logger.info(f"[LOG] Removendo segmento processado {os.path.basename(segment.path)}")
+            segment.remove()
+            self.segments.remove(segment)
+        if done:
+            self.first_ids = [segment.first_id for segment in self.segments]
+
+    def row(self, segment, index):
+        """A message as a ``received_messages`` row."""
+        payload, source = segment.read(index)
+        status = segment.statuses[index]
+        return {
+            'id': segment.first_id + index,
+            'message_data': payload.decode(),
+            'source': source.decode(),
+            'received_at': time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(segment.received_at[index])),
+            'processed': int(status != 0),
+            'buffer_id': segment.buffer_ids[index],
+            'forwarded_id': segment.forwarded_ids[index] or None,
+            'status': STATUSES[status] if status else None,
+            'idempotency_key': None,
+        }
+
+    def recent(self, limit):
+        """The latest ``limit`` messages as rows, newest first."""
+        rows = []
+        with self.lock:
+            if self.segments is None and not os.path.isdir(self.directory):
+                return rows
+            self._open()
+            for segment in reversed(self.segments):
+                for index in range(len(segment.offsets) - 1, -1, -1):
+                    if len(rows) >= limit:
+                        return rows
+                    rows.append(self.row(segment, index))
+        return rows
+
+    def take_unflushed(self):
+        """``(message_id, buffer_id, payload)`` of the messages still ``received`` when the
+        log was opened, oldest first; only the first call returns them."""
+        with self.lock:
+            if self.segments is None and not os.path.isdir(self.directory):
+                return []
+            self._open()
+            unflushed, self.unflushed = self.unflushed, []
+            return [(segment.first_id + index, segment.buffer_ids[index], segment.read(index)[0].decode())
+                    for segment, index in unflushed]
+
+    def after(self, message_id, limit):
+        """Up to ``limit`` messages with an id above ``message_id`` as rows, oldest first."""
+        rows = []
+        with self.lock:
+            if self.segments is None and not os.path.isdir(self.directory):
+                return rows
+            self._open()
+            position = max(0, bisect.bisect_right(self.first_ids, message_id + 1) - 1)
+            for segment in self.segments[position:]:
+                for index in range(max(0, message_id + 1 - segment.first_id), len(segment.offsets)):
+                    if len(rows) >= limit:
+                        return rows
+                    rows.append(self.row(segment, index))
+        return rows
+
+    def last_id(self):
+        """The id of the latest message; ``ID_BASE`` when the log is empty."""
+        with self.lock:
+            if self.segments is None and not os.path.isdir(self.directory):
+                return ID_BASE
+            self._open()
+            return self.segments[-1].next_id - 1 if self.segments else ID_BASE
+
+    def stats(self):
+        """``(segments, bytes, open_messages)`` for metrics; zeros before first use."""
+        segments = list(self.segments or ())
+        return len(segments), sum(segment.end for segment in segments), sum(segment.open for segment in segments)
+
+    def close(self):
+        with self.lock:
+            for segment in self.segments or ():
+                segment.close()
+            self.segments = None
+            self.first_ids = []
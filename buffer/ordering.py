@@ -0,0 +1,129 @@
+"""Keyed executor for buffers with ordered delivery.
+
+Tasks submitted under the same key run one at a time, in submission order;
+tasks of different keys run in parallel on ``BUFFER_ORDERED_WORKERS``
+threads (16 by default), started on first use. Keys with work take turns:
+after each task its key goes to the back of the ready queue, so a key with
+a long backlog does not starve the others.
+
+A task may return a number of seconds instead of finishing: it then runs
+again after that delay, and the later tasks of its key wait behind it. A
+batch waiting for its next retry holds back its key this way without
+occupying a worker. ``drain()`` hands those held tasks back to the caller,
+e.g. to persist them on shutdown.
+"""
+import contextvars
+import logging
+import os
+import threading
+from collections import deque
+from queue import SimpleQueue
+
+logger = logging.getLogger(__name__)
+
+WORKERS = int(os.environ.get('BUFFER_ORDERED_WORKERS') or 16)
+
+
+class KeyedExecutor:
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+        # chave -> deque de (contexto, função, argumentos); a primeira tarefa é a da vez
+        self.queues = {}
+        self.ready = SimpleQueue()
+        # Chaves na fila de prontas ou rodando, sem contar as que aguardam um atraso
+        self.active = 0
+        # chave -> Timer das chaves que aguardam um atraso
+        self.timers = {}
+        self.threads = []
+
+    def submit(self, key, fn, *args):
+        """Queue ``fn(*args)`` behind the earlier tasks of ``key``.
+
+        The task runs in a copy of the caller's context, so its spans
+        belong to the caller's trace.
+        """
+        context = contextvars.copy_context()
+        with self.lock:
+            if not self.threads:
+                self._start()
+            queue = self.queues.get(key)
+            if queue is None:
+                queue = self.queues[key] = deque()
+                self.active += 1
+                self.ready.put(key)
+            queue.append((context, fn, args))
+
+    def _start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'ordered-delivery-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def _work(self):
+        while True:
+            key = self.ready.get()
+            with self.lock:
+                context, fn, args = self.queues[key][0]
+            try:
+                delay = context.run(fn, *args)
+            except Exception as e:
+                logger.error(f"[ORDERED] Tarefa da chave {key} falhou: {str(e)}")
+                delay = None
+            with self.lock:
+                if delay is not None:
+                    # A mesma tarefa roda de novo depois do atraso; a chave fica parada até lá
+                    self._deactivate()
+                    timer = self.timers[key] = threading.Timer(delay, self._resume, args=(key,))
+                    timer.daemon = True
+                    timer.start()
+                    continue
+                queue = self.queues[key]
+                queue.popleft()
+                if queue:
+                    self.ready.put(key)
+                else:
+                    del self.queues[key]
+                    self._deactivate()
+
+    def _deactivate(self):
+        self.active -= 1
+        if not self.active:
+            self.idle.notify_all()
+
+    def _resume(self, key):
+        with self.lock:
+            if self.timers.pop(key, None) is None:
+                # Retirada por drain()
+                return
+            self.active += 1
+            self.ready.put(key)
+
+    def wait(self, timeout=None):
+        """Wait until no task is queued or running, except those waiting on a delay.
+
+        Returns False on timeout.
+        """
+        with self.idle:
+            return self.idle.wait_for(lambda: not self.active, timeout)
+
+    def drain(self):
+        """Remove the keys waiting on a delay and return their tasks as ``(key, fn, args)``.
+
+        Tasks come in queue order, the delayed one first in each key. Call
+        after ``wait()`` to take everything still queued in memory.
+        """
+        with self.lock:
+            tasks = []
+            for key, timer in self.timers.items():
+                timer.cancel()
+                tasks.extend((key, fn, args) for _, fn, args in self.queues.pop(key))
+            self.timers.clear()
+            return tasks
+
+    def stats(self):
+        """``(keys, tasks, delayed_keys)`` for metrics."""
+        with self.lock:
+            tasks = sum(len(queue) for queue in self.queues.values())
+            return len(self.queues), tasks, len(self.queues) - self.active
@@ -0,0 +1,149 @@
+"""Profilers for diagnosing a running server without external tools.
+
+``sample`` walks the stack of every thread (waitress workers, flush timers,
+scheduler executors) at a fixed interval and counts identical stacks. The
+result is in the collapsed format read by flamegraph.pl and speedscope:
+one ``root;caller;callee count`` line per distinct stack, rooted at the
+thread name.
+
+A single webhook call is too short for a sampler (the sampling thread only
+gets the GIL every switch interval), so ``RequestProfiler`` instead hooks
+``sys.setprofile`` on the request's thread and emits the same format
+weighted by microseconds of self time. Any caller of the public webhook
+could otherwise trigger it, so it only runs when ``BUFFER_PROFILE_WEBHOOKS``
+is set.
+"""
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+MAX_DURATION = 120
+MIN_INTERVAL = 0.001
+# ?profile=1 nos webhooks: desligado por padrão
+WEBHOOK_PROFILING = os.environ.get('BUFFER_PROFILE_WEBHOOKS', '').lower() in ('1', 'true', 'yes')
+
+# Leaf frames of threads that are blocked rather than running
+IDLE_FRAMES = {
+    ('threading.py', 'wait'),
+    ('threading.py', '_wait_for_tstate_lock'),
+    ('queue.py', 'get'),
+    ('selectors.py', 'select'),
+    ('socket.py', 'accept'),
+    ('wasyncore.py', 'poll'),
+    ('task.py', 'handler_thread'),
+}
+
+_lock = threading.Lock()
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _short_path(filename):
+    return os.path.join(os.path.basename(os.path.dirname(filename)), os.path.basename(filename))
+
+
+def _code_label(code):
+    return f'{code.co_name} ({_short_path(code.co_filename)}:{code.co_firstlineno})'
+
+
+def _thread_label(name, group_threads):
+    if name is None:
+        return 'unknown-thread'
+    # waitress-3, Thread-12 (flush_buffer), ThreadPoolExecutor-0_1 -> one root each
+    return re.sub(r'\d+', 'N', name) if group_threads else name
+
+
+def _is_idle(frame):
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES
+
+
+def sample(duration=10.0, interval=0.01, include_idle=False, group_threads=True):
+    """Sample every thread for ``duration`` seconds.
+
+    Returns ``(collapsed_stacks, info)``; raises ProfilerBusy when another
+    profile is already running.
+    """
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy('A profile is already running')
+    try:
+        own = threading.get_ident()
+        stacks = Counter()
+        samples = 0
+        started = time.perf_counter()
+        deadline = started + duration
+        while True:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or (not include_idle and _is_idle(frame)):
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_code_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(_thread_label(names.get(ident), group_threads))
+                stacks[';'.join(reversed(labels))] += 1
+            samples += 1
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            time.sleep(min(interval, remaining))
+        info = {
+            'duration': round(time.perf_counter() - started, 3),
+            'interval': interval,
+            'samples': samples,
+            'stacks': len(stacks),
+        }
+        return collapse(stacks), info
+    finally:
+        _lock.release()
+
+
+def collapse(stacks):
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common())
+
+
+class RequestProfiler:
+    """Self time per call stack on the current thread, in microseconds."""
+
+    def __init__(self):
+        self.stacks = Counter()
+        # [label, started_ns, child_ns] per active call
+        self.frames = []
+
+    def start(self):
+        sys.setprofile(self._event)
+        return self
+
+    def stop(self):
+        sys.setprofile(None)
+        # Calls still open when profiling stopped (e.g. the after_request hook)
+        now = time.perf_counter_ns()
+        while self.frames:
+            self._pop(now)
+        return collapse(Counter({stack: max(1, ns // 1000) for stack, ns in self.stacks.items()}))
+
+    def _event(self, frame, event, arg):
+        now = time.perf_counter_ns()
+        if event == 'call':
+            self.frames.append([_code_label(frame.f_code), now, 0])
+        elif event == 'c_call':
+            module = getattr(arg, '__module__', None) or 'builtins'
+            self.frames.append([f'{module}.{getattr(arg, "__qualname__", arg)}', now, 0])
+        elif self.frames:
+            # return, c_return, c_exception; returns of frames entered before
+            # profiling started arrive with an empty stack and are ignored
+            self._pop(now)
+
+    def _pop(self, now):
+        path = ';'.join(frame[0] for frame in self.frames)
+        _, started, child = self.frames.pop()
+        elapsed = now - started
+        self.stacks[path] += elapsed - child
+        if self.frames:
+            self.frames[-1][2] += elapsed
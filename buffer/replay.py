@@ -0,0 +1,130 @@
+"""Replay of captured webhook traffic against a Buffer instance.
+
+Records (from ``capture.read_capture`` or ``capture.database_records``) are
+sent to ``<url>/api/webhook/<buffer_id>`` by a pool of ``concurrency``
+threads, each with its own keep-alive session. With a ``speed`` the
+original spacing between requests is kept, divided by the speed (1 for real
+time, 10 for ten times faster); with ``speed = 0`` requests are sent as
+fast as the pool allows. When the pool cannot keep up with the schedule,
+requests go out late: the report's ``lag`` says by how much.
+"""
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+TIMEOUT = 30
+
+
+def parse_speed(value):
+    """``'10x'``, ``'2.5'`` -> 10.0, 2.5; ``'max'`` -> 0. Raises ValueError."""
+    value = str(value).strip().lower()
+    if value == 'max':
+        return 0.0
+    speed = float(value[:-1] if value.endswith('x') else value)
+    if speed <= 0:
+        raise ValueError("speed must be positive, or 'max'")
+    return speed
+
+
+def parse_buffer_map(items):
+    """``['3=1', '4=2']`` -> ``{3: 1, 4: 2}``: captured buffer id to target buffer id."""
+    mapping = {}
+    for item in items:
+        source, _, target = item.partition('=')
+        try:
+            mapping[int(source)] = int(target)
+        except ValueError:
+            raise ValueError(f"Invalid buffer mapping: {item!r} (expected <captured id>=<target id>)") from None
+    return mapping
+
+
+def percentiles(values):
+    """Summary of a list of durations in seconds, reported in milliseconds."""
+    if not values:
+        return {'count': 0}
+    ordered = sorted(values)
+
+    def at(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {
+        'count': len(ordered),
+        'mean_ms': round(statistics.fmean(ordered) * 1000, 3),
+        'p50_ms': at(0.50),
+        'p90_ms': at(0.90),
+        'p99_ms': at(0.99),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def replay(records, url, speed=1.0, concurrency=8, buffer_map=None, timeout=TIMEOUT):
+    """Send ``records`` to the instance at ``url``; returns the report."""
+    url = url.rstrip('/')
+    buffer_map = buffer_map or {}
+    local = threading.local()
+    # Limita o que fica enfileirado no pool quando a velocidade é máxima
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    latencies = []
+    lags = []
+    statuses = {}
+    errors = {}
+    lock = threading.Lock()
+
+    def send(buffer_id, body, headers, due):
+        try:
+            if not hasattr(local, 'session'):
+                local.session = requests.Session()
+            started = time.perf_counter()
+            try:
+                response = local.session.post(
+                    f'{url}/api/webhook/{buffer_map.get(buffer_id, buffer_id)}', data=body,
+                    headers={'Content-Type': 'application/json', **headers}, timeout=timeout
+                )
+            except requests.RequestException as e:
+                with lock:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                return
+            latency = time.perf_counter() - started
+            with lock:
+                latencies.append(latency)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+                if due is not None:
+                    lags.append(max(0.0, started - due))
+        finally:
+            slots.release()
+
+    first = last = None
+    count = 0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        for timestamp, buffer_id, body, headers in records:
+            if first is None:
+                first = timestamp
+            last = timestamp
+            count += 1
+            due = None
+            if speed:
+                due = started + (timestamp - first) / speed
+                delay = due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            slots.acquire()
+            executor.submit(send, buffer_id, body, headers, due)
+    elapsed = time.perf_counter() - started
+    report = {
+        'requests': count,
+        'speed': speed or 'max',
+        'concurrency': concurrency,
+        'capture_seconds': round(last - first, 3) if count else 0,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_per_s': round(count / elapsed, 1) if elapsed else 0,
+        'latency': percentiles(latencies),
+        'statuses': statuses,
+        'errors': errors,
+    }
+    if speed:
+        report['lag'] = percentiles(lags)
+    return report
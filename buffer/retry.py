@@ -0,0 +1,342 @@
+"""Durable retry queue and dead-letter store for failed forwards.
+
+A failed batch is written to ``forward_retries`` and a one-off scheduler job
+is set for its next attempt, so pending retries survive restarts and never
+run on the threads that flush buffers. Batches that exhaust the policy of
+their forwarding config, or fail with a non-retriable status, are moved to
+``dead_letters`` where they can be replayed in bulk.
+
+While the circuit breaker of a forwarding config (see ``circuit.py``) is
+open, its batches are parked in ``forward_retries`` without being sent or
+spending an attempt, and released as soon as the circuit closes.
+
+Buffers with ordered delivery use ``deliver_in_order`` instead: the retry
+is still written to ``forward_retries`` (it is resumed like any other after
+a restart), but no job is scheduled for it. The caller waits and retries it
+in place, so the later batches of its key cannot overtake it.
+"""
+import json
+import logging
+import random
+import time
+from datetime import datetime
+
+from apscheduler.executors.pool import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+RETRY_EXECUTOR = 'retries'
+
+# Status de um lote que nem saiu por causa dos limites de saída (throttle.Throttled)
+THROTTLED = 'throttled'
+
+
+def is_retriable(status_code):
+    """Connection errors and timeouts (no status), throttled batches, 429 and 5xx are retried."""
+    return status_code in (None, THROTTLED) or status_code == 429 or status_code >= 500
+
+
+def backoff_delay(fw_config, attempt):
+    """Seconds to wait after failed attempt number ``attempt``."""
+    delay = min(fw_config['backoff_max'], fw_config['backoff_base'] * 2 ** (attempt - 1))
+    jitter = fw_config['backoff_jitter']
+    if jitter:
+        delay *= random.uniform(1 - jitter, 1 + jitter)
+    return max(0.0, delay)
+
+
+class RetryQueue:
+    def __init__(self, db_pool, scheduler, forward, breakers=None, set_status=None, workers=4):
+        """``forward(fw_config, payload, message_ids, attempt)`` sends one batch
+        and returns ``(delivered, status_code, error)``, with ``status_code``
+        ``THROTTLED`` when our own outbound limits held the batch back; ``breakers`` is an
+        optional ``circuit.CircuitBreakers``; ``set_status(conn, message_ids,
+        status)`` records message statuses (default: in received_messages)."""
+        self.db_pool = db_pool
+        self.scheduler = scheduler
+        self.forward = forward
+        self.breakers = breakers
+        self.set_status = set_status or self._set_status
+        # Retentativas conduzidas por deliver_in_order: sem job agendado, fora de release()
+        self.held = set()
+        # Retentativas de buffers com ordered deixadas pela execução anterior, para take_ordered()
+        self.pending_ordered = []
+        self.scheduler.add_executor(ThreadPoolExecutor(workers), RETRY_EXECUTOR)
+
+    def deliver(self, fw_config, batch, attempt=1, retry_id=None):
+        """Send ``batch`` and hand it to the retry/dead-letter path on failure.
+
+        ``batch`` holds ``buffer_id``, ``key_value``, ``message_ids`` and the
+        rendered ``payload``. Returns True when the batch was delivered.
+        """
+        if self.breakers is not None and not self.breakers.allow(fw_config):
+            self.park(fw_config, batch, attempt - 1, retry_id)
+            return False
+        delivered, status_code, error = self._send(fw_config, batch, attempt)
+        if delivered:
+            self._delivered(retry_id)
+            return True
+        if status_code == THROTTLED:
+            # Barrado pelos nossos limites, sem chegar ao destino: não conta como tentativa
+            next_attempt_at = time.time() + backoff_delay(fw_config, max(1, attempt - 1))
+            retry_id = self.store(fw_config, batch, attempt - 1, next_attempt_at, error, retry_id)
+            logger.info(f"[RETRY] Batch for forwarding config {fw_config['id']} throttled: "
+                        f"queued as retry {retry_id} until {datetime.fromtimestamp(next_attempt_at).isoformat()}")
+            return False
+        self.handle_failure(fw_config, batch, attempt, error, is_retriable(status_code), retry_id)
+        return False
+
+    def deliver_in_order(self, fw_config, batch, attempt=1, retry_id=None):
+        """Send ``batch`` for a buffer with ordered delivery; the caller runs the retries.
+
+        Returns ``(delivered, retry)``. ``retry`` is None once the batch is
+        done (delivered or dead-lettered); otherwise it is ``(delay,
+        attempt, retry_id)``: call again with that ``attempt`` and
+        ``retry_id`` after ``delay`` seconds.
+        """
+        if self.breakers is not None and not self.breakers.allow(fw_config):
+            next_attempt_at = self.breakers.retry_at(fw_config)
+            retry_id = self.store(fw_config, batch, attempt - 1, next_attempt_at, 'Circuit open', retry_id, schedule=False)
+            return False, (max(0.0, next_attempt_at - time.time()), attempt, retry_id)
+        delivered, status_code, error = self._send(fw_config, batch, attempt)
+        if delivered:
+            self._delivered(retry_id)
+            return True, None
+        if is_retriable(status_code) and attempt < fw_config['max_attempts']:
+            delay = backoff_delay(fw_config, attempt)
+            retry_id = self.store(fw_config, batch, attempt, time.time() + delay, error, retry_id, schedule=False)
+            logger.info(f"[RETRY] Ordered batch for forwarding config {fw_config['id']} failed "
+                        f"(attempt {attempt}/{fw_config['max_attempts']}): {error}. "
+                        f"Key {batch['key_value']} held for {delay:.1f}s")
+            return False, (delay, attempt + 1, retry_id)
+        self.dead_letter(fw_config['id'], batch, attempt, error, retry_id)
+        return False, None
+
+    def _send(self, fw_config, batch, attempt):
+        try:
+            delivered, status_code, error = self.forward(
+                fw_config, batch['payload'], batch['message_ids'], attempt
+            )
+        except Exception:
+            if self.breakers is not None:
+                self.breakers.record(fw_config, False)
+            raise
+        if self.breakers is not None:
+            if status_code == THROTTLED:
+                # Nem chegou ao destino: não conta, mas libera a sonda se era ela
+                self.breakers.release_probe(fw_config)
+            else:
+                # 4xx: o destino respondeu, o erro é do pedido
+                self.breakers.record(fw_config, delivered or not is_retriable(status_code))
+        return delivered, status_code, error
+
+    def _delivered(self, retry_id):
+        if retry_id is not None:
+            with self.db_pool.get_connection() as conn:
+                conn.execute('DELETE FROM forward_retries WHERE id = ?', (retry_id,))
+            self.held.discard(retry_id)
+
+    def handle_failure(self, fw_config, batch, attempts, error, retriable, retry_id=None):
+        if retriable and attempts < fw_config['max_attempts']:
+            next_attempt_at = time.time() + backoff_delay(fw_config, attempts)
+            retry_id = self.store(fw_config, batch, attempts, next_attempt_at, error, retry_id)
+            logger.info(f"[RETRY] Batch for forwarding config {fw_config['id']} failed "
+                        f"(attempt {attempts}/{fw_config['max_attempts']}): {error}. "
+                        f"Retry {retry_id} at {datetime.fromtimestamp(next_attempt_at).isoformat()}")
+        else:
+            self.dead_letter(fw_config['id'], batch, attempts, error, retry_id)
+
+    def park(self, fw_config, batch, attempts, retry_id=None):
+        """Queue a batch refused by an open circuit for when it may be tried again."""
+        next_attempt_at = self.breakers.retry_at(fw_config)
+        retry_id = self.store(fw_config, batch, attempts, next_attempt_at, 'Circuit open', retry_id)
+        logger.info(f"[RETRY] Circuit open for forwarding config {fw_config['id']}: "
+                    f"batch parked as retry {retry_id} until {datetime.fromtimestamp(next_attempt_at).isoformat()}")
+
+    def store(self, fw_config, batch, attempts, next_attempt_at, error, retry_id=None, schedule=True):
+        """Insert or update the retry of ``batch`` and schedule its next attempt; returns its id.
+
+        With ``schedule=False`` the caller runs the next attempt itself.
+        """
+        with self.db_pool.get_connection() as conn:
+            if retry_id is None:
+                cursor = conn.execute(
+                    '''INSERT INTO forward_retries
+                       (forwarding_config_id, buffer_id, key_value, message_ids, payload,
+                        attempts, next_attempt_at, last_error)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                    (fw_config['id'], batch['buffer_id'], batch['key_value'],
+                     json.dumps(batch['message_ids']), json.dumps(batch['payload']),
+                     attempts, next_attempt_at, error)
+                )
+                retry_id = cursor.lastrowid
+            else:
+                conn.execute(
+                    'UPDATE forward_retries SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                    (attempts, next_attempt_at, error, retry_id)
+                )
+            self.set_status(conn, batch['message_ids'], 'retrying')
+        if schedule:
+            self.schedule(retry_id, next_attempt_at)
+        else:
+            self.held.add(retry_id)
+        return retry_id
+
+    def dead_letter(self, forwarding_config_id, batch, attempts, error, retry_id=None):
+        with self.db_pool.get_connection() as conn:
+            conn.execute(
+                '''INSERT INTO dead_letters
+                   (forwarding_config_id, buffer_id, key_value, message_ids, payload, attempts, last_error)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                (forwarding_config_id, batch['buffer_id'], batch['key_value'],
+                 json.dumps(batch['message_ids']), json.dumps(batch['payload']), attempts, error)
+            )
+            if retry_id is not None:
+                conn.execute('DELETE FROM forward_retries WHERE id = ?', (retry_id,))
+            self.set_status(conn, batch['message_ids'], 'error')
+        self.held.discard(retry_id)
+        logger.error(f"[RETRY] Batch for forwarding config {forwarding_config_id} dead-lettered "
+                     f"after {attempts} attempt(s): {error}")
+
+    def schedule(self, retry_id, run_at):
+        self.scheduler.add_job(
+            self.process,
+            'date',
+            run_date=datetime.fromtimestamp(run_at),
+            args=[retry_id],
+            id=f'forward-retry-{retry_id}',
+            executor=RETRY_EXECUTOR,
+            replace_existing=True,
+            misfire_grace_time=None
+        )
+
+    def load(self, retry_id):
+        """``(row, fw_config, batch)`` of a queued retry, or None when it is gone.
+
+        A retry whose forwarding config was removed or deactivated is
+        dead-lettered and None is returned.
+        """
+        with self.db_pool.get_connection() as conn:
+            row = conn.execute('SELECT * FROM forward_retries WHERE id = ?', (retry_id,)).fetchone()
+            if not row:
+                return None
+            row = dict(row)
+            fw_config = conn.execute(
+                'SELECT * FROM forwarding_configs WHERE id = ?', (row['forwarding_config_id'],)
+            ).fetchone()
+        batch = {
+            'buffer_id': row['buffer_id'],
+            'key_value': row['key_value'],
+            'message_ids': json.loads(row['message_ids']),
+            'payload': json.loads(row['payload'])
+        }
+        if not fw_config or not fw_config['active']:
+            self.dead_letter(row['forwarding_config_id'], batch, row['attempts'],
+                             'Forwarding config inactive', retry_id)
+            return None
+        return row, dict(fw_config), batch
+
+    def process(self, retry_id):
+        """Run the next attempt of a queued retry (scheduler job)."""
+        try:
+            loaded = self.load(retry_id)
+            if loaded is None:
+                return
+            row, fw_config, batch = loaded
+            self.deliver(fw_config, batch, row['attempts'] + 1, retry_id)
+        except Exception as e:
+            logger.error(f"[RETRY] Error processing retry {retry_id}: {str(e)}")
+
+    def release(self, forwarding_config_id):
+        """Retry every queued batch of a forwarding config now, e.g. once its circuit closes."""
+        now = time.time()
+        with self.db_pool.get_connection() as conn:
+            rows = [row for row in conn.execute(
+                'SELECT id FROM forward_retries WHERE forwarding_config_id = ? AND next_attempt_at > ?',
+                (forwarding_config_id, now)
+            ).fetchall() if row['id'] not in self.held]
+            conn.executemany(
+                'UPDATE forward_retries SET next_attempt_at = ? WHERE id = ?',
+                [(now, row['id']) for row in rows]
+            )
+        for row in rows:
+            self.schedule(row['id'], now)
+        if rows:
+            logger.info(f"[RETRY] Releasing {len(rows)} queued batches of forwarding config {forwarding_config_id}")
+
+    def resume(self):
+        """Schedule every retry left in the table, e.g. after a restart.
+
+        Retries of buffers with ordered delivery are not scheduled: they
+        wait, oldest first, for ``take_ordered()`` to hand them to their keys.
+        """
+        with self.db_pool.get_connection() as conn:
+            rows = conn.execute('''
+                SELECT r.id, r.next_attempt_at, COALESCE(b.ordered, 0) AS ordered
+                FROM forward_retries r
+                LEFT JOIN buffer_configs b ON b.id = r.buffer_id
+                ORDER BY r.id
+            ''').fetchall()
+        for row in rows:
+            if row['ordered']:
+                self.held.add(row['id'])
+                self.pending_ordered.append(row['id'])
+            else:
+                self.schedule(row['id'], row['next_attempt_at'])
+        if rows:
+            logger.info(f"[RETRY] Resumed {len(rows)} pending retries ({len(self.pending_ordered)} ordered)")
+
+    def take_ordered(self):
+        """The ids of the ordered retries found by ``resume()``, oldest first; only once."""
+        ids, self.pending_ordered = self.pending_ordered, []
+        return ids
+
+    def replay(self, ids=None, forwarding_config_id=None):
+        """Move dead letters back to the retry queue for immediate delivery.
+
+        With neither ``ids`` nor ``forwarding_config_id`` every dead letter is
+        replayed. Returns the number of batches queued.
+        """
+        query = 'SELECT * FROM dead_letters'
+        params = []
+        if ids is not None:
+            if not ids:
+                return 0
+            query += f" WHERE id IN ({','.join('?' for _ in ids)})"
+            params = list(ids)
+        elif forwarding_config_id is not None:
+            query += ' WHERE forwarding_config_id = ?'
+            params = [forwarding_config_id]
+        now = time.time()
+        queued = []
+        with self.db_pool.get_connection() as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(query, params).fetchall()
+                for row in rows:
+                    cursor = conn.execute(
+                        '''INSERT INTO forward_retries
+                           (forwarding_config_id, buffer_id, key_value, message_ids, payload,
+                            attempts, next_attempt_at, last_error)
+                           VALUES (?, ?, ?, ?, ?, 0, ?, ?)''',
+                        (row['forwarding_config_id'], row['buffer_id'], row['key_value'],
+                         row['message_ids'], row['payload'], now, row['last_error'])
+                    )
+                    queued.append(cursor.lastrowid)
+                    self.set_status(conn, json.loads(row['message_ids']), 'retrying')
+                conn.executemany('DELETE FROM dead_letters WHERE id = ?', [(row['id'],) for row in rows])
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        for retry_id in queued:
+            self.schedule(retry_id, now)
+        logger.info(f"[RETRY] Replaying {len(queued)} dead-lettered batches")
+        return len(queued)
+
+    @staticmethod
+    def _set_status(conn, message_ids, status):
+        conn.executemany(
+            'UPDATE received_messages SET processed = 1, status = ? WHERE id = ?',
+            [(status, message_id) for message_id in message_ids]
+        )
@@ -1,4 +1,4 @@
-from server import create_app
+from buffer.server import create_app
 
 app = create_app()
 
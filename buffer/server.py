@@ -1,26 +1,44 @@
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
 import sqlite3
 import os
 import requests
 from datetime import datetime
 from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.cron import CronTrigger
+from apscheduler.events import EVENT_JOB_SUBMITTED
 import logging
-from croniter import croniter
 from contextlib import contextmanager
 import threading
 import time
-from queue import Queue
+from queue import Empty, Queue
+from collections import deque
 import functools
 import json
+from . import (adaptive, admission, batching, cache, capture, circuit, events, idempotency, memory, metrics, msglog,
+               ordering, profiler, stats, throttle)
+from .responses import compress, configure_json, rows_response, stream_rows
+from .cache import cached, invalidates
+from .retry import THROTTLED, RetryQueue
+from .tracing import tracer
+from .cron import build_trigger, get_trigger, cron_error, next_fire_times, MAX_PREVIEW_COUNT
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Iniciado por init_engine(), não na importação
 scheduler = BackgroundScheduler()
-scheduler.start()
+
+def record_fire_lag(event):
+    # Cron jobs use the schedule id as job id; everything else is internal
+    job_type = 'schedule' if event.job_id.isdigit() else 'internal'
+    now = datetime.now(event.scheduled_run_times[0].tzinfo)
+    for run_time in event.scheduled_run_times:
+        metrics.SCHEDULER_FIRE_LAG.observe(max(0.0, (now - run_time).total_seconds()), job_type)
+
+scheduler.add_listener(record_fire_lag, EVENT_JOB_SUBMITTED)
+
+# Caminho do banco (BUFFER_DB_PATH permite usar outro arquivo, e.g. em benchmarks)
+DB_PATH = os.environ.get('BUFFER_DB_PATH') or os.path.join(os.path.dirname(__file__), 'schedules.db')
+DATA_DIR = os.path.dirname(os.path.abspath(DB_PATH))
 
 # Pool de conexões
 class DatabaseConnectionPool:
@@ -29,15 +47,12 @@ class DatabaseConnectionPool:
         self.connections = Queue(maxsize=max_connections)
         self.lock = threading.Lock()
         self.thread_local = threading.local()
-        
-        # Inicializar o pool com conexões
-        for _ in range(max_connections):
-            self.connections.put(self._create_connection())
+        # Conexões são abertas sob demanda, até max_connections
+        self.created = 0
     
     def _create_connection(self):
-        db_path = os.path.join(os.path.dirname(__file__), 'schedules.db')
         conn = sqlite3.connect(
-            db_path,
+            DB_PATH,
             timeout=60.0,
             isolation_level=None,
             check_same_thread=False  # Permitir uso em diferentes threads
@@ -48,12 +63,36 @@ class DatabaseConnectionPool:
         conn.execute("PRAGMA busy_timeout = 60000")
         return conn
     
+    def _acquire(self):
+        try:
+            return self.connections.get_nowait()
+        except Empty:
+            pass
+        with self.lock:
+            create = self.created < self.max_connections
+            if create:
+                self.created += 1
+        if not create:
+            return self.connections.get(timeout=10)
+        try:
+            return self._create_connection()
+        except Exception:
+            with self.lock:
+                self.created -= 1
+            raise
+
+    def available(self):
+        """Idle connections plus the ones not opened yet."""
+        return self.connections.qsize() + self.max_connections - self.created
+
     @contextmanager
     def get_connection(self):
         connection = None
         try:
             # Tentar obter uma conexão do pool
-            connection = self.connections.get(timeout=10)
+            started = time.perf_counter()
+            connection = self._acquire()
+            metrics.DB_POOL_WAIT.observe(time.perf_counter() - started)
             yield connection
         finally:
             # Devolver a conexão ao pool se ela foi obtida
@@ -92,6 +131,57 @@ def with_retry(max_retries=3, delay=1):
         return wrapper
     return decorator
 
+# Per-target options stored on forwarding_configs: column -> (SQL type, default)
+FORWARDING_OPTIONS = {
+    'max_attempts': ('INTEGER', 3),
+    'backoff_base': ('REAL', 10.0),
+    'backoff_max': ('REAL', 600.0),
+    'backoff_jitter': ('REAL', 0.2),
+    # Tamanho das requisições de encaminhamento (ver batching.py); 0 = desligado
+    'max_request_bytes': ('INTEGER', 0),
+    'coalesce_window': ('REAL', 0.0),
+    # Circuit breaker do destino (ver circuit.py); breaker_min_requests = 0 desliga
+    'breaker_failure_rate': ('REAL', 0.5),
+    'breaker_min_requests': ('INTEGER', 10),
+    'breaker_open_seconds': ('REAL', 30.0),
+    # Limites de saída do encaminhamento, além dos do host (ver throttle.py); 0 = sem limite
+    'rate_limit': ('REAL', 0.0),
+    'rate_burst': ('INTEGER', 0),
+    'max_concurrency': ('INTEGER', 0),
+}
+
+# Limites de memória e de admissão por buffer; 0 = sem limite
+BUFFER_OPTIONS = {
+    'max_bytes': ('INTEGER', 0),
+    'rate_limit': ('REAL', 0.0),
+    'rate_burst': ('INTEGER', 0),
+    'max_pending': ('INTEGER', 0),
+    # Política adaptativa (ver adaptive.py): max_size/max_time viram os limites superiores
+    'adaptive': ('INTEGER', 0),
+    'min_size': ('INTEGER', 1),
+    'min_time': ('REAL', 1.0),
+    # Mensagens gravadas no log segmentado em vez de received_messages (ver msglog.py)
+    'ingest_log': ('INTEGER', 0),
+    # Flushes da mesma chave entregues em sequência, fora do buffer_lock (ver ordering.py)
+    'ordered': ('INTEGER', 0),
+}
+
+SQL_TYPES = {'INTEGER': int, 'REAL': float}
+
+def read_options(data, options, current=None):
+    """Read option columns from a request body, falling back to ``current``
+    (or the defaults). Raises ValueError for values of the wrong type."""
+    values = {}
+    for column, (sql_type, default) in options.items():
+        value = data.get(column, (current or {}).get(column, default))
+        try:
+            values[column] = SQL_TYPES[sql_type](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value for {column}: {value!r}")
+        if values[column] < 0:
+            raise ValueError(f"{column} cannot be negative")
+    return values
+
 def get_db():
     try:
         with db_pool.get_connection() as conn:
@@ -115,6 +205,14 @@ def init_db():
                         method TEXT NOT NULL,
                         createdAt DATETIME DEFAULT CURRENT_TIMESTAMP
                     );
+                    CREATE TABLE IF NOT EXISTS executions (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        scheduleId INTEGER NOT NULL,
+                        scheduleName TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        response TEXT,
+                        executedAt DATETIME DEFAULT CURRENT_TIMESTAMP
+                    );
                     CREATE TABLE IF NOT EXISTS buffer_configs (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         name TEXT NOT NULL,
@@ -146,7 +244,8 @@ def init_db():
                     );
                     CREATE TABLE IF NOT EXISTS forwarded_messages (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        received_message_id INTEGER NOT NULL,
+                        received_message_id INTEGER,
+                        log_message_id INTEGER,
                         forwarding_config_id INTEGER NOT NULL,
                         status TEXT NOT NULL,
                         response TEXT,
@@ -158,6 +257,35 @@ def init_db():
                             REFERENCES forwarding_configs(id) 
                             ON DELETE CASCADE
                     );
+                    CREATE TABLE IF NOT EXISTS forward_retries (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        forwarding_config_id INTEGER NOT NULL,
+                        buffer_id INTEGER,
+                        key_value TEXT,
+                        message_ids TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_at REAL NOT NULL,
+                        last_error TEXT,
+                        createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (forwarding_config_id)
+                            REFERENCES forwarding_configs(id)
+                            ON DELETE CASCADE
+                    );
+                    CREATE TABLE IF NOT EXISTS dead_letters (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        forwarding_config_id INTEGER NOT NULL,
+                        buffer_id INTEGER,
+                        key_value TEXT,
+                        message_ids TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        attempts INTEGER NOT NULL,
+                        last_error TEXT,
+                        createdAt DATETIME DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (forwarding_config_id)
+                            REFERENCES forwarding_configs(id)
+                            ON DELETE CASCADE
+                    );
                     CREATE TABLE IF NOT EXISTS settings (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
                         key TEXT NOT NULL UNIQUE,
@@ -190,6 +318,11 @@ def init_db():
                     conn.execute('ALTER TABLE schedules ADD COLUMN body TEXT')
                     logger.info("Body column added successfully")
                 
+                if 'spread' not in column_names:
+                    logger.info("Adding spread column to schedules table...")
+                    conn.execute('ALTER TABLE schedules ADD COLUMN spread BOOLEAN NOT NULL DEFAULT 0')
+                    logger.info("Spread column added successfully")
+                
                 # Verificar se o banco está acessível
                 cursor.execute("SELECT COUNT(*) FROM schedules")
                 count = cursor.fetchone()[0]
@@ -220,6 +353,15 @@ def init_db():
                     logger.info("Adding max_time column to buffer_configs table...")
                     conn.execute('ALTER TABLE buffer_configs ADD COLUMN max_time INTEGER NOT NULL DEFAULT 60')
                     logger.info("max_time column added successfully")
+                for column, (sql_type, default) in BUFFER_OPTIONS.items():
+                    if column not in buf_column_names:
+                        logger.info(f"Adding {column} column to buffer_configs table...")
+                        conn.execute(f'ALTER TABLE buffer_configs ADD COLUMN {column} {sql_type} NOT NULL DEFAULT {default}')
+                        logger.info(f"{column} column added successfully")
+                if 'idempotency_key' not in buf_column_names:
+                    logger.info("Adding idempotency_key column to buffer_configs table...")
+                    conn.execute('ALTER TABLE buffer_configs ADD COLUMN idempotency_key TEXT')
+                    logger.info("idempotency_key column added successfully")
                 if 'reset_timer_on_message' not in buf_column_names:
                     logger.info("Adding reset_timer_on_message column to buffer_configs table...")
                     conn.execute('ALTER TABLE buffer_configs ADD COLUMN reset_timer_on_message BOOLEAN NOT NULL DEFAULT 0')
@@ -246,11 +388,78 @@ def init_db():
                     conn.execute('ALTER TABLE forwarding_configs ADD COLUMN template TEXT')
                     logger.info("template column added successfully")
                 
+                # Adicionar colunas de opções em forwarding_configs se não existirem
+                for column, (sql_type, default) in FORWARDING_OPTIONS.items():
+                    if column not in fwd_column_names:
+                        logger.info(f"Adding {column} column to forwarding_configs table...")
+                        conn.execute(f'ALTER TABLE forwarding_configs ADD COLUMN {column} {sql_type} NOT NULL DEFAULT {default}')
+                        logger.info(f"{column} column added successfully")
+                
                 # Adicionar coluna status em received_messages se não existir
                 if 'status' not in rm_column_names:
                     logger.info("Adding status column to received_messages table...")
                     conn.execute('ALTER TABLE received_messages ADD COLUMN status TEXT')
                     logger.info("status column added successfully")
+
+                # Chave de idempotência do produtor, única por buffer
+                if 'idempotency_key' not in rm_column_names:
+                    logger.info("Adding idempotency_key column to received_messages table...")
+                    conn.execute('ALTER TABLE received_messages ADD COLUMN idempotency_key TEXT')
+                    logger.info("idempotency_key column added successfully")
+                conn.execute('''
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_received_messages_idempotency
+                    ON received_messages(buffer_id, idempotency_key) WHERE idempotency_key IS NOT NULL
+                ''')
+
+                # Grupos só do log (ingest_log) não têm linha em received_messages: a primeira
+                # mensagem vai em log_message_id e received_message_id fica nulo
+                cursor.execute("PRAGMA table_info(forwarded_messages)")
+                fm_column_names = [col[1] for col in cursor.fetchall()]
+                if 'log_message_id' not in fm_column_names:
+                    logger.info("Rebuilding forwarded_messages with a nullable received_message_id and log_message_id...")
+                    conn.execute('BEGIN')
+                    try:
+                        conn.execute('''
+                            CREATE TABLE forwarded_messages_new (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                received_message_id INTEGER,
+                                log_message_id INTEGER,
+                                forwarding_config_id INTEGER NOT NULL,
+                                status TEXT NOT NULL,
+                                response TEXT,
+                                forwarded_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                                FOREIGN KEY (received_message_id) 
+                                    REFERENCES received_messages(id) 
+                                    ON DELETE CASCADE,
+                                FOREIGN KEY (forwarding_config_id) 
+                                    REFERENCES forwarding_configs(id) 
+                                    ON DELETE CASCADE
+                            )
+                        ''')
+                        # Ids do log gravados em received_message_id (com as chaves estrangeiras desligadas) vão para log_message_id
+                        conn.execute('''
+                            INSERT INTO forwarded_messages_new
+                                (id, received_message_id, log_message_id, forwarding_config_id, status, response, forwarded_at)
+                            SELECT id,
+                                   CASE WHEN received_message_id IN (SELECT id FROM received_messages) THEN received_message_id END,
+                                   CASE WHEN received_message_id >= ? THEN received_message_id END,
+                                   forwarding_config_id, status, response, forwarded_at
+                            FROM forwarded_messages
+                            WHERE forwarding_config_id IN (SELECT id FROM forwarding_configs)
+                        ''', (msglog.ID_BASE,))
+                        conn.execute('DROP TABLE forwarded_messages')
+                        conn.execute('ALTER TABLE forwarded_messages_new RENAME TO forwarded_messages')
+                        conn.execute('COMMIT')
+                    except Exception:
+                        conn.execute('ROLLBACK')
+                        raise
+                    logger.info("forwarded_messages rebuilt successfully")
+
+                # Usado pelo stream de eventos para achar as mensagens de um encaminhamento
+                conn.execute('CREATE INDEX IF NOT EXISTS idx_received_messages_forwarded_id ON received_messages(forwarded_id)')
+
+                # Agregados por minuto/hora/dia de execuções e encaminhamentos
+                stats.create_tables(conn)
                 
             except sqlite3.Error as e:
                 logger.error(f"Database error during initialization: {str(e)}")
@@ -260,6 +469,17 @@ def init_db():
         logger.error(f"Error initializing database: {str(e)}", exc_info=True)
         raise
 
+def timed_execution(func):
+    @functools.wraps(func)
+    def wrapper(schedule):
+        started = time.perf_counter()
+        result = func(schedule)
+        metrics.SCHEDULE_EXECUTION_DURATION.observe(
+            time.perf_counter() - started, 'success' if result else 'error')
+        return result
+    return wrapper
+
+@timed_execution
 def execute_request(schedule):
     logger.info(f"Checking execution for schedule: {schedule['name']}")
     try:
@@ -291,52 +511,220 @@ def execute_request(schedule):
                     logger.error(f"Invalid body JSON for schedule {schedule['name']}")
                     body = schedule['body']
 
-            response = requests.request(
-                method=schedule['method'],
-                url=schedule['url'],
-                headers=headers,
-                json=body if isinstance(body, dict) else None,
-                data=body if not isinstance(body, dict) else None,
-                timeout=30  # Adiciona um timeout de 30 segundos
-            )
+            started = time.perf_counter()
+            with outbound_limiter.slot(schedule['url']) as waited:
+                metrics.OUTBOUND_THROTTLE_WAIT.observe(waited, 'schedule')
+                response = requests.request(
+                    method=schedule['method'],
+                    url=schedule['url'],
+                    headers=headers,
+                    json=body if isinstance(body, dict) else None,
+                    data=body if not isinstance(body, dict) else None,
+                    timeout=30  # Adiciona um timeout de 30 segundos
+                )
             response.raise_for_status()  # Levanta exceção para status codes >= 400
             
             log_execution(
                 schedule['id'],
                 schedule['name'],
                 'success',
-                response.text
+                response.text,
+                time.perf_counter() - started
             )
             
             logger.info(f"Successfully executed schedule: {schedule['name']}")
             return True
-        except requests.exceptions.RequestException as error:
+        except (requests.exceptions.RequestException, throttle.Throttled) as error:
             error_message = str(error)
             logger.error(f"Error executing schedule {schedule['name']}: {error_message}")
+            if isinstance(error, throttle.Throttled):
+                metrics.OUTBOUND_THROTTLED.inc('schedule', error.reason)
             
             log_execution(
                 schedule['id'],
                 schedule['name'],
                 'error',
-                error_message
+                error_message,
+                time.perf_counter() - started
             )
             return False
     except Exception as e:
         logger.error(f"Unexpected error in execute_request for schedule {schedule['name']}: {str(e)}")
         return False
 
-def log_execution(schedule_id, schedule_name, status, response):
+def log_execution(schedule_id, schedule_name, status, response, duration):
     logger.info(f"Logging execution for schedule {schedule_name} with status {status}")
     try:
         with db_pool.get_connection() as conn:
+            conn.execute('BEGIN')
             conn.execute('''
                 INSERT INTO executions (scheduleId, scheduleName, status, response)
                 VALUES (?, ?, ?, ?)
             ''', (schedule_id, schedule_name, status, response))
+            stats.record(conn, 'execution', schedule_id, status, duration)
+            conn.execute('COMMIT')
             logger.info(f"Execution logged successfully for schedule {schedule_name}")
+        event_notifier.notify()
     except Exception as e:
         logger.error(f"Error logging execution: {str(e)}")
 
+FORWARD_TIMEOUT = 30
+
+# Limites de saída por host e por encaminhamento, compartilhados por agendamentos e flushes
+outbound_limiter = throttle.OutboundLimiter()
+
+# Acorda os streams de /api/events quando executions/mensagens são gravadas
+event_notifier = events.ChangeNotifier()
+# Cada stream ocupa uma thread do servidor enquanto está aberto
+MAX_EVENT_STREAMS = int(os.environ.get('BUFFER_MAX_EVENT_STREAMS') or 4)
+event_streams = threading.BoundedSemaphore(MAX_EVENT_STREAMS)
+
+# Log segmentado dos buffers com ingest_log; aberto no primeiro uso
+LOG_DIR = os.environ.get('BUFFER_LOG_DIR') or os.path.join(DATA_DIR, 'message-log')
+message_log = msglog.MessageLog(LOG_DIR)
+
+# Captura das requisições de webhook, para `buffer replay`
+CAPTURE_DIR = os.environ.get('BUFFER_CAPTURE_DIR') or os.path.join(DATA_DIR, 'captures')
+capture_recorder = capture.CaptureRecorder(CAPTURE_DIR)
+
+def set_messages_status(conn, message_ids, status, forwarded_id=None):
+    """Record the status of received messages, in received_messages or in the message log."""
+    database_ids, log_ids = msglog.split_ids(message_ids)
+    if database_ids:
+        if forwarded_id is None:
+            conn.executemany(
+                'UPDATE received_messages SET processed = 1, status = ? WHERE id = ?',
+                [(status, message_id) for message_id in database_ids]
+            )
+        else:
+            conn.executemany(
+                'UPDATE received_messages SET processed = 1, forwarded_id = ?, status = ? WHERE id = ?',
+                [(forwarded_id, status, message_id) for message_id in database_ids]
+            )
+    if log_ids:
+        message_log.ack(log_ids, status, forwarded_id)
+    # Mudanças só de status não geram linha nova: avisar os streams de eventos
+    if message_ids:
+        event_notifier.status_changed(message_ids, status, forwarded_id)
+
+def build_forward_payload(fw_config, key_field, messages):
+    """Render the body sent to a forwarding target for one buffered group of message dicts."""
+    key_value = messages[0][key_field] if key_field else None
+    if fw_config['template'] and key_field:
+        # Usar template para o valor de cada mensagem
+        template = fw_config['template']
+        content_list = []
+        for data in messages:
+            msg_payload = template
+            for k, v in data.items():
+                msg_payload = msg_payload.replace(f'{{{{{k}}}}}', str(v))
+            # O resultado do template é o valor do array
+            try:
+                rendered = json.loads(msg_payload)
+            except Exception:
+                rendered = msg_payload
+            content_list.append(rendered)
+        return {key_field: key_value, 'content': content_list}
+    elif key_field:
+        # Sem template: pegar o campo conteudo de cada mensagem
+        content_list = [data.get('conteudo') for data in messages]
+        return {key_field: key_value, 'content': content_list}
+    # fallback
+    return {'content': list(messages)}
+
+def forward_batch(fw_config, payload, message_ids, attempt=1):
+    """Send one batch to a forwarding target and record the attempt.
+
+    Returns ``(delivered, status_code, error)``; ``status_code`` is None when
+    no response was received, and ``THROTTLED`` when the outbound limits kept
+    the batch from being sent (nothing is recorded then).
+    """
+    headers = json.loads(fw_config['headers']) if fw_config['headers'] else {}
+    started = time.perf_counter()
+    with tracer.span('forward.request', url=fw_config['url'], attempt=attempt) as span:
+        try:
+            with outbound_limiter.slot(
+                fw_config['url'], ('forward', fw_config['id']),
+                (fw_config['rate_limit'], fw_config['rate_burst'], fw_config['max_concurrency'])
+            ) as waited:
+                metrics.OUTBOUND_THROTTLE_WAIT.observe(waited, 'forward')
+                # A latência do destino não inclui a espera pelos limites
+                started = time.perf_counter()
+                response = requests.request(
+                    method=fw_config['method'],
+                    url=fw_config['url'],
+                    json=payload,
+                    headers=headers,
+                    timeout=FORWARD_TIMEOUT
+                )
+            status_code = response.status_code
+            delivered = response.ok
+            error = None if delivered else f"HTTP {status_code}: {response.text[:500]}"
+            result = {'status_code': status_code, 'text': response.text}
+        except (requests.exceptions.RequestException, throttle.Throttled) as e:
+            if isinstance(e, throttle.Throttled):
+                metrics.OUTBOUND_THROTTLED.inc('forward', e.reason)
+                status_code = THROTTLED
+            else:
+                status_code = None
+            delivered = False
+            error = str(e)
+            result = {'status_code': None, 'error': error}
+        span.set(status_code=status_code)
+    if status_code == THROTTLED:
+        # Não foi enviado: fica só na fila de retentativas, sem histórico nem estatísticas
+        # (já conta em buffer_outbound_throttled_total)
+        return delivered, status_code, error
+    duration = time.perf_counter() - started
+    metrics.FORWARD_DURATION.observe(duration, fw_config['id'])
+    metrics.FORWARD_REQUESTS.inc(fw_config['id'], metrics.status_class(status_code))
+
+    # Salvar o payload enviado e a resposta real
+    response_text = json.dumps({
+        'sent': {
+            'payload': payload,
+            'headers': headers
+        },
+        'response': result,
+        'attempt': attempt
+    })
+    status = 'success' if delivered else 'error'
+    database_ids, log_ids = msglog.split_ids(message_ids)
+    with tracer.span('forward.record') as span, db_pool.get_connection() as conn:
+        conn.execute('BEGIN')
+        try:
+            # Criar apenas um registro em forwarded_messages para o grupo; grupos só do log usam log_message_id
+            cursor = conn.execute(
+                '''INSERT INTO forwarded_messages 
+                   (received_message_id, log_message_id, forwarding_config_id, status, response) 
+                   VALUES (?, ?, ?, ?, ?)''',
+                (database_ids[0] if database_ids else None, None if database_ids else log_ids[0],
+                 fw_config['id'], status, response_text)
+            )
+            forwarded_id = cursor.lastrowid
+            # Atualizar todas as mensagens recebidas do grupo
+            set_messages_status(conn, database_ids, status, forwarded_id)
+            stats.record(conn, 'forward', fw_config['id'], status, duration)
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        span.set(forwarded_id=forwarded_id)
+    if log_ids:
+        message_log.ack(log_ids, status, forwarded_id)
+        # O evento forwarded só lista as mensagens de received_messages
+        event_notifier.status_changed(log_ids, status, forwarded_id)
+    event_notifier.notify()
+    tracer.annotate(forwarded_id=forwarded_id, status=status)
+    return delivered, status_code, error
+
+circuit_breakers = circuit.CircuitBreakers(
+    on_change=lambda forwarding_config_id, state: metrics.CIRCUIT_TRANSITIONS.inc(forwarding_config_id, state)
+)
+retry_queue = RetryQueue(db_pool, scheduler, forward_batch, circuit_breakers, set_status=set_messages_status)
+# Fechar um circuito libera os lotes estacionados enquanto ele estava aberto
+circuit_breakers.on_close = retry_queue.release
+
 def validate_schedule(data):
     required_fields = ['name', 'cronExpression', 'url', 'method']
     for field in required_fields:
@@ -346,8 +734,9 @@ def validate_schedule(data):
             raise ValueError(f"Field cannot be empty: {field}")
     
     # Validate cron expression
-    if not croniter.is_valid(data['cronExpression']):
-        raise ValueError("Invalid cron expression")
+    error = cron_error(data['cronExpression'])
+    if error:
+        raise ValueError(error)
     
     # Validate method
     valid_methods = ['GET', 'POST', 'PUT', 'DELETE']
@@ -358,7 +747,180 @@ def validate_schedule(data):
     if not data['url'].startswith(('http://', 'https://')):
         raise ValueError("URL must start with http:// or https://")
 
+def preview_cron(expression, count, timezone, schedule=None):
+    """Preview ``expression``; with ``schedule`` its spread offset is applied."""
+    error = cron_error(expression)
+    if error:
+        return {'cronExpression': expression, 'valid': False, 'error': error}
+    trigger = build_trigger(schedule) if schedule else get_trigger(expression)
+    return {
+        'cronExpression': expression,
+        'valid': True,
+        'next': next_fire_times(trigger, count, timezone)
+    }
+
+SCHEDULE_COLUMNS = ['name', 'cronExpression', 'url', 'method', 'headers', 'body', 'active', 'spread']
+
+def normalize_schedule(data):
+    """Map an API schedule object onto the values stored in the schedules table.
+
+    ``active`` is None when ``data`` leaves it out: the caller keeps the
+    stored value, or uses 1 for a new schedule.
+    """
+    schedule = {
+        'name': data['name'],
+        'cronExpression': data['cronExpression'],
+        'url': data['url'],
+        'method': data['method'],
+        'headers': data.get('headers') or '',
+        'body': data.get('body') or '',
+        'active': int(bool(data['active'])) if data.get('active') is not None else None,
+        'spread': int(bool(data.get('spread', False)))
+    }
+    for field in ('headers', 'body'):
+        if not isinstance(schedule[field], str):
+            schedule[field] = json.dumps(schedule[field])
+    return schedule
+
+def schedule_changed(current, schedule):
+    stored = normalize_schedule(current)
+    return any(stored[column] != schedule[column] for column in SCHEDULE_COLUMNS)
+
+def upsert_schedules(items, prune=False):
+    """Create or update schedules by name in a single transaction.
+
+    Every item is validated before anything is written. With ``prune`` the
+    schedules whose names are not in ``items`` are deleted. The scheduler is
+    then reconciled once. Returns ``(summary, errors)``.
+    """
+    errors = []
+    names = set()
+    for index, item in enumerate(items):
+        try:
+            validate_schedule(item)
+        except (ValueError, TypeError) as e:
+            errors.append({'index': index, 'error': str(e)})
+            continue
+        if item['name'] in names:
+            errors.append({'index': index, 'name': item['name'], 'error': 'Duplicate schedule name in payload'})
+        names.add(item['name'])
+    if errors:
+        return None, errors
+
+    desired = [normalize_schedule(item) for item in items]
+    results = []
+    removed_ids = []
+    with db_pool.get_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = [dict(row) for row in conn.execute('SELECT * FROM schedules ORDER BY id')]
+            by_name = {}
+            for row in rows:
+                by_name.setdefault(row['name'], row)
+            matched_ids = set()
+
+            for schedule in desired:
+                current = by_name.get(schedule['name'])
+                if schedule['active'] is None:
+                    # Sem 'active' no item: não reativar uma agenda pausada
+                    schedule['active'] = current['active'] if current is not None else 1
+                if current is None:
+                    cursor = conn.execute('''
+                        INSERT INTO schedules (name, cronExpression, url, method, headers, body, active, spread)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', [schedule[column] for column in SCHEDULE_COLUMNS])
+                    schedule['id'] = cursor.lastrowid
+                    action = 'created'
+                else:
+                    schedule['id'] = current['id']
+                    action = 'unchanged'
+                    if schedule_changed(current, schedule):
+                        conn.execute('''
+                            UPDATE schedules
+                            SET name = ?, cronExpression = ?, url = ?, method = ?, headers = ?, body = ?, active = ?, spread = ?
+                            WHERE id = ?
+                        ''', [schedule[column] for column in SCHEDULE_COLUMNS] + [schedule['id']])
+                        action = 'updated'
+                matched_ids.add(schedule['id'])
+                results.append({'id': schedule['id'], 'name': schedule['name'], 'action': action})
+
+            if prune:
+                removed_ids = [row['id'] for row in rows if row['id'] not in matched_ids]
+                conn.executemany('DELETE FROM executions WHERE scheduleId = ?', [(id,) for id in removed_ids])
+                conn.executemany('DELETE FROM schedules WHERE id = ?', [(id,) for id in removed_ids])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    jobs = sync_schedule_jobs(desired, removed_ids)
+    summary = {
+        'created': sum(1 for result in results if result['action'] == 'created'),
+        'updated': sum(1 for result in results if result['action'] == 'updated'),
+        'unchanged': sum(1 for result in results if result['action'] == 'unchanged'),
+        'deleted': len(removed_ids),
+        'jobs': jobs,
+        'schedules': results
+    }
+    logger.info(f"Bulk schedule upsert: {summary['created']} created, {summary['updated']} updated, "
+                f"{summary['unchanged']} unchanged, {summary['deleted']} deleted")
+    return summary, []
+
+def add_schedule_job(schedule):
+    """Add (or replace) the scheduler job for a schedule row."""
+    scheduler.add_job(
+        execute_request,
+        build_trigger(schedule),
+        args=[schedule],
+        id=str(schedule['id']),
+        replace_existing=True
+    )
+
+def sync_schedule_jobs(schedules, removed_ids=()):
+    """Make the scheduler match ``schedules`` in one pass, touching only differences."""
+    jobs = {job.id: job for job in scheduler.get_jobs()}
+    added = replaced = removed = 0
+    for schedule in schedules:
+        job_id = str(schedule['id'])
+        job = jobs.get(job_id)
+        if not schedule['active']:
+            if job:
+                scheduler.remove_job(job_id)
+                removed += 1
+            continue
+        if job and job.args and not schedule_changed(job.args[0], schedule):
+            continue
+        add_schedule_job(schedule)
+        if job:
+            replaced += 1
+        else:
+            added += 1
+    for id in removed_ids:
+        if str(id) in jobs:
+            scheduler.remove_job(str(id))
+            removed += 1
+    return {'added': added, 'replaced': replaced, 'removed': removed}
+
+def prune_stats():
+    try:
+        with db_pool.get_connection() as conn:
+            removed = stats.prune(conn)
+        logger.info(f"Pruned {removed} expired stats rollups")
+    except Exception as e:
+        logger.error(f"Error pruning stats rollups: {str(e)}")
+
+def get_timezone_setting():
+    with db_pool.get_connection() as conn:
+        cursor = conn.execute('SELECT value FROM settings WHERE key = ?', ('timezone',))
+        result = cursor.fetchone()
+        return result['value'] if result else 'UTC'
+
 def check_db_integrity():
+    """Check the database; restore or recreate it when damaged.
+
+    Returns True when the database passed the check, False when it was
+    replaced and its data has to be imported from the JSON backup.
+    """
     try:
         with db_pool.get_connection() as conn:
             cursor = conn.cursor()
@@ -371,8 +933,8 @@ def check_db_integrity():
                 logger.error("Database integrity check failed")
                 # Se falhou, tentar reparar usando o backup
                 
-                backup_path = os.path.join(os.path.dirname(__file__), 'schedules.db.backup')
-                db_path = os.path.join(os.path.dirname(__file__), 'schedules.db')
+                backup_path = DB_PATH + '.backup'
+                db_path = DB_PATH
                 
                 if os.path.exists(backup_path):
                     os.replace(backup_path, db_path)
@@ -385,15 +947,17 @@ def check_db_integrity():
                 
                 # Reinicializar o banco
                 init_db()
-            else:
-                logger.info("Database integrity check passed")
+                return False
+            logger.info("Database integrity check passed")
+            return True
     except Exception as e:
         logger.error(f"Error checking database integrity: {str(e)}")
         # Em caso de erro, recriar o banco
-        db_path = os.path.join(os.path.dirname(__file__), 'schedules.db')
+        db_path = DB_PATH
         if os.path.exists(db_path):
             os.remove(db_path)
         init_db()
+        return False
 
 def export_db_data():
     try:
@@ -414,7 +978,7 @@ def export_db_data():
                 'executions': executions
             }
             
-            backup_file = os.path.join(os.path.dirname(__file__), 'db_backup.json')
+            backup_file = os.path.join(DATA_DIR, 'db_backup.json')
             with open(backup_file, 'w') as f:
                 json.dump(backup_data, f, indent=2, default=str)
             
@@ -426,7 +990,7 @@ def export_db_data():
 
 def import_db_data():
     try:
-        backup_file = os.path.join(os.path.dirname(__file__), 'db_backup.json')
+        backup_file = os.path.join(DATA_DIR, 'db_backup.json')
         if not os.path.exists(backup_file):
             logger.warning("No backup file found")
             return False
@@ -436,38 +1000,24 @@ def import_db_data():
             backup_data = json.load(f)
         
         with db_pool.get_connection() as conn:
-            # Limpar tabelas existentes
-            conn.execute('DELETE FROM executions')
-            conn.execute('DELETE FROM schedules')
-            
-            # Importar schedules
-            for schedule in backup_data.get('schedules', []):
-                conn.execute('''
-                    INSERT INTO schedules (id, name, cronExpression, url, method, active, createdAt)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    schedule['id'],
-                    schedule['name'],
-                    schedule['cronExpression'],
-                    schedule['url'],
-                    schedule['method'],
-                    schedule['active'],
-                    schedule['createdAt']
-                ))
-            
-            # Importar executions
-            for execution in backup_data.get('executions', []):
-                conn.execute('''
-                    INSERT INTO executions (id, scheduleId, scheduleName, status, response, executedAt)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (
-                    execution['id'],
-                    execution['scheduleId'],
-                    execution['scheduleName'],
-                    execution['status'],
-                    execution['response'],
-                    execution['executedAt']
-                ))
+            conn.execute('BEGIN')
+            try:
+                # Limpar tabelas existentes (um backup restaurado pode ter linhas antigas)
+                conn.execute('DELETE FROM executions')
+                conn.execute('DELETE FROM schedules')
+                # Linhas inteiras: toda coluna do backup que existe na tabela (spread, headers, body...)
+                for table in ('schedules', 'executions'):
+                    columns = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+                    for row in backup_data.get(table, []):
+                        names = [name for name in row if name in columns]
+                        conn.execute(
+                            f"INSERT INTO {table} ({', '.join(names)}) VALUES ({', '.join('?' * len(names))})",
+                            [row[name] for name in names]
+                        )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
         
         logger.info("Database data imported successfully")
         return True
@@ -475,24 +1025,54 @@ def import_db_data():
         logger.error(f"Error importing database data: {str(e)}")
         return False
 
+engine_lock = threading.Lock()
+engine_started = threading.Event()
+
+def init_engine():
+    """Prepare the database and start the background scheduler, once per process.
+
+    Importing this module has no side effects: the pool connects on first
+    use and nothing runs in the background until this is called, by
+    create_app or by CLI commands that need the engine.
+    """
+    with engine_lock:
+        if engine_started.is_set():
+            return
+        logging.basicConfig(level=logging.INFO)
+
+        # Exportar dados antes de verificar integridade
+        export_db_data()
+
+        # Verificar integridade do banco
+        intact = check_db_integrity()
+        init_db()
+
+        # Importar o backup só quando o banco foi restaurado ou recriado
+        if not intact:
+            import_db_data()
+
+        scheduler.start()
+        # Reagendar tentativas pendentes
+        retry_queue.resume()
+
+        # Limpeza periódica dos agregados por minuto/hora
+        scheduler.add_job(prune_stats, 'interval', hours=1, id='stats-prune', replace_existing=True)
+        engine_started.set()
+
 def create_app():
     static_folder = os.path.join(os.path.dirname(__file__), 'frontend', 'build')
     app = Flask(__name__, static_folder=static_folder, static_url_path='')
     CORS(app)
-    
-    # Exportar dados antes de verificar integridade
-    export_db_data()
-    
-    # Verificar integridade do banco
-    check_db_integrity()
-    init_db()
-    
-    # Importar dados se necessário
-    import_db_data()
+    configure_json(app)
+    # Registrado primeiro para rodar por último, depois dos outros after_request
+    app.after_request(compress)
+
+    init_engine()
     
     logger.info("Flask application created and database initialized")
     
     @app.route('/api/schedules', methods=['GET'])
+    @cached('schedules')
     def get_schedules():
         try:
             logger.info("Fetching all schedules")
@@ -511,6 +1091,7 @@ def create_app():
             return jsonify({'error': f'Internal server error: {str(e)}'}), 500
     
     @app.route('/api/schedules', methods=['POST'])
+    @invalidates('schedules')
     @with_retry(max_retries=3)
     def create_schedule():
         try:
@@ -518,15 +1099,18 @@ def create_app():
             logger.info(f"Creating new schedule: {data}")
             
             # Validar dados
-            if not all(key in data for key in ['name', 'cronExpression', 'url', 'method']):
-                return jsonify({'error': 'Missing required fields'}), 400
+            try:
+                validate_schedule(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             with db_pool.get_connection() as conn:
                 try:
+                    spread = int(bool(data.get('spread', False)))
                     cursor = conn.execute('''
-                        INSERT INTO schedules (name, cronExpression, url, method, active)
-                        VALUES (?, ?, ?, ?, 1)
-                    ''', (data['name'], data['cronExpression'], data['url'], data['method']))
+                        INSERT INTO schedules (name, cronExpression, url, method, active, spread)
+                        VALUES (?, ?, ?, ?, 1, ?)
+                    ''', (data['name'], data['cronExpression'], data['url'], data['method'], spread))
                     
                     schedule_id = cursor.lastrowid
                     schedule = {
@@ -535,16 +1119,12 @@ def create_app():
                         'cronExpression': data['cronExpression'],
                         'url': data['url'],
                         'method': data['method'],
-                        'active': True
+                        'active': True,
+                        'spread': bool(spread)
                     }
                     
                     # Adicionar ao scheduler
-                    scheduler.add_job(
-                        execute_request,
-                        CronTrigger.from_crontab(data['cronExpression']),
-                        args=[schedule],
-                        id=str(schedule_id)
-                    )
+                    add_schedule_job(schedule)
                     
                     logger.info(f"Schedule created successfully with ID: {schedule_id}")
                     return jsonify(schedule), 201
@@ -557,10 +1137,99 @@ def create_app():
             logger.error(f"Error creating schedule: {str(e)}")
             return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/schedules/preview', methods=['POST'])
+    def preview_schedules():
+        """Validate many cron expressions and return their next fire times.
+
+        Accepts ``expressions`` (a list of cron strings) and/or ``schedules``
+        (full schedule objects, validated like POST /api/schedules).
+        """
+        try:
+            data = request.get_json() or {}
+            count = int(data.get('count', 5))
+            if count < 1 or count > MAX_PREVIEW_COUNT:
+                return jsonify({'error': f'count must be between 1 and {MAX_PREVIEW_COUNT}'}), 400
+            expressions = data.get('expressions', [])
+            schedules = data.get('schedules', [])
+            if not isinstance(expressions, list) or not isinstance(schedules, list):
+                return jsonify({'error': 'expressions and schedules must be lists'}), 400
+
+            timezone = get_timezone_setting()
+            results = []
+            for expression in expressions:
+                results.append(preview_cron(expression, count, timezone))
+            for schedule in schedules:
+                try:
+                    validate_schedule(schedule)
+                except (ValueError, TypeError) as e:
+                    results.append({
+                        'name': schedule.get('name') if isinstance(schedule, dict) else None,
+                        'cronExpression': schedule.get('cronExpression') if isinstance(schedule, dict) else None,
+                        'valid': False,
+                        'error': str(e)
+                    })
+                    continue
+                result = preview_cron(schedule['cronExpression'], count, timezone, schedule)
+                result['name'] = schedule['name']
+                results.append(result)
+
+            return jsonify({
+                'timezone': timezone,
+                'valid': all(result['valid'] for result in results),
+                'results': results
+            })
+        except Exception as e:
+            logger.error(f"Error previewing schedules: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/schedules/bulk', methods=['POST'])
+    @invalidates('schedules')
+    def bulk_upsert_schedules():
+        try:
+            data = request.get_json() or {}
+            items = data.get('schedules')
+            if not isinstance(items, list):
+                return jsonify({'error': 'schedules must be a list'}), 400
+
+            summary, errors = upsert_schedules(items, prune=bool(data.get('prune', False)))
+            if errors:
+                return jsonify({'error': 'Validation failed', 'errors': errors}), 400
+            return jsonify(summary)
+        except Exception as e:
+            logger.error(f"Error in bulk schedule upsert: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/schedules/<int:id>/preview', methods=['GET'])
+    def preview_schedule(id):
+        """Next fire times of a stored schedule, including its spread offset."""
+        try:
+            count = request.args.get('count', 5, type=int)
+            if count < 1 or count > MAX_PREVIEW_COUNT:
+                return jsonify({'error': f'count must be between 1 and {MAX_PREVIEW_COUNT}'}), 400
+            with db_pool.get_connection() as conn:
+                cursor = conn.execute('SELECT * FROM schedules WHERE id = ?', (id,))
+                schedule = cursor.fetchone()
+            if not schedule:
+                return jsonify({'error': 'Schedule not found'}), 404
+            schedule = dict(schedule)
+            result = preview_cron(schedule['cronExpression'], count, get_timezone_setting(), schedule)
+            result['id'] = id
+            result['name'] = schedule['name']
+            result['spread'] = bool(schedule['spread'])
+            return jsonify(result)
+        except Exception as e:
+            logger.error(f"Error previewing schedule {id}: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/schedules/<int:id>', methods=['PUT'])
+    @invalidates('schedules')
     def update_schedule(id):
         try:
             data = request.json
+            try:
+                validate_schedule(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
             
             with db_pool.get_connection() as conn:
                 # Get current schedule data
@@ -570,11 +1239,12 @@ def create_app():
                     return jsonify({'error': 'Schedule not found'}), 404
                 
                 current = dict(current)
+                spread = int(bool(data.get('spread', current['spread'])))
                 
                 # Update schedule
                 conn.execute('''
                     UPDATE schedules
-                    SET name = ?, cronExpression = ?, url = ?, method = ?, headers = ?, body = ?
+                    SET name = ?, cronExpression = ?, url = ?, method = ?, headers = ?, body = ?, spread = ?
                     WHERE id = ?
                 ''', (
                     data['name'],
@@ -583,6 +1253,7 @@ def create_app():
                     data['method'],
                     data.get('headers', ''),
                     data.get('body', ''),
+                    spread,
                     id
                 ))
                 
@@ -603,17 +1274,12 @@ def create_app():
                         'method': data['method'],
                         'headers': data.get('headers', ''),
                         'body': data.get('body', ''),
-                        'active': current['active']
+                        'active': current['active'],
+                        'spread': spread
                     }
                     
                     # Add new job
-                    scheduler.add_job(
-                        execute_request,
-                        CronTrigger.from_crontab(data['cronExpression']),
-                        args=[schedule],
-                        id=job_id,
-                        replace_existing=True
-                    )
+                    add_schedule_job(schedule)
                     logger.info(f"Added updated job for schedule {id}")
                 
                 return jsonify({'message': 'Schedule updated successfully'})
@@ -622,6 +1288,7 @@ def create_app():
             return jsonify({'error': f"Error updating schedule: {str(e)}"}), 500
     
     @app.route('/api/schedules/<int:id>', methods=['DELETE'])
+    @invalidates('schedules')
     @with_retry(max_retries=3)
     def delete_schedule(id):
         try:
@@ -660,20 +1327,53 @@ def create_app():
     def get_executions():
         try:
             logger.info("Fetching all executions")
-            with db_pool.get_connection() as conn:
-                try:
-                    cursor = conn.execute('SELECT * FROM executions ORDER BY executedAt DESC')
-                    executions = [dict(row) for row in cursor.fetchall()]
-                    logger.info(f"Retrieved {len(executions)} executions successfully")
-                    return jsonify(executions)
-                except sqlite3.Error as e:
-                    logger.error(f"Database error while fetching executions: {str(e)}")
-                    return jsonify({'error': f'Database error occurred: {str(e)}'}), 500
+            try:
+                # Tabela sem limite: enviar em partes, sem montar a lista inteira
+                return stream_rows(db_pool, 'SELECT * FROM executions ORDER BY executedAt DESC')
+            except sqlite3.Error as e:
+                logger.error(f"Database error while fetching executions: {str(e)}")
+                return jsonify({'error': f'Database error occurred: {str(e)}'}), 500
         except Exception as e:
             logger.error(f"Unexpected error in get_executions: {str(e)}", exc_info=True)
             return jsonify({'error': f'Internal server error: {str(e)}'}), 500
 
+    @app.route('/api/stats', methods=['GET'])
+    def get_stats():
+        """Execution or forward rollups for a range; per bucket with ``id``, per subject without."""
+        kind = request.args.get('kind', 'execution')
+        period = request.args.get('period', 'hour')
+        if kind not in stats.KINDS:
+            return jsonify({'error': f"kind must be one of: {', '.join(stats.KINDS)}"}), 400
+        if period not in stats.PERIODS:
+            return jsonify({'error': f"period must be one of: {', '.join(stats.PERIODS)}"}), 400
+        try:
+            end = stats.parse_timestamp(request.args['end']) if 'end' in request.args else time.time()
+            start = (stats.parse_timestamp(request.args['start']) if 'start' in request.args
+                     else end - stats.DEFAULT_WINDOWS[period])
+        except ValueError as e:
+            return jsonify({'error': f'Invalid start/end: {str(e)}'}), 400
+        if start >= end:
+            return jsonify({'error': 'start must be before end'}), 400
+        try:
+            with db_pool.get_connection() as conn:
+                try:
+                    result = stats.query(conn, kind, period, start, end, request.args.get('id', type=int))
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                # Nomes dos agendamentos / regras de encaminhamento
+                table = 'schedules' if kind == 'execution' else 'forwarding_configs'
+                names = {row['id']: row['name'] for row in conn.execute(f'SELECT id, name FROM {table}')}
+            if 'subject_id' in result:
+                result['name'] = names.get(result['subject_id'])
+            for subject in result.get('subjects', []):
+                subject['name'] = names.get(subject['subject_id'])
+            return jsonify(result)
+        except Exception as e:
+            logger.error(f"Error getting stats: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
     @app.route('/api/schedules/<int:id>/toggle', methods=['POST'])
+    @invalidates('schedules')
     def toggle_schedule(id):
         try:
             with db_pool.get_connection() as conn:
@@ -692,12 +1392,7 @@ def create_app():
                 # Update scheduler
                 if new_state:
                     # Add to scheduler
-                    scheduler.add_job(
-                        execute_request,
-                        CronTrigger.from_crontab(schedule['cronExpression']),
-                        args=[schedule],
-                        id=str(id)
-                    )
+                    add_schedule_job(schedule)
                     logger.info(f"Schedule {id} activated and added to scheduler")
                 else:
                     # Remove from scheduler
@@ -718,10 +1413,8 @@ def create_app():
     def health_check():
         try:
             # Verificar conexão com o banco
-            conn = get_db()
-            c = conn.cursor()
-            c.execute('SELECT 1')
-            conn.close()
+            with db_pool.get_connection() as conn:
+                conn.execute('SELECT 1')
             
             # Verificar scheduler
             scheduler_running = scheduler.running
@@ -747,6 +1440,8 @@ def create_app():
         return send_from_directory(static_folder, path)
     
     @app.route('/api/settings/timezone', methods=['GET', 'POST'])
+    @cached('settings')
+    @invalidates('settings')
     def handle_timezone():
         if request.method == 'GET':
             try:
@@ -781,6 +1476,7 @@ def create_app():
                 return jsonify({'error': str(e)}), 500
     
     @app.route('/api/schedules/<int:id>/active', methods=['PATCH'])
+    @invalidates('schedules')
     def patch_schedule_active(id):
         try:
             data = request.get_json()
@@ -796,21 +1492,160 @@ def create_app():
             return jsonify({'error': str(e)}), 500
     
     # Load existing schedules when starting the app
-    conn = get_db()
-    c = conn.cursor()
-    c.execute('SELECT * FROM schedules WHERE active = 1')
-    schedules = [dict(row) for row in c.fetchall()]
-    conn.close()
+    with db_pool.get_connection() as conn:
+        cursor = conn.execute('SELECT * FROM schedules WHERE active = 1')
+        schedules = [dict(row) for row in cursor.fetchall()]
     
     for schedule in schedules:
-        scheduler.add_job(
-            execute_request,
-            CronTrigger.from_crontab(schedule['cronExpression']),
-            args=[schedule],
-            id=str(schedule['id'])
-        )
+        add_schedule_job(schedule)
         logger.info(f"Loaded existing active schedule: {schedule['name']}")
     
+    @app.before_request
+    def start_webhook_timer():
+        if request.endpoint == 'receive_message_for_buffer':
+            g.webhook_started = time.perf_counter()
+            g.webhook_span = tracer.trace('webhook', buffer_id=request.view_args['buffer_id']).begin()
+            if profiler.WEBHOOK_PROFILING and request.args.get('profile') in ('1', 'true'):
+                g.request_profiler = profiler.RequestProfiler().start()
+
+    @app.after_request
+    def record_webhook_metrics(response):
+        request_profiler = g.pop('request_profiler', None)
+        if request_profiler is not None:
+            # Modo profile: devolve a resposta original junto com as pilhas
+            stacks = request_profiler.stop()
+            response = jsonify({
+                'status_code': response.status_code,
+                'response': response.get_json(silent=True),
+                'profile': stacks
+            }), response.status_code
+            response = app.make_response(response)
+        started = g.pop('webhook_started', None)
+        if started is not None:
+            buffer_id = request.view_args['buffer_id']
+            metrics.WEBHOOK_DURATION.observe(time.perf_counter() - started, buffer_id)
+            metrics.WEBHOOK_REQUESTS.inc(buffer_id, response.status_code)
+            g.pop('webhook_span').finish(status_code=response.status_code)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def get_metrics():
+        return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+    @app.route('/api/events', methods=['GET'])
+    def stream_events():
+        """SSE stream of new executions and received/forwarded messages.
+
+        Resumes after ``Last-Event-ID`` (or ``last_event_id``) when given;
+        ``types`` restricts the stream to some of the event types.
+        """
+        last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+        cursor = events.parse_cursor(last_event_id) if last_event_id else None
+        if last_event_id and cursor is None:
+            return jsonify({'error': 'Invalid last event id'}), 400
+        types = request.args.get('types')
+        types = types.split(',') if types else list(events.EVENT_TYPES)
+        unknown = [event_type for event_type in types if event_type not in events.EVENT_TYPES]
+        if unknown:
+            return jsonify({'error': f"Unknown event types: {', '.join(unknown)}"}), 400
+        if not event_streams.acquire(blocking=False):
+            # O frontend volta a consultar a API periodicamente e tenta de novo depois
+            return jsonify({'error': 'Too many open event streams'}), 503, {'Retry-After': '30'}
+
+        def generate():
+            try:
+                yield from events.stream(db_pool, event_notifier, cursor, types, message_log=message_log)
+            finally:
+                event_streams.release()
+
+        return Response(generate(), mimetype='text/event-stream', headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'
+        })
+
+    @app.route('/api/admin/profile', methods=['GET'])
+    def profile_server():
+        """Sample every thread for ``seconds`` and return collapsed stacks."""
+        seconds = request.args.get('seconds', 10, type=float)
+        interval = request.args.get('interval', 0.01, type=float)
+        if not 0 < seconds <= profiler.MAX_DURATION:
+            return jsonify({'error': f'seconds must be between 0 and {profiler.MAX_DURATION}'}), 400
+        if interval < profiler.MIN_INTERVAL:
+            return jsonify({'error': f'interval must be at least {profiler.MIN_INTERVAL}'}), 400
+        try:
+            stacks, info = profiler.sample(
+                seconds, interval,
+                include_idle=request.args.get('idle') in ('1', 'true'),
+                group_threads=request.args.get('group_threads') not in ('0', 'false')
+            )
+        except profiler.ProfilerBusy as e:
+            return jsonify({'error': str(e)}), 409
+        logger.info(f"Profile finished: {info}")
+        return Response(stacks, content_type='text/plain; charset=utf-8', headers={
+            'X-Profile-Duration': str(info['duration']),
+            'X-Profile-Samples': str(info['samples'])
+        })
+
+    @app.route('/api/admin/capture', methods=['GET'])
+    def get_capture():
+        return jsonify({'capture': capture_recorder.status(), 'files': capture_recorder.files()})
+
+    @app.route('/api/admin/capture', methods=['POST'])
+    def start_capture():
+        """Start recording webhook requests; optional ``buffer_ids``, ``seconds`` and ``max_bytes``."""
+        data = request.get_json(silent=True) or {}
+        try:
+            buffer_ids = [int(buffer_id) for buffer_id in data.get('buffer_ids') or []]
+            seconds = float(data['seconds']) if data.get('seconds') else None
+            max_bytes = int(data['max_bytes']) if data.get('max_bytes') else None
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': str(e)}), 400
+        try:
+            return jsonify(capture_recorder.start(buffer_ids, seconds, max_bytes)), 201
+        except capture.CaptureBusy as e:
+            return jsonify({'error': str(e)}), 409
+        except Exception as e:
+            logger.error(f"Error starting capture: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/admin/capture', methods=['DELETE'])
+    def stop_capture():
+        info = capture_recorder.stop()
+        if info is None:
+            return jsonify({'error': 'No capture is running'}), 404
+        return jsonify(info)
+
+    @app.route('/api/admin/capture/files/<name>', methods=['GET'])
+    def download_capture(name):
+        return send_from_directory(CAPTURE_DIR, name, as_attachment=True, mimetype='application/octet-stream')
+
+    @app.route('/api/traces', methods=['GET'])
+    def get_traces():
+        """Recent traces from the in-memory exporter, by message, forward or trace id."""
+        if tracer.memory is None:
+            return jsonify({'error': 'In-memory trace exporter is not enabled'}), 404
+        traces = tracer.memory.find(
+            trace_id=request.args.get('trace_id'),
+            message_id=request.args.get('message_id', type=int),
+            forwarded_id=request.args.get('forwarded_id', type=int),
+            limit=request.args.get('limit', 50, type=int)
+        )
+        return jsonify(traces)
+
+    @app.route('/api/traces/config', methods=['GET', 'PUT'])
+    def handle_trace_config():
+        if request.method == 'PUT':
+            data = request.get_json(silent=True) or {}
+            try:
+                tracer.set_sample_rate(float(data.get('sample_rate', tracer.sample_rate)))
+            except (TypeError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+            logger.info(f"Trace sample rate set to {tracer.sample_rate}")
+        return jsonify({
+            'sample_rate': tracer.sample_rate,
+            'exporters': [type(exporter).__name__ for exporter in tracer.exporters]
+        })
+
     # Webhook endpoint to receive messages
     @app.route('/api/webhook', methods=['POST'])
     def receive_message():
@@ -819,6 +1654,14 @@ def create_app():
     # Webhook endpoint to receive messages for a specific buffer config
     @app.route('/api/webhook/<int:buffer_id>', methods=['POST'])
     def receive_message_for_buffer(buffer_id):
+        # Admissão antes de ler o corpo e de qualquer acesso ao banco
+        try:
+            admission_control.check(buffer_id, buffer_pending.get(buffer_id, 0), sum(list(buffer_pending.values())))
+        except admission.Shed as shed:
+            metrics.WEBHOOK_SHED.inc(buffer_id, shed.reason)
+            response = jsonify({'error': f'Too many requests ({shed.reason})', 'retry_after': shed.retry_after})
+            response.headers['Retry-After'] = str(shed.retry_after)
+            return response, 429
         try:
             message_data = request.get_json()
             if not message_data:
@@ -826,26 +1669,59 @@ def create_app():
 
             with db_pool.get_connection() as conn:
                 # Check if buffer config exists and is active
-                cursor = conn.execute('SELECT * FROM buffer_configs WHERE id = ? AND active = 1', (buffer_id,))
-                buffer_config = cursor.fetchone()
+                with tracer.span('webhook.config_read'):
+                    cursor = conn.execute('SELECT * FROM buffer_configs WHERE id = ? AND active = 1', (buffer_id,))
+                    buffer_config = cursor.fetchone()
                 if not buffer_config:
                     return jsonify({'error': 'Buffer config not found or inactive'}), 404
                 buffer_config = dict(buffer_config)
+                if capture_recorder.active:
+                    capture_recorder.record(buffer_id, request.get_data(),
+                                            capture.header_for(buffer_config['idempotency_key'], request.headers))
                 key_field = buffer_config['filter_field']
-                max_size = buffer_config['max_size']
-                max_time = buffer_config['max_time']
+                max_size, max_time = adaptive_flush.limits(buffer_id, buffer_config)
                 if key_field not in message_data:
                     return jsonify({'error': f'Message missing key field: {key_field}'}), 400
                 key_value = str(message_data[key_field])
+                # Reenvio do produtor: responder com a mensagem original, sem gravar nem bufferizar
+                idempotency_key = idempotency.extract_key(buffer_config['idempotency_key'], request.headers, message_data)
+                if idempotency_key is not None:
+                    original_id = idempotency_index.get(buffer_id, idempotency_key)
+                    if original_id is not None:
+                        metrics.IDEMPOTENCY_LOOKUPS.inc(buffer_id, 'hit')
+                        return jsonify({'status': 'duplicate', 'message_id': original_id}), 200
+                # O buffer guarda o mesmo JSON serializado gravado no banco, não o dict
+                payload = json.dumps(message_data)
                 # Store the message with buffer_id
-                cursor = conn.execute(
-                    'INSERT INTO received_messages (message_data, source, buffer_id) VALUES (?, ?, ?)',
-                    (json.dumps(message_data), request.remote_addr, buffer_id)
-                )
-                message_id = cursor.lastrowid
-                conn.commit()
+                if buffer_config['ingest_log']:
+                    # Só o índice em memória deduplica: o log não tem índice único
+                    with tracer.span('webhook.log_append'):
+                        message_id = message_log.append(buffer_id, payload, request.remote_addr)
+                else:
+                    with tracer.span('webhook.insert'):
+                        try:
+                            cursor = conn.execute(
+                                'INSERT INTO received_messages (message_data, source, buffer_id, idempotency_key) VALUES (?, ?, ?, ?)',
+                                (payload, request.remote_addr, buffer_id, idempotency_key)
+                            )
+                        except sqlite3.IntegrityError:
+                            # Chave fora da janela em memória, ou reenvio concorrente
+                            row = conn.execute(
+                                'SELECT id FROM received_messages WHERE buffer_id = ? AND idempotency_key = ?',
+                                (buffer_id, idempotency_key)
+                            ).fetchone()
+                            idempotency_index.put(buffer_id, idempotency_key, row['id'])
+                            metrics.IDEMPOTENCY_LOOKUPS.inc(buffer_id, 'db_hit')
+                            return jsonify({'status': 'duplicate', 'message_id': row['id']}), 200
+                        message_id = cursor.lastrowid
+                        conn.commit()
+                if idempotency_key is not None:
+                    idempotency_index.put(buffer_id, idempotency_key, message_id)
+                    metrics.IDEMPOTENCY_LOOKUPS.inc(buffer_id, 'miss')
+                tracer.annotate(message_id=message_id, key_value=key_value)
+            event_notifier.notify()
             # Buffer the message
-            buffer_message(buffer_id, key_value, message_id, message_data, max_size, max_time)
+            buffer_message(buffer_id, key_value, message_id, payload, max_size, max_time, buffer_config['max_bytes'])
             return jsonify({'status': 'buffered', 'message_id': message_id}), 201
         except Exception as e:
             logger.error(f"Error receiving message for buffer {buffer_id}: {str(e)}")
@@ -853,6 +1729,7 @@ def create_app():
 
     # Buffer configuration endpoints
     @app.route('/api/buffer-configs', methods=['GET'])
+    @cached('buffer_configs')
     def get_buffer_configs():
         try:
             with db_pool.get_connection() as conn:
@@ -864,6 +1741,7 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/buffer-configs', methods=['POST'])
+    @invalidates('buffer_configs')
     def create_buffer_config():
         try:
             data = request.get_json()
@@ -871,14 +1749,22 @@ def create_app():
             if not all(field in data for field in required_fields):
                 return jsonify({'error': 'Missing required fields'}), 400
 
+            try:
+                options = read_options(data, BUFFER_OPTIONS)
+                idempotency.parse_spec(data.get('idempotency_key'))
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
             with db_pool.get_connection() as conn:
                 cursor = conn.execute(
-                    '''INSERT INTO buffer_configs 
-                       (name, filter_field, max_size, max_time, reset_timer_on_message) 
-                       VALUES (?, ?, ?, ?, ?)''',
+                    f'''INSERT INTO buffer_configs 
+                       (name, filter_field, max_size, max_time, reset_timer_on_message, idempotency_key, {', '.join(options)}) 
+                       VALUES (?, ?, ?, ?, ?, ?{', ?' * len(options)})''',
                     (data['name'], data['filter_field'], 
                      data.get('max_size', 10), data.get('max_time', 60),
-                     int(data.get('reset_timer_on_message', False)))
+                     int(data.get('reset_timer_on_message', False)),
+                     data.get('idempotency_key') or None,
+                     *options.values())
                 )
                 config_id = cursor.lastrowid
                 conn.commit()
@@ -888,6 +1774,7 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/buffer-configs/<int:id>', methods=['PUT'])
+    @invalidates('buffer_configs')
     def update_buffer_config(id):
         try:
             data = request.get_json()
@@ -902,9 +1789,16 @@ def create_app():
                 max_size = data.get('max_size', config.get('max_size', 10))
                 max_time = data.get('max_time', config.get('max_time', 60))
                 reset_timer_on_message = int(data.get('reset_timer_on_message', config.get('reset_timer_on_message', 0)))
-                conn.execute('''
+                idempotency_key = data.get('idempotency_key', config.get('idempotency_key')) or None
+                try:
+                    options = read_options(data, BUFFER_OPTIONS, config)
+                    idempotency.parse_spec(idempotency_key)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                conn.execute(f'''
                     UPDATE buffer_configs
-                    SET name = ?, filter_field = ?, max_size = ?, max_time = ?, reset_timer_on_message = ?
+                    SET name = ?, filter_field = ?, max_size = ?, max_time = ?, reset_timer_on_message = ?, idempotency_key = ?,
+                        {', '.join(f'{column} = ?' for column in options)}
                     WHERE id = ?
                 ''', (
                     name,
@@ -912,6 +1806,8 @@ def create_app():
                     max_size,
                     max_time,
                     reset_timer_on_message,
+                    idempotency_key,
+                    *options.values(),
                     id
                 ))
                 conn.commit()
@@ -921,6 +1817,8 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/buffer-configs/<int:id>', methods=['DELETE'])
+    # Remoção em cascata também apaga forwarding_configs
+    @invalidates('buffer_configs', 'forwarding_configs')
     def delete_buffer_config(id):
         try:
             with db_pool.get_connection() as conn:
@@ -933,17 +1831,19 @@ def create_app():
 
     # Forwarding configuration endpoints
     @app.route('/api/forwarding-configs', methods=['GET'])
+    @cached('forwarding_configs')
     def get_forwarding_configs():
         try:
             with db_pool.get_connection() as conn:
                 cursor = conn.execute('SELECT * FROM forwarding_configs ORDER BY createdAt DESC')
-                configs = [dict(row) for row in cursor.fetchall()]
+                configs = [dict(row, circuit=circuit_breakers.status(row['id'])) for row in cursor.fetchall()]
                 return jsonify(configs)
         except Exception as e:
             logger.error(f"Error getting forwarding configs: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/forwarding-configs', methods=['POST'])
+    @invalidates('forwarding_configs')
     def create_forwarding_config():
         try:
             data = request.get_json()
@@ -951,17 +1851,23 @@ def create_app():
             if not all(field in data for field in required_fields):
                 return jsonify({'error': 'Missing required fields'}), 400
 
+            try:
+                options = read_options(data, FORWARDING_OPTIONS)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
             with db_pool.get_connection() as conn:
                 cursor = conn.execute(
-                    '''INSERT INTO forwarding_configs 
-                       (name, url, method, headers, buffer_config_id, fields, template) 
-                       VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                    f'''INSERT INTO forwarding_configs 
+                       (name, url, method, headers, buffer_config_id, fields, template, {', '.join(options)}) 
+                       VALUES (?, ?, ?, ?, ?, ?, ?{', ?' * len(options)})''',
                     (data['name'], data['url'], 
                      data.get('method', 'POST'),
                      json.dumps(data.get('headers', {})),
                      data['buffer_config_id'],
                      ','.join(data.get('fields', [])) if isinstance(data.get('fields', []), list) else (data.get('fields') or ''),
-                     data.get('template', ''))
+                     data.get('template', ''),
+                     *options.values())
                 )
                 config_id = cursor.lastrowid
                 conn.commit()
@@ -971,6 +1877,7 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/forwarding-configs/<int:id>', methods=['PUT'])
+    @invalidates('forwarding_configs')
     def update_forwarding_config(id):
         try:
             data = request.get_json()
@@ -988,12 +1895,17 @@ def create_app():
                 fields = data.get('fields', config.get('fields', ''))
                 template = data.get('template', config.get('template', ''))
                 active = int(data.get('active', config.get('active', 1)))
-                conn.execute('''
+                try:
+                    options = read_options(data, FORWARDING_OPTIONS, config)
+                except ValueError as e:
+                    return jsonify({'error': str(e)}), 400
+                conn.execute(f'''
                     UPDATE forwarding_configs
-                    SET name = ?, url = ?, method = ?, headers = ?, buffer_config_id = ?, fields = ?, template = ?, active = ?
+                    SET name = ?, url = ?, method = ?, headers = ?, buffer_config_id = ?, fields = ?, template = ?, active = ?,
+                        {', '.join(f'{column} = ?' for column in options)}
                     WHERE id = ?
                 ''', (
-                    name, url, method, headers, buffer_config_id, fields, template, active, id
+                    name, url, method, headers, buffer_config_id, fields, template, active, *options.values(), id
                 ))
                 conn.commit()
             return jsonify({'status': 'success'}), 200
@@ -1002,16 +1914,63 @@ def create_app():
             return jsonify({'error': str(e)}), 500
 
     @app.route('/api/forwarding-configs/<int:id>', methods=['DELETE'])
+    @invalidates('forwarding_configs')
     def delete_forwarding_config(id):
         try:
             with db_pool.get_connection() as conn:
                 conn.execute('DELETE FROM forwarding_configs WHERE id = ?', (id,))
                 conn.commit()
+            circuit_breakers.forget(id)
             return jsonify({'status': 'deleted'}), 200
         except Exception as e:
             logger.error(f"Error deleting forwarding config: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
+    # Retry and dead-letter endpoints
+    @app.route('/api/retries', methods=['GET'])
+    def get_retries():
+        try:
+            with db_pool.get_connection() as conn:
+                cursor = conn.execute('SELECT * FROM forward_retries ORDER BY next_attempt_at LIMIT 100')
+                return jsonify([dict(row) for row in cursor.fetchall()])
+        except Exception as e:
+            logger.error(f"Error getting retries: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/dead-letters', methods=['GET'])
+    def get_dead_letters():
+        try:
+            with db_pool.get_connection() as conn:
+                cursor = conn.execute('SELECT * FROM dead_letters ORDER BY id DESC LIMIT 100')
+                return jsonify([dict(row) for row in cursor.fetchall()])
+        except Exception as e:
+            logger.error(f"Error getting dead letters: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/dead-letters/replay', methods=['POST'])
+    def replay_dead_letters():
+        """Replay dead letters by ``ids``, by ``forwarding_config_id`` or all of them."""
+        try:
+            data = request.get_json(silent=True) or {}
+            ids = data.get('ids')
+            if ids is not None and (not isinstance(ids, list) or not all(isinstance(id, int) for id in ids)):
+                return jsonify({'error': 'ids must be a list of integers'}), 400
+            replayed = retry_queue.replay(ids=ids, forwarding_config_id=data.get('forwarding_config_id'))
+            return jsonify({'replayed': replayed})
+        except Exception as e:
+            logger.error(f"Error replaying dead letters: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
+    @app.route('/api/dead-letters/<int:id>', methods=['DELETE'])
+    def delete_dead_letter(id):
+        try:
+            with db_pool.get_connection() as conn:
+                conn.execute('DELETE FROM dead_letters WHERE id = ?', (id,))
+            return jsonify({'status': 'deleted'}), 200
+        except Exception as e:
+            logger.error(f"Error deleting dead letter: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+
     # Message history endpoints
     @app.route('/api/messages/received', methods=['GET'])
     def get_received_messages():
@@ -1024,8 +1983,14 @@ def create_app():
                     ORDER BY received_at DESC 
                     LIMIT 100
                 ''')
-                messages = [dict(row) for row in cursor.fetchall()]
-                return jsonify(messages)
+                logged = message_log.recent(100)
+                if not logged:
+                    return rows_response(cursor)
+                # Mensagens dos buffers com ingest_log, intercaladas por horário de chegada
+                columns = [column[0] for column in cursor.description]
+                rows = [dict(zip(columns, row)) for row in cursor] + logged
+                rows.sort(key=lambda row: row['received_at'], reverse=True)
+                return jsonify(rows[:100])
         except Exception as e:
             logger.error(f"Error getting received messages: {str(e)}")
             return jsonify({'error': str(e)}), 500
@@ -1041,25 +2006,39 @@ def create_app():
                     ORDER BY fm.forwarded_at DESC 
                     LIMIT 100
                 ''')
-                messages = [dict(row) for row in cursor.fetchall()]
-                return jsonify(messages)
+                return rows_response(cursor)
         except Exception as e:
             logger.error(f"Error getting forwarded messages: {str(e)}")
             return jsonify({'error': str(e)}), 500
 
     import threading
+    # (buffer_id, key_value) -> memory.BufferGroup
     buffer_store = {}
     buffer_timers = {}
-    buffer_lock = threading.Lock()
+    # Mensagens aguardando flush por buffer_id, para a admissão do webhook
+    buffer_pending = {}
+    admission_control = admission.AdmissionControl(db_pool)
+    # Tamanho de lote e espera efetivos dos buffers adaptativos
+    adaptive_flush = adaptive.AdaptiveFlush()
+    # Chaves de idempotência recentes; o índice único de received_messages cobre o resto
+    idempotency_index = idempotency.IdempotencyIndex()
+    memory_budget = memory.MemoryBudget()
+    # Chaves com flush por pressão de memória já disparado, ainda não iniciado
+    pressure_flushes = set()
+    buffer_lock = threading.RLock()
+    # Entregas dos buffers com ordered: em sequência por chave, em paralelo entre chaves
+    ordered_delivery = ordering.KeyedExecutor()
 
     def flush_buffer(buffer_id, key_value):
         logger.info(f"[FLUSH] Disparando flush_buffer para buffer_id={buffer_id}, key_value={key_value}")
+        wait_started = time.time()
         with buffer_lock:
             buffer_key = (buffer_id, key_value)
-            messages = buffer_store.pop(buffer_key, [])
+            group = buffer_store.pop(buffer_key, None)
             timer = buffer_timers.pop(buffer_key, None)
+            pressure_flushes.discard(buffer_key)
             
-            if not messages:
+            if not group:
                 logger.info(f"[FLUSH] Nenhuma mensagem para encaminhar em buffer_id={buffer_id}, key_value={key_value}")
                 return
                 
@@ -1067,115 +2046,203 @@ def create_app():
                 logger.info(f"[FLUSH] Cancelando timer para buffer_id={buffer_id}, key_value={key_value}")
                 timer.cancel()
             
-            logger.info(f"[FLUSH] Encaminhando {len(messages)} mensagens para buffer_id={buffer_id}, key_value={key_value}")
+            memory_budget.release(group.resident)
+            buffer_pending[buffer_id] -= len(group)
+            logger.info(f"[FLUSH] Encaminhando {len(group)} mensagens para buffer_id={buffer_id}, key_value={key_value}")
+            message_ids = group.message_ids.tolist()
+            metrics.FLUSH_SIZE.observe(len(group), buffer_id)
+            flush_started = time.perf_counter()
+            flush_span = trace_flush(buffer_id, key_value, group, wait_started)
+            failed = False
+            handed_off = False
             try:
-                with db_pool.get_connection() as conn:
+                with tracer.span('flush.config_read'), db_pool.get_connection() as conn:
                     # Get active forwarding configs for this buffer
                     cursor = conn.execute('SELECT * FROM forwarding_configs WHERE active = 1 AND buffer_config_id = ?', (buffer_id,))
                     forwarding_configs = [dict(row) for row in cursor.fetchall()]
                     if not forwarding_configs:
                         # Nenhuma regra de encaminhamento: marcar como cancelada
-                        for msg in messages:
-                            conn.execute('UPDATE received_messages SET processed = 1, status = ? WHERE id = ?', ('cancelled', msg['message_id']))
-                        conn.commit()
+                        set_messages_status(conn, message_ids, 'cancelled')
                         logger.info(f"[FLUSH] Nenhuma regra de encaminhamento ativa para buffer_id={buffer_id}. Mensagens marcadas como canceladas.")
                         return
 
-                    # Para cada regra de encaminhamento ativa
+                    # Obter o campo-chave
+                    cursor = conn.execute('SELECT filter_field, ordered FROM buffer_configs WHERE id = ?', (buffer_id,))
+                    row = cursor.fetchone()
+                    key_field = row['filter_field'] if row else None
+
+                    # Payloads só são decodificados aqui; os despejados vêm do banco
+                    messages = group.decode(conn, message_log)
+
+                if row and row['ordered']:
+                    # Sem coalescência: cada lote segue na vez da sua chave
+                    deliveries = deque()
                     for fw_config in forwarding_configs:
-                        try:
-                            headers = json.loads(fw_config['headers']) if fw_config['headers'] else {}
-                            # Obter o campo-chave
-                            cursor2 = conn.execute('SELECT filter_field FROM buffer_configs WHERE id = ?', (buffer_id,))
-                            row2 = cursor2.fetchone()
-                            key_field = row2['filter_field'] if row2 else None
-                            key_value = messages[0]['data'][key_field] if key_field else None
-                            if fw_config['template'] and key_field:
-                                # Usar template para o valor de cada mensagem
-                                template = fw_config['template']
-                                content_list = []
-                                for msg in messages:
-                                    data = msg['data']
-                                    msg_payload = template
-                                    for k, v in data.items():
-                                        msg_payload = msg_payload.replace(f'{{{{{k}}}}}', str(v))
-                                    # O resultado do template é o valor do array
-                                    try:
-                                        rendered = json.loads(msg_payload)
-                                    except Exception:
-                                        rendered = msg_payload
-                                    content_list.append(rendered)
-                                payload = {key_field: key_value, 'content': content_list}
-                            elif key_field:
-                                # Sem template: pegar o campo conteudo de cada mensagem
-                                content_list = [msg['data'].get('conteudo') for msg in messages]
-                                payload = {key_field: key_value, 'content': content_list}
-                            else:
-                                # fallback
-                                to_forward = [msg['data'] for msg in messages]
-                                payload = {'content': to_forward}
+                        payload = build_forward_payload(fw_config, key_field, messages)
+                        deliveries.extend((fw_config, batch, 1, None) for batch in batching.split_batch({
+                            'buffer_id': buffer_id,
+                            'key_value': key_value,
+                            'message_ids': message_ids,
+                            'payload': payload
+                        }, fw_config['max_request_bytes']))
+                    # Submetido sob o buffer_lock: a ordem da fila da chave é a ordem dos flushes
+                    ordered_delivery.submit(buffer_key, deliver_in_order, buffer_id, key_value, deliveries,
+                                            {'started': flush_started, 'failed': False})
+                    handed_off = True
+                    return
 
+                # Para cada regra de encaminhamento ativa
+                for fw_config in forwarding_configs:
+                    try:
+                        with tracer.span('forward', forwarding_config_id=fw_config['id']):
+                            payload = build_forward_payload(fw_config, key_field, messages)
                             logger.info(f"[FLUSH] Enviando para {fw_config['url']} com payload: {json.dumps(payload)}")
-                            response = requests.request(
-                                method=fw_config['method'],
-                                url=fw_config['url'],
-                                json=payload,
-                                headers=headers
-                            )
-                            # Salvar o payload enviado e a resposta real
-                            response_text = json.dumps({
-                                'sent': {
-                                    'payload': payload,
-                                    'headers': headers
-                                },
-                                'response': {
-                                    'status_code': response.status_code,
-                                    'text': response.text
-                                }
-                            })
-                            
-                            # Criar apenas um registro em forwarded_messages para o grupo
-                            cursor_fwd = conn.execute(
-                                '''INSERT INTO forwarded_messages 
-                                   (received_message_id, forwarding_config_id, status, response) 
-                                   VALUES (?, ?, ?, ?)''',
-                                (messages[0]['message_id'], fw_config['id'], 'success' if response.ok else 'error', response_text)
-                            )
-                            forwarded_id = cursor_fwd.lastrowid
-                            
-                            # Atualizar todas as mensagens recebidas do grupo
-                            for msg in messages:
-                                conn.execute('UPDATE received_messages SET processed = 1, forwarded_id = ?, status = ? WHERE id = ?', 
-                                           (forwarded_id, 'success' if response.ok else 'error', msg['message_id']))
-                            
-                            conn.commit()
+                            batches = batching.split_batch({
+                                'buffer_id': buffer_id,
+                                'key_value': key_value,
+                                'message_ids': message_ids,
+                                'payload': payload
+                            }, fw_config['max_request_bytes'])
+                            # Sob o buffer_lock: não esperar pelos limites de saída; o que for barrado vai para a fila de retentativas
+                            with throttle.capped_wait():
+                                if fw_config['coalesce_window']:
+                                    # Enviados junto com os grupos de outras chaves ao fim da janela
+                                    for batch in batches:
+                                        coalescer.add(fw_config, batch)
+                                    continue
+                                delivered = all([retry_queue.deliver(fw_config, batch) for batch in batches])
+                        if delivered:
                             logger.info(f"[FLUSH] Mensagens encaminhadas com sucesso para {fw_config['url']}")
-                            
-                        except Exception as e:
-                            logger.error(f"[FLUSH] Erro ao encaminhar mensagens para {fw_config['url']}: {str(e)}")
-                            # Marcar mensagens como erro
-                            for msg in messages:
-                                conn.execute('UPDATE received_messages SET processed = 1, status = ? WHERE id = ?', ('error', msg['message_id']))
-                            conn.commit()
+                        else:
+                            failed = True
+                    except Exception as e:
+                        failed = True
+                        logger.error(f"[FLUSH] Erro ao encaminhar mensagens para {fw_config['url']}: {str(e)}")
+                        # Marcar mensagens como erro
+                        with db_pool.get_connection() as conn:
+                            set_messages_status(conn, message_ids, 'error')
                             
             except Exception as e:
+                failed = True
                 logger.error(f"[FLUSH] Erro ao processar mensagens: {str(e)}")
                 # Marcar mensagens como erro
                 try:
                     with db_pool.get_connection() as conn:
-                        for msg in messages:
-                            conn.execute('UPDATE received_messages SET processed = 1, status = ? WHERE id = ?', ('error', msg['message_id']))
-                        conn.commit()
+                        set_messages_status(conn, message_ids, 'error')
                 except Exception as db_error:
                     logger.error(f"[FLUSH] Erro ao marcar mensagens como erro: {str(db_error)}")
+            finally:
+                if not handed_off:
+                    observe_flush(buffer_id, time.perf_counter() - flush_started, failed)
+                flush_span.finish()
+
+    def observe_flush(buffer_id, flush_duration, failed):
+        metrics.FLUSH_DURATION.observe(flush_duration, buffer_id)
+        decision = adaptive_flush.observe(buffer_id, flush_duration, failed, buffer_pending.get(buffer_id, 0))
+        if decision is not None:
+            metrics.ADAPTIVE_DECISIONS.inc(buffer_id, decision)
+
+    def deliver_in_order(buffer_id, key_value, deliveries, flush):
+        """Send the batches of one flush of an ordered buffer (keyed executor task).
+
+        Returns the seconds to wait when the first pending batch must be
+        retried: the executor runs the task again after that, and the later
+        flushes of the key wait behind it.
+        """
+        not_before = flush.pop('not_before', 0) - time.time()
+        if not_before > 0:
+            # Retentativa retomada de uma execução anterior: esperar a hora dela
+            return not_before
+        while deliveries:
+            fw_config, batch, attempt, retry_id = deliveries[0]
+            try:
+                with tracer.span('forward', forwarding_config_id=fw_config['id'], key_value=key_value):
+                    delivered, retry = retry_queue.deliver_in_order(fw_config, batch, attempt, retry_id)
+            except Exception as e:
+                logger.error(f"[FLUSH] Erro ao encaminhar mensagens para {fw_config['url']}: {str(e)}")
+                # Guardado como dead letter para poder ser reenviado
+                retry_queue.dead_letter(fw_config['id'], batch, attempt, str(e), retry_id)
+                delivered, retry = False, None
+            if retry is not None:
+                flush['failed'] = True
+                delay, attempt, retry_id = retry
+                deliveries[0] = (fw_config, batch, attempt, retry_id)
+                return delay
+            if delivered:
+                logger.info(f"[FLUSH] Mensagens encaminhadas com sucesso para {fw_config['url']}")
+            else:
+                flush['failed'] = True
+            deliveries.popleft()
+        observe_flush(buffer_id, time.perf_counter() - flush['started'], flush['failed'])
+
+    def resume_ordered_retries():
+        """Hand the ordered retries left from the previous run back to their keys, oldest first."""
+        for retry_id in retry_queue.take_ordered():
+            loaded = retry_queue.load(retry_id)
+            if loaded is None:
+                continue
+            row, fw_config, batch = loaded
+            ordered_delivery.submit((row['buffer_id'], row['key_value']), deliver_in_order, row['buffer_id'],
+                                    row['key_value'], deque([(fw_config, batch, row['attempts'] + 1, retry_id)]),
+                                    {'started': time.perf_counter(), 'failed': False,
+                                     'not_before': row['next_attempt_at']})
+
+    def rebuffer_log_messages():
+        """Buffer again the log messages a previous run held in memory and never flushed.
+
+        Messages whose buffer is gone, inactive or no longer matches are
+        marked cancelled, so their segments can be removed.
+        """
+        unflushed = message_log.take_unflushed()
+        if not unflushed:
+            return
+        with db_pool.get_connection() as conn:
+            buffer_configs = {row['id']: dict(row) for row in conn.execute('SELECT * FROM buffer_configs WHERE active = 1')}
+        cancelled = []
+        for message_id, buffer_id, payload in unflushed:
+            buffer_config = buffer_configs.get(buffer_id)
+            try:
+                message_data = json.loads(payload)
+            except ValueError:
+                message_data = None
+            if buffer_config is None or not isinstance(message_data, dict) or buffer_config['filter_field'] not in message_data:
+                cancelled.append(message_id)
+                continue
+            max_size, max_time = adaptive_flush.limits(buffer_id, buffer_config)
+            buffer_message(buffer_id, str(message_data[buffer_config['filter_field']]), message_id, payload,
+                           max_size, max_time, buffer_config['max_bytes'])
+        if cancelled:
+            with db_pool.get_connection() as conn:
+                set_messages_status(conn, cancelled, 'cancelled')
+        logger.info(f"[LOG] {len(unflushed) - len(cancelled)} mensagens do log de volta aos buffers, {len(cancelled)} canceladas")
 
-    def buffer_message(buffer_id, key_value, message_id, message_data, max_size, max_time):
+    def trace_flush(buffer_id, key_value, group, wait_started):
+        """Start the root span of a flush; only flushes carrying a traced message are sampled."""
+        traced = group.traced()
+        if not traced:
+            return tracer.trace('flush', sampled=False)
+        now = time.time()
+        for message_id, buffered_at, trace in traced:
+            tracer.record('buffer.wait', trace, buffered_at, now, message_id=message_id)
+        span = tracer.trace(
+            'flush', sampled=True, start=wait_started, buffer_id=buffer_id, key_value=key_value,
+            size=len(group), message_ids=[message_id for message_id, _, _ in traced],
+            links=[trace[0] for _, _, trace in traced]
+        ).begin()
+        tracer.record('flush.lock_wait', span.context, wait_started, now)
+        return span
+
+    def buffer_message(buffer_id, key_value, message_id, payload, max_size, max_time, max_bytes=0):
         buffer_key = (buffer_id, key_value)
+        lock_span = tracer.span('buffer.lock_wait').begin()
         with buffer_lock:
-            if buffer_key not in buffer_store:
-                buffer_store[buffer_key] = []
-            buffer_store[buffer_key].append({'message_id': message_id, 'data': message_data})
-            logger.info(f"[BUFFER] Mensagem adicionada ao buffer_id={buffer_id}, key_value={key_value}. Total: {len(buffer_store[buffer_key])}")
+            lock_span.finish()
+            group = buffer_store.get(buffer_key)
+            if group is None:
+                group = buffer_store[buffer_key] = memory.BufferGroup()
+            memory_budget.add(group.append(message_id, payload, time.time(), tracer.current_context()))
+            buffer_pending[buffer_id] = buffer_pending.get(buffer_id, 0) + 1
+            logger.info(f"[BUFFER] Mensagem adicionada ao buffer_id={buffer_id}, key_value={key_value}. Total: {len(group)}")
             
             # Verificar se deve resetar o timer
             should_reset_timer = False
@@ -1196,10 +2263,159 @@ def create_app():
                 timer.start()
             
             # Check if buffer is full
-            if len(buffer_store[buffer_key]) >= max_size:
+            if len(group) >= max_size or (max_bytes and group.bytes >= max_bytes):
                 logger.info(f"[FLUSH] Buffer cheio para buffer_id={buffer_id}, key_value={key_value}. Disparando flush_buffer.")
                 flush_buffer(buffer_id, key_value)
 
+            if memory_budget.over():
+                relieve_memory_pressure()
+
+    def relieve_memory_pressure():
+        """Spill or flush the largest keys until resident payloads are under the low watermark."""
+        excess = memory_budget.excess()
+        # Flushes já disparados ainda vão liberar os seus grupos
+        excess -= sum(buffer_store[buffer_key].resident for buffer_key in pressure_flushes if buffer_key in buffer_store)
+        if excess <= 0:
+            return
+        logger.warning(f"[MEMORY] {memory_budget.resident} bytes buffered, over the budget of {memory_budget.limit}. Releasing {excess} bytes ({memory_budget.policy}).")
+        largest = sorted(buffer_store.items(), key=lambda item: item[1].resident, reverse=True)
+        for buffer_key, group in largest:
+            if excess <= 0 or not group.resident:
+                break
+            if buffer_key in pressure_flushes:
+                continue
+            excess -= group.resident
+            metrics.MEMORY_PRESSURE.inc(memory_budget.policy)
+            if memory_budget.policy == 'flush':
+                # Fora da requisição do webhook: o flush encaminha segurando o buffer_lock
+                pressure_flushes.add(buffer_key)
+                threading.Thread(target=flush_buffer, args=buffer_key, name='memory-flush', daemon=True).start()
+            else:
+                # Os payloads voltam de received_messages no flush
+                memory_budget.release(group.spill())
+
+    def deliver_coalesced(fw_config, batch):
+        """Send the groups of several keys collected by the coalescer in one request."""
+        try:
+            if retry_queue.deliver(fw_config, batch):
+                logger.info(f"[FLUSH] {len(batch['payload']['batches'])} grupos encaminhados com sucesso para {fw_config['url']}")
+        except Exception as e:
+            logger.error(f"[FLUSH] Erro ao encaminhar mensagens para {fw_config['url']}: {str(e)}")
+            with db_pool.get_connection() as conn:
+                set_messages_status(conn, batch['message_ids'], 'error')
+
+    coalescer = batching.Coalescer(deliver_coalesced)
+
+    def drain_buffers():
+        """Flush every pending buffer key right away, e.g. on shutdown.
+
+        flush_buffer holds buffer_lock while forwarding, so once every key has
+        been flushed here any forward that was already in flight has finished.
+        Groups waiting in a coalescing window are sent last, then the flushes
+        of ordered buffers are awaited. Keys held back by a retry keep their
+        batches in forward_retries, and the flushes queued behind them (only
+        in memory until now) are written there too, in key order, to be
+        resumed on the next start.
+        """
+        with buffer_lock:
+            pending = list(buffer_store.keys())
+        logger.info(f"[DRAIN] Flushing {len(pending)} pending buffer(s)")
+        for buffer_id, key_value in pending:
+            flush_buffer(buffer_id, key_value)
+        coalescer.flush_all()
+        ordered_delivery.wait()
+        held = ordered_delivery.drain()
+        stored = 0
+        for _, _, (buffer_id, key_value, deliveries, flush) in held:
+            for fw_config, batch, attempt, retry_id in deliveries:
+                # O lote da vez já tem retry_id: está em forward_retries
+                if retry_id is None:
+                    retry_queue.store(fw_config, batch, attempt - 1, time.time(), 'Held behind an earlier batch of its key',
+                                      schedule=False)
+                    stored += 1
+        if stored:
+            logger.info(f"[DRAIN] {stored} ordered batch(es) queued behind a retry saved to forward_retries")
+
+    def collect_buffer_metrics():
+        # list() copies the items in one step under the GIL, so scrapes never
+        # wait on buffer_lock (which is held while a flush forwards)
+        groups = list(buffer_store.items())
+        adaptive_states = adaptive_flush.snapshot()
+        circuits = circuit_breakers.snapshot()
+        log_segments, log_bytes, log_open = message_log.stats()
+        ordered_keys, ordered_flushes, ordered_held = ordered_delivery.stats()
+        now = time.time()
+        keys = {}
+        counts = {}
+        oldest = {}
+        resident = {}
+        spilled = {}
+        for (buffer_id, _), group in groups:
+            keys[buffer_id] = keys.get(buffer_id, 0) + 1
+            counts[buffer_id] = counts.get(buffer_id, 0) + len(group)
+            resident[buffer_id] = resident.get(buffer_id, 0) + group.resident
+            spilled[buffer_id] = spilled.get(buffer_id, 0) + group.spilled
+            if group:
+                age = now - group.buffered_at[0]
+                oldest[buffer_id] = max(oldest.get(buffer_id, 0), age)
+        return [
+            ('buffer_store_keys', 'gauge', 'Distinct keys currently buffered',
+             [({'buffer_id': id}, value) for id, value in keys.items()]),
+            ('buffer_store_messages', 'gauge', 'Messages currently buffered',
+             [({'buffer_id': id}, value) for id, value in counts.items()]),
+            ('buffer_oldest_message_age_seconds', 'gauge', 'Age of the oldest buffered message',
+             [({'buffer_id': id}, round(value, 3)) for id, value in oldest.items()]),
+            ('buffer_resident_bytes', 'gauge', 'Serialized payload bytes of buffered messages held in memory',
+             [({'buffer_id': id}, value) for id, value in resident.items()]),
+            ('buffer_spilled_messages', 'gauge', 'Buffered messages whose payload was dropped from memory',
+             [({'buffer_id': id}, value) for id, value in spilled.items()]),
+            ('buffer_memory_budget_bytes', 'gauge', 'Global limit for resident payload bytes (0: unlimited)',
+             [({}, memory_budget.limit)]),
+            ('buffer_adaptive_batch_size', 'gauge', 'Effective batch size of adaptive buffers',
+             [({'buffer_id': id}, state[0]) for id, state in adaptive_states.items()]),
+            ('buffer_adaptive_linger_seconds', 'gauge', 'Effective linger time of adaptive buffers',
+             [({'buffer_id': id}, round(state[1], 3)) for id, state in adaptive_states.items()]),
+            ('buffer_adaptive_forward_latency_seconds', 'gauge', 'Flush latency moving average seen by the adaptive policy',
+             [({'buffer_id': id}, round(state[2], 4)) for id, state in adaptive_states.items()]),
+            ('buffer_adaptive_error_rate', 'gauge', 'Flush error rate moving average seen by the adaptive policy',
+             [({'buffer_id': id}, round(state[3], 4)) for id, state in adaptive_states.items()]),
+            ('buffer_forward_circuit_state', 'gauge', 'Circuit breaker state per forwarding config (0 closed, 1 half-open, 2 open)',
+             [({'forwarding_config_id': id}, circuit.STATES.index(state[0])) for id, state in circuits.items()]),
+            ('buffer_forward_circuit_failure_rate', 'gauge', 'Failure rate of the recent attempts counted by the circuit breaker',
+             [({'forwarding_config_id': id}, round(state[1], 4)) for id, state in circuits.items()]),
+            ('buffer_log_segments', 'gauge', 'Segments of the message log on disk',
+             [({}, log_segments)]),
+            ('buffer_log_bytes', 'gauge', 'Record bytes written to the message log segments on disk',
+             [({}, log_bytes)]),
+            ('buffer_log_open_messages', 'gauge', 'Message log messages without a final status',
+             [({}, log_open)]),
+            ('buffer_ordered_keys', 'gauge', 'Keys of ordered buffers with flushes not yet delivered',
+             [({}, ordered_keys)]),
+            ('buffer_ordered_flushes', 'gauge', 'Flushes of ordered buffers queued or being delivered',
+             [({}, ordered_flushes)]),
+            ('buffer_ordered_held_keys', 'gauge', 'Keys of ordered buffers waiting for the retry of their oldest batch',
+             [({}, ordered_held)]),
+            ('buffer_idempotency_index_keys', 'gauge', 'Idempotency keys held in the in-memory index',
+             [({}, len(idempotency_index))]),
+            ('buffer_db_pool_available_connections', 'gauge', 'Idle connections in the database pool',
+             [({}, db_pool.available())]),
+            ('buffer_scheduler_jobs', 'gauge', 'Jobs registered in the scheduler',
+             [({}, len(scheduler.get_jobs()))]),
+            ('buffer_response_cache_requests_total', 'counter', 'Cached GET endpoint lookups by result',
+             [({'result': 'hit'}, cache.responses.hits), ({'result': 'miss'}, cache.responses.misses)]),
+        ]
+
+    metrics.REGISTRY.add_collector(collect_buffer_metrics, name='buffer')
+
+    resume_ordered_retries()
+    rebuffer_log_messages()
+
+    app.extensions['buffer'] = {
+        'drain': drain_buffers,
+        'memory': memory_budget,
+        'capture': capture_recorder,
+    }
+
     return app
 
 if __name__ == '__main__':
@@ -0,0 +1,82 @@
+"""Production WSGI serving for the Buffer app.
+
+The app keeps its buffers (``buffer_store``) and the APScheduler instance in
+process memory, so it is served by a single process with a pool of worker
+threads (waitress) instead of several forked workers.
+"""
+import logging
+import signal
+
+from waitress.server import create_server
+from waitress.task import ThreadedTaskDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+class GracefulTaskDispatcher(ThreadedTaskDispatcher):
+    """Task dispatcher that lets in-flight requests finish on shutdown."""
+
+    def __init__(self, graceful_timeout):
+        super().__init__()
+        self.graceful_timeout = graceful_timeout
+
+    def shutdown(self, cancel_pending=False, timeout=None):
+        return super().shutdown(
+            cancel_pending=cancel_pending,
+            timeout=self.graceful_timeout if timeout is None else timeout
+        )
+
+
+def _raise_interrupt(signum, frame):
+    raise KeyboardInterrupt
+
+
+def shutdown_app(app, scheduler):
+    """Drain buffered messages, close a running capture and wait for running scheduled jobs."""
+    drain = app.extensions.get('buffer', {}).get('drain')
+    if drain is not None:
+        try:
+            drain()
+        except Exception as e:
+            logger.error(f"Error draining buffers on shutdown: {str(e)}")
+    recorder = app.extensions.get('buffer', {}).get('capture')
+    if recorder is not None:
+        recorder.stop()
+    if scheduler.running:
+        logger.info("Waiting for running scheduled jobs to finish...")
+        scheduler.shutdown(wait=True)
+
+
+def serve(app, scheduler, host='127.0.0.1', port=5000, threads=8, backlog=1024,
+          keep_alive=120, connection_limit=1000, graceful_timeout=30):
+    """Serve ``app`` until SIGINT/SIGTERM, then shut down gracefully.
+
+    Shutdown order: stop accepting connections, let in-flight requests finish
+    (up to ``graceful_timeout`` seconds), flush every pending buffer and wait
+    for the forwards, then stop the scheduler.
+    """
+    dispatcher = GracefulTaskDispatcher(graceful_timeout)
+    dispatcher.set_thread_count(threads)
+    server = create_server(
+        app,
+        _dispatcher=dispatcher,
+        host=host,
+        port=port,
+        threads=threads,
+        backlog=backlog,
+        channel_timeout=keep_alive,
+        connection_limit=connection_limit,
+        ident='buffer'
+    )
+    signal.signal(signal.SIGTERM, _raise_interrupt)
+    logger.info(f"Serving on http://{host}:{port} with {threads} threads")
+    try:
+        # BaseWSGIServer.run() shuts the dispatcher down on KeyboardInterrupt
+        server.run()
+    finally:
+        # A repeated SIGTERM must not interrupt the drain; SIGINT still aborts
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        logger.info("Shutting down: draining buffers and in-flight forwards")
+        server.close()
+        shutdown_app(app, scheduler)
+        logger.info("Shutdown complete")
@@ -0,0 +1,173 @@
+"""Rollups of schedule executions and forwards per minute, hour and day.
+
+Each finished execution (``log_execution``) or forward attempt
+(``forward_batch``) upserts one row per period into ``stats_rollups``, in the
+same transaction as its history row: counts by status, duration sum and
+max, and a histogram over ``BUCKETS``. Reading a range is then a primary
+key range scan, independent of the size of the history tables, and
+duration percentiles are interpolated from the summed histograms.
+
+Minute and hour rows are pruned after ``RETENTION`` by an hourly scheduler
+job; day rows are kept.
+"""
+import time
+from datetime import datetime, timezone
+
+from .metrics import LATENCY_BUCKETS
+
+BUCKETS = LATENCY_BUCKETS
+HISTOGRAM_COLUMNS = [f'h{i}' for i in range(len(BUCKETS) + 1)]  # último: acima do maior limite
+PERIODS = {'minute': 60, 'hour': 3600, 'day': 86400}
+KINDS = ('execution', 'forward')
+RETENTION = {'minute': 2 * 86400, 'hour': 90 * 86400}
+# Buckets returned per query, e.g. 7 days of hours or 1 day of minutes
+MAX_BUCKETS = 1440
+
+_UPSERT = '''
+    INSERT INTO stats_rollups
+        (kind, subject_id, period, bucket_start, count, success, error, duration_sum, duration_max, {column})
+    VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, 1)
+    ON CONFLICT (kind, subject_id, period, bucket_start) DO UPDATE SET
+        count = count + 1,
+        success = success + excluded.success,
+        error = error + excluded.error,
+        duration_sum = duration_sum + excluded.duration_sum,
+        duration_max = MAX(duration_max, excluded.duration_max),
+        {column} = {column} + 1
+'''
+UPSERTS = {column: _UPSERT.format(column=column) for column in HISTOGRAM_COLUMNS}
+
+
+def create_tables(conn):
+    histogram = ',\n'.join(f'            {column} INTEGER NOT NULL DEFAULT 0' for column in HISTOGRAM_COLUMNS)
+    conn.execute(f'''
+        CREATE TABLE IF NOT EXISTS stats_rollups (
+            kind TEXT NOT NULL,
+            subject_id INTEGER NOT NULL,
+            period TEXT NOT NULL,
+            bucket_start INTEGER NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            success INTEGER NOT NULL DEFAULT 0,
+            error INTEGER NOT NULL DEFAULT 0,
+            duration_sum REAL NOT NULL DEFAULT 0,
+            duration_max REAL NOT NULL DEFAULT 0,
+{histogram},
+            PRIMARY KEY (kind, subject_id, period, bucket_start)
+        ) WITHOUT ROWID
+    ''')
+    # Para consultas de todos os agendamentos/configs de um período
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stats_rollups_period ON stats_rollups(kind, period, bucket_start)')
+
+
+def histogram_column(duration):
+    for index, bound in enumerate(BUCKETS):
+        if duration <= bound:
+            return HISTOGRAM_COLUMNS[index]
+    return HISTOGRAM_COLUMNS[-1]
+
+
+def record(conn, kind, subject_id, status, duration, at=None):
+    """Add one finished execution/forward to the rollups of every period."""
+    at = time.time() if at is None else at
+    success = 1 if status == 'success' else 0
+    statement = UPSERTS[histogram_column(duration)]
+    conn.executemany(statement, [
+        (kind, subject_id, period, int(at // seconds * seconds), success, 1 - success, duration, duration)
+        for period, seconds in PERIODS.items()
+    ])
+
+
+def prune(conn, now=None):
+    now = time.time() if now is None else now
+    removed = 0
+    for period, retention in RETENTION.items():
+        cursor = conn.execute(
+            'DELETE FROM stats_rollups WHERE period = ? AND bucket_start < ?', (period, now - retention)
+        )
+        removed += cursor.rowcount
+    return removed
+
+
+def percentile(histogram, total, fraction, duration_max):
+    """Estimate a percentile by linear interpolation inside its histogram bucket."""
+    if not total:
+        return None
+    rank = fraction * total
+    cumulative = 0
+    for index, count in enumerate(histogram):
+        if count and cumulative + count >= rank:
+            lower = BUCKETS[index - 1] if index > 0 else 0.0
+            upper = BUCKETS[index] if index < len(BUCKETS) else duration_max
+            value = lower + (upper - lower) * (rank - cumulative) / count
+            return round(min(value, duration_max), 6)
+        cumulative += count
+    return round(duration_max, 6)
+
+
+def summarize(rows):
+    """Combine rollup rows into one summary with rates and percentiles."""
+    count = sum(row['count'] for row in rows)
+    success = sum(row['success'] for row in rows)
+    duration_sum = sum(row['duration_sum'] for row in rows)
+    duration_max = max((row['duration_max'] for row in rows), default=0.0)
+    histogram = [sum(row[column] for row in rows) for column in HISTOGRAM_COLUMNS]
+    return {
+        'count': count,
+        'success': success,
+        'error': count - success,
+        'success_rate': round(success / count, 4) if count else None,
+        'duration_avg': round(duration_sum / count, 6) if count else None,
+        'duration_max': round(duration_max, 6) if count else None,
+        'duration_p50': percentile(histogram, count, 0.50, duration_max),
+        'duration_p90': percentile(histogram, count, 0.90, duration_max),
+        'duration_p99': percentile(histogram, count, 0.99, duration_max),
+    }
+
+
+# Janela padrão de /api/stats por período
+DEFAULT_WINDOWS = {'minute': 3600, 'hour': 86400, 'day': 30 * 86400}
+
+
+def parse_timestamp(value):
+    """Epoch seconds or an ISO 8601 string (UTC when it has no offset) -> epoch seconds."""
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def query(conn, kind, period, start, end, subject_id=None):
+    """Rollups of ``kind`` in [start, end).
+
+    With ``subject_id``: a summary per bucket plus the total. Without: the
+    total per subject (schedule or forwarding config).
+    """
+    seconds = PERIODS[period]
+    start = int(start // seconds * seconds)
+    if (end - start) / seconds > MAX_BUCKETS:
+        raise ValueError(f'Range too large for period {period}: at most {MAX_BUCKETS} buckets')
+    sql = 'SELECT * FROM stats_rollups WHERE kind = ? AND period = ? AND bucket_start >= ? AND bucket_start < ?'
+    params = [kind, period, start, end]
+    if subject_id is not None:
+        sql = 'SELECT * FROM stats_rollups WHERE kind = ? AND subject_id = ? AND period = ? AND bucket_start >= ? AND bucket_start < ?'
+        params = [kind, subject_id, period, start, end]
+    rows = conn.execute(sql + ' ORDER BY subject_id, bucket_start', params).fetchall()
+
+    result = {'kind': kind, 'period': period, 'start': isoformat(start), 'end': isoformat(end)}
+    if subject_id is not None:
+        result['subject_id'] = subject_id
+        result['buckets'] = [dict(summarize([row]), start=isoformat(row['bucket_start'])) for row in rows]
+        result['total'] = summarize(rows)
+    else:
+        by_subject = {}
+        for row in rows:
+            by_subject.setdefault(row['subject_id'], []).append(row)
+        result['subjects'] = [dict(summarize(group), subject_id=id) for id, group in by_subject.items()]
+    return result
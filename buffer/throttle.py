@@ -0,0 +1,156 @@
+"""Outbound rate limiting and concurrency caps.
+
+Scheduled requests and forwards go through the same ``OutboundLimiter``.
+Each request is bound by two limits, and both must allow it:
+
+- the limit of its destination host (``host[:port]`` of the URL). Every
+  host gets ``BUFFER_OUTBOUND_RATE_LIMIT`` requests per second (bursts of
+  ``BUFFER_OUTBOUND_RATE_BURST``) and ``BUFFER_OUTBOUND_MAX_CONCURRENCY``
+  requests in flight. ``BUFFER_OUTBOUND_HOST_LIMITS`` overrides them per
+  host: ``api.partner.com=10/20/4,other.com:8080=5`` means rate, then
+  optional burst and concurrency;
+- for forwards, the ``rate_limit``/``rate_burst``/``max_concurrency`` of the
+  forwarding config.
+
+0 means no limit everywhere. A request over a rate limit reserves the next
+free token and sleeps until it is due. Queued requests are released one
+every ``1 / rate`` seconds in arrival order, rather than all at once when a
+bucket refills. A request that would wait more than
+``BUFFER_OUTBOUND_MAX_WAIT`` seconds raises ``Throttled``. Callers that
+must not block for long (a flush holding the buffer lock) lower that bound
+with ``capped_wait()``.
+"""
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from .admission import TokenBucket
+
+RATE_LIMIT = float(os.environ.get('BUFFER_OUTBOUND_RATE_LIMIT') or 0)
+RATE_BURST = int(os.environ.get('BUFFER_OUTBOUND_RATE_BURST') or 0)
+MAX_CONCURRENCY = int(os.environ.get('BUFFER_OUTBOUND_MAX_CONCURRENCY') or 0)
+HOST_LIMITS = os.environ.get('BUFFER_OUTBOUND_HOST_LIMITS') or ''
+MAX_WAIT = float(os.environ.get('BUFFER_OUTBOUND_MAX_WAIT') or 300)
+# Espera máxima dentro de capped_wait(), usada pelos flushes que seguram o buffer_lock
+LOCKED_MAX_WAIT = float(os.environ.get('BUFFER_OUTBOUND_LOCKED_MAX_WAIT') or 1)
+
+_wait_cap = contextvars.ContextVar('outbound_wait_cap', default=None)
+
+
+@contextmanager
+def capped_wait(seconds=LOCKED_MAX_WAIT):
+    """Make the slots taken inside this block give up after ``seconds`` at most."""
+    token = _wait_cap.set(seconds)
+    try:
+        yield
+    finally:
+        _wait_cap.reset(token)
+
+
+def parse_host_limits(spec):
+    """``'a.com=10/20/4,b.com=5'`` -> ``{'a.com': (10.0, 20, 4), 'b.com': (5.0, 0, 0)}``.
+
+    Raises ValueError when the spec is malformed.
+    """
+    limits = {}
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        host, _, values = item.partition('=')
+        values = values.split('/')
+        if not host or not values[0] or len(values) > 3:
+            raise ValueError(f"Invalid outbound host limit: {item!r}")
+        values += ['0'] * (3 - len(values))
+        limits[host.strip().lower()] = (float(values[0]), int(values[1] or 0), int(values[2] or 0))
+    return limits
+
+
+def host_of(url):
+    parts = urlsplit(url)
+    host = (parts.hostname or '').lower()
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    return f'{host}:{port}' if port else host
+
+
+class Throttled(Exception):
+    """An outbound request that gave up waiting for its limits."""
+
+    def __init__(self, reason, host):
+        super().__init__(f"Throttled ({reason}) for {host}")
+        self.reason = reason
+
+
+class Limit:
+    __slots__ = ('settings', 'bucket', 'semaphore')
+
+    def __init__(self, rate, burst, concurrency):
+        self.settings = (rate, burst, concurrency)
+        self.bucket = TokenBucket(rate, burst) if rate else None
+        self.semaphore = threading.BoundedSemaphore(concurrency) if concurrency else None
+
+
+class OutboundLimiter:
+    def __init__(self, rate_limit=RATE_LIMIT, rate_burst=RATE_BURST, max_concurrency=MAX_CONCURRENCY,
+                 host_limits=None, max_wait=MAX_WAIT):
+        self.default = (rate_limit, rate_burst, max_concurrency)
+        self.host_limits = parse_host_limits(HOST_LIMITS) if host_limits is None else host_limits
+        self.max_wait = max_wait
+        self.lock = threading.Lock()
+        self.limits = {}
+
+    def limit(self, key, settings):
+        """The Limit registered under ``key``, recreated when its settings change; None when unlimited."""
+        rate, _, concurrency = settings
+        if not rate and not concurrency:
+            return None
+        limit = self.limits.get(key)
+        if limit is None or limit.settings != settings:
+            with self.lock:
+                limit = self.limits.get(key)
+                if limit is None or limit.settings != settings:
+                    limit = self.limits[key] = Limit(*settings)
+        return limit
+
+    @contextmanager
+    def slot(self, url, key=None, settings=(0, 0, 0)):
+        """Hold a request to ``url`` within its host's limits and, with ``key``, within ``settings``.
+
+        Yields the seconds spent waiting. Raises Throttled when the wait
+        would exceed ``max_wait``, or the bound of an enclosing ``capped_wait()``.
+        """
+        host = host_of(url)
+        limits = [limit for limit in (
+            self.limit(key, settings) if key is not None else None,
+            self.limit(('host', host), self.host_limits.get(host, self.default)),
+        ) if limit is not None]
+        max_wait = self.max_wait if _wait_cap.get() is None else min(self.max_wait, _wait_cap.get())
+        started = time.monotonic()
+        buckets = [limit.bucket for limit in limits if limit.bucket is not None]
+        wait = max([bucket.reserve() for bucket in buckets], default=0)
+        if wait > max_wait:
+            for bucket in buckets:
+                bucket.refund()
+            raise Throttled('rate_limit', host)
+        if wait:
+            time.sleep(wait)
+        deadline = started + max_wait
+        acquired = []
+        try:
+            # Sempre na mesma ordem (config, host) para não haver impasse entre semáforos
+            for limit in limits:
+                if limit.semaphore is None:
+                    continue
+                if not limit.semaphore.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    # A requisição não sai: devolver os tokens reservados
+                    for bucket in buckets:
+                        bucket.refund()
+                    raise Throttled('concurrency', host)
+                acquired.append(limit.semaphore)
+            yield time.monotonic() - started
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
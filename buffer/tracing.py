@@ -0,0 +1,262 @@
+"""Lightweight spans for the webhook → buffer → forward path.
+
+A webhook request is sampled when it arrives; its spans carry the
+``message_id`` and the buffered entry remembers the trace, so the flush that
+eventually forwards it is traced too (linked to the message traces and
+tagged with the ``forwarded_id``). Finished spans are handed to every
+exporter: ``LogExporter`` writes one line per span and ``MemoryExporter``
+keeps the most recent ones in a ring buffer served by ``/api/traces``.
+
+Unsampled work only pays for a ``ContextVar`` lookup per span: ``trace()``
+and ``span()`` return a shared no-op span when there is nothing to record.
+
+Configuration (environment):
+
+- ``BUFFER_TRACE_SAMPLE_RATE``: fraction of webhook requests traced, 0 (default) disables tracing
+- ``BUFFER_TRACE_EXPORTERS``: comma-separated ``memory`` and/or ``log`` (default ``memory``)
+- ``BUFFER_TRACE_BUFFER_SIZE``: spans kept by the memory exporter (default 10000)
+"""
+import contextvars
+import logging
+import os
+import random
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+_current = contextvars.ContextVar('buffer_trace_span', default=None)
+
+
+def _new_id():
+    return os.urandom(8).hex()
+
+
+class Span:
+    __slots__ = ('tracer', 'trace_id', 'span_id', 'parent_id', 'name', 'start', 'attributes', '_token', '_started')
+
+    def __init__(self, tracer, name, trace_id, parent_id=None, start=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_id()
+        self.parent_id = parent_id
+        self.start = start
+        self.attributes = attributes or {}
+        self._token = None
+        self._started = None
+
+    @property
+    def context(self):
+        """``(trace_id, span_id)``, stored with buffered messages to continue the trace."""
+        return (self.trace_id, self.span_id)
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def begin(self):
+        """Start the span and make it the parent of spans opened in this context."""
+        if self.start is None:
+            self.start = time.time()
+        self._started = time.perf_counter()
+        self._token = _current.set(self)
+        return self
+
+    def finish(self, **attributes):
+        if attributes:
+            self.attributes.update(attributes)
+        if self._token is not None:
+            _current.reset(self._token)
+            self._token = None
+        duration = time.perf_counter() - self._started if self._started is not None else time.time() - self.start
+        self.tracer.export(self, duration)
+
+    def __enter__(self):
+        return self.begin()
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes['error'] = f'{exc_type.__name__}: {exc}'
+        self.finish()
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+    trace_id = None
+    span_id = None
+    context = None
+
+    def set(self, **attributes):
+        return self
+
+    def begin(self):
+        return self
+
+    def finish(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def __bool__(self):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class LogExporter:
+    def export(self, span):
+        logger.info(f"[TRACE] trace={span['trace_id']} span={span['name']} "
+                    f"duration={span['duration_ms']}ms {span['attributes']}")
+
+
+class MemoryExporter:
+    """Ring buffer of the most recent finished spans."""
+
+    def __init__(self, capacity=10000):
+        self.spans = deque(maxlen=capacity)
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans.clear()
+
+    def find(self, trace_id=None, message_id=None, forwarded_id=None, limit=50):
+        """Traces touching a message, a forward or a trace id, most recent first.
+
+        Message traces and the flush traces that forwarded them are linked, so
+        asking for either returns both.
+        """
+        spans = list(self.spans)
+        by_trace = {}
+        for span in spans:
+            by_trace.setdefault(span['trace_id'], []).append(span)
+
+        if trace_id is None and message_id is None and forwarded_id is None:
+            matched = list(by_trace)
+        else:
+            matched = []
+            for span in spans:
+                attributes = span['attributes']
+                if (span['trace_id'] == trace_id
+                        or (message_id is not None and (attributes.get('message_id') == message_id
+                                                        or message_id in attributes.get('message_ids', ())))
+                        or (forwarded_id is not None and attributes.get('forwarded_id') == forwarded_id)):
+                    matched.append(span['trace_id'])
+            # Follow links in both directions between message and flush traces
+            related = set(matched)
+            for span in spans:
+                links = span['attributes'].get('links', ())
+                if span['trace_id'] in related:
+                    matched.extend(links)
+                elif related.intersection(links):
+                    matched.append(span['trace_id'])
+
+        seen = set()
+        traces = []
+        for id in reversed(matched):
+            if id in seen or id not in by_trace:
+                continue
+            seen.add(id)
+            trace_spans = sorted(by_trace[id], key=lambda span: span['start'])
+            traces.append({'trace_id': id, 'spans': trace_spans})
+            if len(traces) >= limit:
+                break
+        return traces
+
+
+class Tracer:
+    def __init__(self, sample_rate=0.0, exporters=()):
+        self.sample_rate = sample_rate
+        self.exporters = list(exporters)
+
+    @classmethod
+    def from_env(cls):
+        sample_rate = float(os.environ.get('BUFFER_TRACE_SAMPLE_RATE') or 0)
+        capacity = int(os.environ.get('BUFFER_TRACE_BUFFER_SIZE') or 10000)
+        exporters = []
+        for name in (os.environ.get('BUFFER_TRACE_EXPORTERS') or 'memory').split(','):
+            name = name.strip()
+            if name == 'memory':
+                exporters.append(MemoryExporter(capacity))
+            elif name == 'log':
+                exporters.append(LogExporter())
+            elif name:
+                logger.warning(f"Unknown trace exporter: {name}")
+        return cls(sample_rate, exporters)
+
+    @property
+    def memory(self):
+        """The in-memory exporter, if configured."""
+        for exporter in self.exporters:
+            if isinstance(exporter, MemoryExporter):
+                return exporter
+        return None
+
+    def set_sample_rate(self, sample_rate):
+        if not 0 <= sample_rate <= 1:
+            raise ValueError('sample_rate must be between 0 and 1')
+        self.sample_rate = sample_rate
+
+    def trace(self, name, sampled=None, start=None, **attributes):
+        """Start a new trace rooted at ``name``.
+
+        ``sampled`` forces the decision (e.g. a flush is traced when any of
+        its messages was); by default ``sample_rate`` decides.
+        """
+        if not self.exporters:
+            return NOOP_SPAN
+        if sampled is None:
+            sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not sampled:
+            return NOOP_SPAN
+        return Span(self, name, _new_id(), start=start, attributes=attributes)
+
+    def span(self, name, **attributes):
+        """Child of the current span, or a no-op outside a sampled trace."""
+        parent = _current.get()
+        if parent is None:
+            return NOOP_SPAN
+        return Span(self, name, parent.trace_id, parent.span_id, attributes=attributes)
+
+    def record(self, name, context, start, end, **attributes):
+        """Export an already finished span, e.g. the time a message sat in the buffer."""
+        trace_id, parent_id = context
+        span = Span(self, name, trace_id, parent_id, start=start, attributes=attributes)
+        self.export(span, end - start)
+
+    def annotate(self, **attributes):
+        """Set attributes on the current span, if any."""
+        span = _current.get()
+        if span is not None:
+            span.attributes.update(attributes)
+
+    def current_context(self):
+        span = _current.get()
+        return span.context if span is not None else None
+
+    def export(self, span, duration):
+        record = {
+            'trace_id': span.trace_id,
+            'span_id': span.span_id,
+            'parent_id': span.parent_id,
+            'name': span.name,
+            'start': span.start,
+            'duration_ms': round(duration * 1000, 3),
+            'attributes': span.attributes,
+        }
+        for exporter in self.exporters:
+            try:
+                exporter.export(record)
+            except Exception as e:
+                logger.error(f"[TRACE] Exporter {type(exporter).__name__} failed: {str(e)}")
+
+
+tracer = Tracer.from_env()
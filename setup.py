@@ -6,14 +6,18 @@ setup(
     packages=find_packages(),
     include_package_data=True,
     install_requires=[
-        "flask>=2.0.0",
+        "flask>=2.2.0",
         "flask-cors>=3.0.0",
         "requests>=2.25.0",
         "click>=8.0.0",
         "apscheduler>=3.9.0",
         "python-dateutil>=2.8.0",
-        "croniter"
+        "croniter",
+        "waitress>=2.0.0"
     ],
+    extras_require={
+        "fast": ["orjson>=3.6.0"]
+    },
     entry_points={
         "console_scripts": [
             "buffer=buffer.cli:cli"